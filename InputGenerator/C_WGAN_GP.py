@@ -17,7 +17,7 @@ from geomloss import SamplesLoss
 from tqdm import tqdm
 import copy
 import random
-from torch.utils.data import DataLoader
+import concurrent.futures
 import torch.optim as optim
 import seaborn as sns
 import os
@@ -38,7 +38,8 @@ class WGANCGP(WGAN_BaseClass.WGAN):
                  gen_iters=150000, learning_rate=0.00005, d_loop=5, z_dim=512,
                  embed_size=2, lambda_p=0.1, beta1=0.9, beta2=0.99,
                  n_eval=1000, optimizer='RMSProp', activationg='tanh',
-                 activationd='Relu', normalize=False, centered=False, backend='tensorized'):
+                 activationd='Relu', normalize=False, centered=False, backend='tensorized', top_k=None,
+                 n_proxy=256):
         if df_list.__len__() != 0:
             super(WGANCGP, self).__init__(df=df_list[0], batch_size=batch_size, num_features=num_features, depth=depth,
                                           width_d=width_d, width_g=width_g, p=p, num_epochs=None, learning_rate=learning_rate,
@@ -64,6 +65,9 @@ class WGANCGP(WGAN_BaseClass.WGAN):
         self.normalize = normalize
         self.centered = centered
         self.n_eval = n_eval
+        self.top_k = top_k  # Keep only the best k generator snapshots on disk (None = keep all)
+        self.n_proxy = n_proxy  # Samples per label for the online sinkhorn proxy used for top_k
+        self.proxy_rng = torch.Generator().manual_seed(0)  # Separate RNG, the proxy must not alter the training
         self.activationG = activationg
         self.activationD = activationd
         self.n_classes = df_list.__len__()
@@ -82,11 +86,13 @@ class WGANCGP(WGAN_BaseClass.WGAN):
                     i += 1
                 except Exception as e:
                     print(e)
-            self.data = torch.utils.data.ConcatDataset(self.data_list)
-            self.dataloader = torch.utils.data.DataLoader(self.data, batch_size=self.batch_size,
-                                                          shuffle=True, num_workers=0)
+            self.dataloader = gan_utils.GrainBatchLoader(self.data_list, batch_size=self.batch_size,
+                                                         shuffle=True, device=self.device)
         else:
             print('No initial data was provided. Please use *load_trained_states()* to add pretrained data')
+        # Denormalization vectors (min and half range per feature), one entry per label
+        self.norm_params = list()
+        self.compute_norm_params()
 
         random.seed(0)
         torch.manual_seed(0)
@@ -171,7 +177,9 @@ class WGANCGP(WGAN_BaseClass.WGAN):
         except FileExistsError as e:
             print(e)
         self.write_specs()
-        G_states = list()
+        self.G_states = gan_utils.GeneratorSnapshots(
+            path=self.storepath + '/' + 'Eval_{}/'.format(self.dt_string) + 'States', template=self.G,
+            top_k=self.top_k)
         starttime = time.time()
         generator_iter = 0
         one = torch.tensor(1, dtype=torch.float, device=self.device)
@@ -197,11 +205,7 @@ class WGANCGP(WGAN_BaseClass.WGAN):
                 j = 0
 
                 while j < loop and i < len(self.dataloader):
-                    try:
-                        data, labels = next(data_iter)
-                    except:
-                        data_iter = iter(self.dataloader)
-                        data, labels = next(data_iter)
+                    data, labels = next(data_iter)
 
                     self.D.zero_grad()
 
@@ -246,10 +250,10 @@ class WGANCGP(WGAN_BaseClass.WGAN):
                 if generator_iter % self.n_eval == 0 or generator_iter == 100:
                     # Append The states every 500 epochs
                     self.D_losses.append(D_loss.cpu().detach())
-                    self.G_losses.append(G_fake_loss)
-                    # Only referencing to the last g state
-                    state = copy.deepcopy(self.G).cpu()
-                    G_states.append(state)  # Save on CPU
+                    self.G_losses.append(G_fake_loss.cpu().detach())
+                    # Stream the state to disk instead of keeping a copy in memory
+                    score = self.proxy_loss() if self.top_k is not None else None
+                    self.G_states.append(self.G, iteration=generator_iter, score=score)
                     print(
                         'Epochen {}/{}|Iterationen {}/{}| - Loss_D {}, Loss_G {}, Loss_D_real {}, '
                         'Loss_D_fake {}'
@@ -267,21 +271,10 @@ class WGANCGP(WGAN_BaseClass.WGAN):
         except:
             pass
         print('Training finished: {}'.format(elapsed))
-        print('Saving Data...')
-        for s in G_states:
-            self.G_states.append(s.to('cpu'))
         if plot:
-            if self.n_eval > 100:
-                for i in range(self.n_classes):
-                    for j in range(len(self.G_states)):
-                        if j == 0:
-                            self.plot_results(G=self.G_states[j], label=i, state=100)
-                        else:
-                            self.plot_results(G=self.G_states[j], label=i, state=j * self.n_eval)
-            else:
-                for i in range(self.n_classes):
-                    for j in range(len(self.G_states)):
-                        self.plot_results(G=self.G_states[j], label=i, state=j * self.n_eval)  # Plot every eval interval
+            for i in range(self.n_classes):
+                for j in range(len(self.G_states)):
+                    self.plot_results(G=self.G_states[j], label=i, state=self.state_iteration(j))
 
 
         # plot Wasserstein loss
@@ -298,17 +291,48 @@ class WGANCGP(WGAN_BaseClass.WGAN):
         plt.close()
         print(os.getcwd())
 
+    def proxy_loss(self):
+        """
+        Cheap online estimate of the generator quality: sinkhorn distance on a fixed size subsample of each label
+        :return: Mean sinkhorn distance over all labels
+        """
+        losses = list()
+        # eval mode: the batches of the proxy must not update the running stats of the BatchNorm layers
+        training = self.G.training
+        self.G.eval()
+        try:
+            for label in range(self.n_classes):
+                real = self.data_list[label].result
+                idx = torch.randperm(real.__len__(), generator=self.proxy_rng)[:self.n_proxy]
+                real = real[idx].to(self.device).contiguous()
+                noise = torch.randn((real.__len__(), self.z_dim), generator=self.proxy_rng).to(self.device)
+                labels = torch.full((real.__len__(),), fill_value=label, dtype=torch.int64, device=self.device)
+                losses.append(gan_utils.sinkhorn_state_loss(self.G, self.loss, noise, labels, real))
+        finally:
+            self.G.train(training)
+        return float(np.mean(losses))
+
+    def state_iteration(self, idx):
+        """
+        :param idx: Index in self.G_states
+        :return: Generator iteration at which the state was recorded
+        """
+        if isinstance(self.G_states, gan_utils.GeneratorSnapshots):
+            return self.G_states.iterations[idx]
+        return idx * self.n_eval if idx > 0 else 100
+
     def plot_results(self, G, label, state=None):
         """
         :param state:
         :param label: Label to plot
         :return: None
         """
-        noise = torch.randn((self.data_list[label][:][0].__len__(), self.z_dim), device='cpu')
+        n_samples = self.data_list[label].__len__()
+        noise = torch.randn((n_samples, self.z_dim), device='cpu')
         G_cpu = G.to('cpu')
-        labels = torch.full((1, self.data_list[label][:][0].__len__()), fill_value=label,
-                            dtype=torch.int64).view(self.data_list[label][:][0].__len__())
-        res = G_cpu(noise, labels)
+        labels = torch.full((n_samples,), fill_value=label, dtype=torch.int64)
+        with torch.no_grad():
+            res = G_cpu(noise, labels)
         df_fake_denormalized, df_real = self.normalize_data(res, label)
         df_fake_denormalized['Type'] = 'Fake'
         df_real['Type'] = 'Real'
@@ -327,32 +351,49 @@ class WGANCGP(WGAN_BaseClass.WGAN):
         g.savefig(self.storepath + '/' + 'Eval_{}/'.format(self.dt_string) + 'PairplotLabel_{}_{}'.format(label, state))
         plt.close()
 
-    def evaluate(self, seeds=1):
+    def evaluate(self, seeds=1, n_workers=1, executor='thread'):
+        """
+        Computes the sinkhorn distance between every stored generator state and the real data of each label
+        :param seeds: Number of noise seeds every state is evaluated with
+        :param n_workers: Number of parallel workers for the state evaluation (1 = serial)
+        :param executor: 'thread' or 'process' - kind of worker pool used if n_workers > 1
+        :return: None
+        """
+        if n_workers > 1:
+            if executor == 'process':
+                pool = concurrent.futures.ProcessPoolExecutor(max_workers=n_workers)
+            else:
+                pool = concurrent.futures.ThreadPoolExecutor(max_workers=n_workers)
+        else:
+            pool = None
+
         for label in range(self.n_classes):
             min_list = list()
             losses = list()
+            # Materialize the real samples of this label only once
+            real = self.data_list[label].result.to('cpu').contiguous()
+            n_samples = real.__len__()
+            labels = torch.full((n_samples,), fill_value=label, dtype=torch.int64)
             for i in range(seeds):
-                temp = list()
-                for state in tqdm(self.G_states, desc='Iterations'):
-                    # Renew RNG Seed every iter to test the states with identical
-                    torch.manual_seed(i)
-                    noise = torch.randn((self.data_list[label][:][0].__len__(), self.z_dim), device='cpu')
-                    labels = torch.full((1, self.data_list[label][:][0].__len__()), fill_value=label,
-                                        dtype=torch.int64).view(self.data_list[label][:][0].__len__())
-                    fake = state(noise, labels).detach()
-                    real = self.data_list[label][:][0].to('cpu')
-                    fake = fake.contiguous()
-                    real = real.contiguous()
-                    loss = self.loss(fake, real)
-                    temp.append(loss)
+                # Identical noise for all states of this seed
+                torch.manual_seed(i)
+                noise = torch.randn((n_samples, self.z_dim), device='cpu')
+                eval_args = (self.loss, noise, labels, real)
+                if pool is None:
+                    temp = [gan_utils.sinkhorn_state_loss(state, *eval_args)
+                            for state in tqdm(self.G_states, desc='Iterations')]
+                else:
+                    temp = [None] * self.G_states.__len__()
+                    for idx, loss in tqdm(gan_utils.pooled_state_losses(pool, self.G_states, n_workers, *eval_args),
+                                          total=temp.__len__(), desc='Iterations'):
+                        temp[idx] = loss
                 # Plotting
                 loss_array = np.array(temp)
                 min_l = loss_array.min()
                 min_i = loss_array.argmin()
                 min_list.append([min_i, min_l])
                 losses.append(loss_array)
-                self.plot_results(self.G_states[int(min_i)], label=label,
-                                  state=int(min_i) * self.n_eval if int(min_i) > 0 else 100)
+                self.plot_results(self.G_states[int(min_i)], label=label, state=self.state_iteration(int(min_i)))
             SinkLossMin = np.array(min_list)
             plt.style.use('ggplot')
             plt.figure(figsize=(10,10))
@@ -396,6 +437,8 @@ class WGANCGP(WGAN_BaseClass.WGAN):
                 specs.writelines('\n Mean Sink Error: {}'.format(mean))
         except FileNotFoundError as e:
             print(e)
+        if pool is not None:
+            pool.shutdown()
         self.get_best_fit()
 
     def get_best_fit(self):
@@ -414,30 +457,58 @@ class WGANCGP(WGAN_BaseClass.WGAN):
                 pickle.dump(save_list, f)
                 f.close()
 
-    def sample_batch(self, label, size=1000):
+    def sample_batch(self, label, size=1000, as_array=False):
+        """
+        :param label: Label of the trained state to sample from
+        :param size: Number of samples
+        :param as_array: If True, the denormalized samples are returned as (size, n_features) np.ndarray
+            instead of a DataFrame
+        :return: Denormalized samples
+        """
         # Check if there is state data present.
         if self.best_states:
             noise = torch.randn((size, self.z_dim), device='cpu')
             labels = torch.full((1, size), fill_value=label,
                                 dtype=torch.int64).view(size)
-            sample = self.best_states[label](noise, labels).detach()
+            with torch.no_grad():
+                sample = self.best_states[label](noise, labels)
         else:
             print('There is no state data! Aborting')
             sys.exit(0)
 
-        # Normalize and transfer to pandas df
-        sample_df, _ = self.normalize_data(sample, label)
-        return sample_df
+        sample = self.denormalize(sample, label)
+        if as_array:
+            return sample
+        return pd.DataFrame(sample, columns=self.norm_params[label][0])
+
+    def compute_norm_params(self):
+        """
+        Precomputes the denormalization vectors for every df in self.df_list
+        Has to be called again whenever self.df_list changes
+        """
+        self.norm_params = list()
+        for df in self.df_list:
+            df_real = df.dropna(axis=1)
+            max_values = df_real.max().to_numpy(dtype=np.float64)
+            min_values = df_real.min().to_numpy(dtype=np.float64)
+            self.norm_params.append((df_real.columns, min_values, (max_values - min_values) / 2))
+
+    def denormalize(self, data, label):
+        """
+        Maps generator output from [-1, 1] back to the feature range of the real data in one broadcasted step
+        :param data: torch.Tensor or np.ndarray of shape (n_samples, n_features)
+        :param label: Label the data belongs to
+        :return: np.ndarray of shape (n_samples, n_features)
+        """
+        if isinstance(data, torch.Tensor):
+            data = data.detach().cpu().numpy()
+        _, min_values, half_range = self.norm_params[label]
+        return (np.asarray(data, dtype=np.float64) + 1) * half_range + min_values
 
     def normalize_data(self, data, label):
-        df_fake = pd.DataFrame(data.data.numpy())
+        columns = self.norm_params[label][0]
+        df_fake_denormalized = pd.DataFrame(self.denormalize(data, label), columns=columns)
         df_real = self.df_list[label].copy()
-        df_fake.columns = df_real.dropna(axis=1).columns
-        df_fake_denormalized = df_fake.copy()
-        for feature_name in df_real.columns:
-            max_value = df_real[feature_name].max()
-            min_value = df_real[feature_name].min()
-            df_fake_denormalized[feature_name] = ((df_fake[feature_name] + 1) * (max_value - min_value)) / 2 + min_value
 
         return df_fake_denormalized, df_real
 
@@ -464,7 +535,7 @@ class WGANCGP(WGAN_BaseClass.WGAN):
             specs.writelines('Generator {} \n'.format(self.activationG))
             specs.writelines('Discriminator {} \n'.format(self.activationD))
             specs.writelines('BatchNorm? {} \n\n'.format(self.normalize))
-            specs.writelines('Len of combined dataset: {}'.format(self.data.__len__()))
+            specs.writelines('Len of combined dataset: {}'.format(self.dataloader.data.__len__()))
 
     def load_trained_states(self, file_list, single=False):
         # Read all the data
@@ -479,6 +550,7 @@ class WGANCGP(WGAN_BaseClass.WGAN):
                     print('Not all data could be loaded! \n To avoid subsequent Errors, the process is canceled')
                     print(e)
                     sys.exit(1)
+            self.compute_norm_params()
         elif single:
             print('Loading deprecated BestGenerators')
             with open(file_list, 'rb') as file:
@@ -13,7 +13,9 @@ from torch.utils.data import DataLoader
 import torch.optim as optim
 import seaborn as sns
 import os
+import copy
 import time
+import concurrent.futures
 
 
 # Swish Activation fn (x * sigmoid(beta * x))
@@ -62,6 +64,45 @@ class GrainDataset(torch.utils.data.Dataset):
         return len(self.result)
 
 
+class GrainBatchLoader:
+    """
+    Replacement for a shuffling DataLoader over several GrainDatasets.
+    All labels are stacked once into one contiguous tensor (optionally directly on the training device) and
+    every iteration yields (data, labels) batches gathered with a shuffled index - no per-item __getitem__ and
+    no collate overhead.
+    The draws from the global torch generator are the ones of DataLoader(shuffle=True, num_workers=0): the base seed
+    of the loader iterator on iter() and the seed of the RandomSampler's own generator on the first batch, so the
+    batches and every later random number are the same as with the DataLoader for the same torch.manual_seed.
+    """
+
+    def __init__(self, datasets, batch_size, shuffle=True, device='cpu'):
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.data = torch.cat([dataset.result for dataset in datasets]).contiguous().to(device)
+        self.labels = torch.cat([torch.full((dataset.__len__(),), fill_value=dataset.label, dtype=torch.int64)
+                                 for dataset in datasets]).to(device)
+
+    def __len__(self):
+        return (self.data.__len__() + self.batch_size - 1) // self.batch_size
+
+    def __iter__(self):
+        # base seed of the DataLoader iterator (only used for worker processes there)
+        torch.empty((), dtype=torch.int64).random_()
+        return self.batches()
+
+    def batches(self):
+        n = self.data.__len__()
+        if self.shuffle:
+            generator = torch.Generator()
+            generator.manual_seed(int(torch.empty((), dtype=torch.int64).random_().item()))
+            idx = torch.randperm(n, generator=generator).to(self.data.device)
+        else:
+            idx = torch.arange(n, device=self.data.device)
+        for start in range(0, n, self.batch_size):
+            batch = idx[start:start + self.batch_size]
+            yield self.data[batch], self.labels[batch]
+
+
 class Generator(nn.Module):
 
     def __init__(self, z_dim, num_features, depth, width, ngpu=1):
@@ -170,3 +211,82 @@ class CDiscriminator(nn.Module):
             x = self.dropout(self.activation_fn(self.linears[i](x)))
         output = self.output_layer(x)
         return output
+
+
+def sinkhorn_state_loss(state, loss, noise, labels, real):
+    """
+    Sinkhorn distance between the samples of one generator state and the real data.
+    Module level function so it can be shipped to thread and process pools alike
+    """
+    with torch.no_grad():
+        fake = state(noise, labels)
+    return float(loss(fake.contiguous(), real))
+
+
+def pooled_state_losses(pool, states, n_pending, *eval_args):
+    """
+    Sinkhorn distances of all states computed in *pool* (see sinkhorn_state_loss).
+    Only *n_pending* states are submitted at a time and the next one is loaded when a result comes back, so only
+    these generators are in memory (and pickled into the call queue of a process pool) instead of all of them.
+    Yields (index, loss) in the order of completion
+    """
+    pending = dict()
+    indices = iter(range(states.__len__()))
+
+    def submit_next():
+        for idx in indices:
+            pending[pool.submit(sinkhorn_state_loss, states[idx], *eval_args)] = idx
+            return
+
+    for _ in range(n_pending):
+        submit_next()
+    while pending:
+        done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+        for future in done:
+            idx = pending.pop(future)
+            submit_next()
+            yield idx, future.result()
+
+
+class GeneratorSnapshots:
+    """
+    On-disk store for the generator states recorded during training.
+    Only the state_dicts are written to *path*, a single CPU copy of the generator serves as template to rebuild
+    the states lazily on access, so the memory stays flat regardless of the number of snapshots.
+    If *top_k* is given, only the k snapshots with the lowest proxy score are kept on disk.
+    Behaves like a read-only list of generators (len, indexing, iteration).
+    """
+
+    def __init__(self, path, template, top_k=None):
+        self.path = path
+        os.makedirs(self.path, exist_ok=True)
+        self.template = copy.deepcopy(template).cpu()
+        self.top_k = top_k
+        self.iterations = list()
+        self.files = list()
+        self.scores = list()
+
+    def append(self, generator, iteration, score=None):
+        file = os.path.join(self.path, 'G_state_{}.pt'.format(iteration))
+        state_dict = {key: value.detach().cpu() for key, value in generator.state_dict().items()}
+        torch.save(state_dict, file)
+        self.iterations.append(iteration)
+        self.files.append(file)
+        self.scores.append(score)
+        if self.top_k is not None and self.files.__len__() > self.top_k:
+            # Drop the worst snapshot (may be the one just written)
+            worst = int(np.argmax(self.scores))
+            os.remove(self.files[worst])
+            del self.iterations[worst], self.files[worst], self.scores[worst]
+
+    def __len__(self):
+        return self.files.__len__()
+
+    def __getitem__(self, idx):
+        state = copy.deepcopy(self.template)
+        state.load_state_dict(torch.load(self.files[idx], map_location='cpu'))
+        return state
+
+    def __iter__(self):
+        for idx in range(self.__len__()):
+            yield self[idx]
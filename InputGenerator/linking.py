@@ -34,153 +34,131 @@ class Reconstructor:
         # locations: [Area, Aspect Ratio, Slope] - Sind so fixed
         df2 = df.copy().dropna(axis=0)
         columns = df2.columns
-        df2['Axes1'] = np.nan
-        df2['Axes2'] = np.nan
-        df2['Axes1'] = (df2[columns[0]] * df2[columns[1]] / np.pi) ** 0.5  # Major
-        df2['Axes2'] = df2[columns[0]] / (np.pi * df2['Axes1'])
+        axes1 = ((df2[columns[0]] * df2[columns[1]] / np.pi) ** 0.5).to_numpy()  # Major
+        axes2 = (df2[columns[0]] / (np.pi * axes1)).to_numpy()
         # Switch axis in 45 - 135
-        for j, row in df2.iterrows():
-            if 45 < row[2] <= 135:
-                temp1 = df2['Axes2'].iloc[j]
-                temp2 = df2['Axes1'].iloc[j]
-                df2['Axes1'].iloc[j] = temp1
-                df2['Axes2'].iloc[j] = temp2
-            else:
-                pass
+        switch = ((df2[columns[2]] > 45) & (df2[columns[2]] <= 135)).to_numpy()
+        df2['Axes1'] = np.where(switch, axes2, axes1)
+        df2['Axes2'] = np.where(switch, axes1, axes2)
 
         return df2
 
     @staticmethod
-    def sample_point(df):
-        index = np.random.randint(low=0, high=len(df))
-        col = df.columns
-        a = df[col[-2]].iloc[index]
-        b = df[col[-1]].iloc[index]
-        slope = df[col[2]].iloc[index]
-        df2 = df.drop(labels=df.index[index], axis=0)
-        return (a, b), slope, df2
+    def sort_section(df, sort_by='Axes2', lookup='Axes1'):
+        """
+        Sorts a 2D-section once by *sort_by* so that range queries can be answered with np.searchsorted
+        :return: dict with the sorted key, lookup value and slope arrays and an "alive" mask for dropped rows
+        """
+        header = df.columns
+        order = np.argsort(df[sort_by].to_numpy(), kind='stable')
+        return {'key': df[sort_by].to_numpy()[order],
+                'value': df[lookup].to_numpy()[order],
+                'slope': df[header[2]].to_numpy()[order],
+                'alive': np.ones(order.__len__(), dtype=bool)}
 
     @staticmethod
-    def find_corresponding_value_per(df, sort_by, lookup, value, surr):
+    def find_range(section, values, surr):
         """
-        :param df:
-        :param sort_by:
-        :param lookup:
-        :param value:
-        :param surr:
-        :return:
-        find corresponding value by percentage deviation
+        Range query for a batch of values
+        :return: start and stop index of all rows in the sorted section whose key deviates less than
+        +- surr (relative) from the value
         """
-        global i
-        msurr = -1 * surr
-        values = dict()
-        test = df.copy()
-        sorted_df = test.sort_values(by=sort_by, axis=0)
-        header = sorted_df.columns
-        sorted_df['Deviation'] = (sorted_df[sort_by] - value) / value
-        for i in range(1, len(sorted_df)):
-            if msurr < sorted_df['Deviation'].iloc[i - 1] < surr:
-                # Only Value and Slope
-                values.update(
-                    {sorted_df[sort_by].iloc[i - 1]: (sorted_df[lookup].iloc[i - 1], sorted_df[header[2]].iloc[i - 1])})
-            else:
-                pass
-
-        return values
+        lo = np.searchsorted(section['key'], values * (1 - surr), side='right')
+        hi = np.searchsorted(section['key'], values * (1 + surr), side='left')
+        return lo, hi
 
-    def run(self, n_points, save_state=False):
+    @staticmethod
+    def best_pair(z_b, z_a):
+        """
+        Finds the pair (z_b[i], z_a[j]) with the minimal absolute difference without forming the cross product:
+        z_a is sorted and every z_b is merged in with np.searchsorted, only the two neighbours are compared
+        :return: i, j, minimal difference
+        """
+        order = np.argsort(z_a, kind='stable')
+        z_a_sorted = z_a[order]
+        pos = np.searchsorted(z_a_sorted, z_b)
+        left = np.clip(pos - 1, 0, z_a_sorted.__len__() - 1)
+        right = np.clip(pos, 0, z_a_sorted.__len__() - 1)
+        diff_left = np.abs(z_b - z_a_sorted[left])
+        diff_right = np.abs(z_b - z_a_sorted[right])
+        nearest = np.where(diff_right < diff_left, right, left)
+        diff = np.minimum(diff_left, diff_right)
+        i = int(np.argmin(diff))
+        return i, int(order[nearest[i]]), diff[i]
+
+    def run(self, n_points, save_state=False, batch_size=1024):
         starttime = time.time()
         percentages = list()
         i = 0
         n_iter = 0
-        df = self.ab.copy()
-        cb = self.cb.copy()
-        ca = self.ca.copy()
+        # Sort the sections only once
+        cb = self.sort_section(self.cb)
+        ca = self.sort_section(self.ca)
+        points = self.ab[[self.ab.columns[-2], self.ab.columns[-1], self.ab.columns[2]]].to_numpy()
+        points = points[np.random.permutation(points.__len__())]
         result_storage = list()
         col_new = ['a_final', 'b_final', 'c_final', 'SlopeAB',
                    'SlopeCB', 'SlopeCA', 'z_1 (c)', 'z_2 (c)',
                    'Percentage Deviation', 'a-Difference', 'b-Difference']
 
-        # Start running
-        while i <= n_points:
-            point, slope, df = self.sample_point(df)
-            print('Remaining points: {}'.format(len(df)))
-            if len(df) == 0:
-                print('No Points remaining. Stop iterating')
+        # Start running - the range queries are answered for a whole batch of points at once
+        for batch_start in range(0, points.__len__(), batch_size):
+            if i > n_points:
                 break
-
+            batch = points[batch_start:batch_start + batch_size]
             # find c from b - here c is on the x axis
-            dict1 = self.find_corresponding_value_per(df=cb, sort_by='Axes2', lookup='Axes1',
-                                                      value=point[1], surr=self.surrounding)
-
+            lo_b, hi_b = self.find_range(cb, batch[:, 1], self.surrounding)
             # find c from a - here c is on the x axis
-            dict2 = self.find_corresponding_value_per(df=ca, sort_by='Axes2', lookup='Axes1',
-                                                      value=point[0], surr=self.surrounding)
-            # This is only 'compound' value. Not a real "c"
-            # But the convergence shows that the approach is correct
-            # Quadratic scaling here - maybe better ideas?
-            if dict1.__len__() != 0 and dict2.__len__() != 0:
-                diff = dict()
-                for k, v in dict1.items():
-                    for k1, v1 in dict2.items():
-                        diff.update({(k, k1): (v[0], v1[0], round(abs(v[0] - v1[0]), 5), v[1], v1[1])})
-                x_arr = np.array(list(diff.values()))
-                y_arr = np.array(list(diff.keys()))
-                min_abs_diff = round(np.amin(x_arr[:, 2]), 5)
-                index_min = int(np.argmin(x_arr[:, 2]))
-                """
-                y_arr indices: b, a
-                x_arr indices: z_b, z_a, diff, slopecb, slopeca
-                """
-                mean = np.mean([x_arr[index_min, 0], x_arr[index_min, 1]]).item()
-                slopecb = x_arr[index_min, 3]
-                slopeca = x_arr[index_min, 4]
-                mean_c_value = round(mean, 5)
+            lo_a, hi_a = self.find_range(ca, batch[:, 0], self.surrounding)
+
+            for k in range(batch.__len__()):
+                if i > n_points:
+                    break
+                point = (batch[k, 0], batch[k, 1])
+                slope = batch[k, 2]
+                n_iter += 1
+                idx_b = np.arange(lo_b[k], hi_b[k])
+                idx_b = idx_b[cb['alive'][idx_b]]
+                idx_a = np.arange(lo_a[k], hi_a[k])
+                idx_a = idx_a[ca['alive'][idx_a]]
+                if idx_b.__len__() == 0 or idx_a.__len__() == 0:
+                    continue
+
+                # This is only 'compound' value. Not a real "c"
+                # But the convergence shows that the approach is correct
+                j_b, j_a, min_diff = self.best_pair(cb['value'][idx_b], ca['value'][idx_a])
+                idx_b, idx_a = idx_b[j_b], idx_a[j_a]
+                z_b, z_a = cb['value'][idx_b], ca['value'][idx_a]
+                min_abs_diff = round(min_diff, 5)
+                slopecb = cb['slope'][idx_b]
+                slopeca = ca['slope'][idx_a]
+                mean_c_value = round((z_b + z_a) / 2, 5)
                 percentage = round(min_abs_diff / mean_c_value, 5)
-                a_diff = y_arr[index_min, 1] - point[0]
-                b_diff = y_arr[index_min, 0] - point[1]
+                a_diff = ca['key'][idx_a] - point[0]
+                b_diff = cb['key'][idx_b] - point[1]
                 # Calc the mean value
                 if self.calc_mean:
-                    x_a = np.mean([y_arr[index_min, 1], point[0]]).item()
-                    y_b = np.mean([y_arr[index_min, 0], point[1]]).item()
+                    x_a = (ca['key'][idx_a] + point[0]) / 2
+                    y_b = (cb['key'][idx_b] + point[1]) / 2
                     new_point = (round(x_a, 5), round(y_b, 5), mean_c_value)
                 else:
                     new_point = (round(point[0], 5), round(point[1], 5), mean_c_value)
 
-                # Print out the results
-                print('Minimal difference between both z: {} | Mean of both z: {} | Percentage deviation: {}%'
-                      .format(min_abs_diff, mean_c_value, round(percentage * 100, 2)))
-
                 if percentage <= self.threshold:
-                    print('Difference small enough: Add Point')
-                    print('The new point is: x={} / y={} / z={}'.format(new_point[0], new_point[1], new_point[2]))
                     i += 1
-                    # Drop values from df
+                    # Drop values from the sections
                     if self.drop:
-                        indexcb = cb[cb['Axes1'] == x_arr[index_min, 0].item()].index
-                        indexca = ca[ca['Axes2'] == x_arr[index_min, 1].item()].index
-                        cb = cb.drop(labels=indexcb, inplace=False)
-                        ca = ca.drop(labels=indexca, inplace=False)
+                        cb['alive'][idx_b] = False
+                        ca['alive'][idx_a] = False
                     # Reihenfolge direkt für
-                    temp = [new_point[0], new_point[1],  mean_c_value, slope, slopecb, slopeca, x_arr[index_min, 0],
-                            x_arr[index_min, 1],
+                    temp = [new_point[0], new_point[1], mean_c_value, slope, slopecb, slopeca, z_b, z_a,
                             round(percentage * 100, 2), a_diff, b_diff]
                     result_storage.append(temp)
-                else:
-                    print('Difference is to big. No convergence')
-                    print('z1={} | z2={}'.format(x_arr[index_min, 0], x_arr[index_min, 1]))
-                    print('The original point was: {} | {}'.format(round(point[0], 5), round(point[1], 5)))
-                n_iter += 1
-                print('Iterations: {}'.format(n_iter))
-                print('Number of points: {}'.format(i))
-                print('----------------------------------------------------')
                 percentages.append(percentage)
-            else:
-                print('All points to far away - Next Point')
-                print(point[0], point[1])
-                print('----------------------------------------------------')
-                n_iter += 1
 
+        if i <= n_points:
+            print('No Points remaining. Stop iterating')
+        print('Iterations: {} | Number of points: {}'.format(n_iter, i))
         self.mean_percentage = round((np.array(percentages).sum() / len(percentages)) * 100, 3)
         results = np.array(result_storage)
         self.results = pd.DataFrame(results, columns=col_new)
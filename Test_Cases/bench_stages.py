@@ -0,0 +1,171 @@
+"""
+Benchmarks of the generation stages. Every scenario is one of the Test_Cases setups (phase mix, bands, inclusions,
+substructure) which is run with a fixed seed for several box sizes and resolutions. The stage timings of the rve
+(timings.json, see dragen.utilities.instrumentation) are collected and written to one json file per session, so two
+revisions can be compared with
+
+python Test_Cases/bench_stages.py <old results.json> <new results.json>
+
+The small sizes run in the default test suite, the large ones only with pytest --bench-large. The results are written
+to the directory in the environment variable DRAGEN_BENCH_DIR (default: .benchmarks in the repository root).
+"""
+import os
+import sys
+import glob
+import json
+import datetime
+import platform
+import subprocess
+import pytest
+
+REPO = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+INPUT = os.path.join(REPO, 'ExampleInput')
+SEED = 42
+
+FERRITE = os.path.join(INPUT, 'Ferrite', 'TrainedData_Ferrite.pkl')
+MARTENSITE = os.path.join(INPUT, 'Martensite', 'TrainedData_Martensite.pkl')
+PAG = os.path.join(INPUT, 'Substructure', 'example_pag_inp.csv')
+BLOCKS = os.path.join(INPUT, 'Substructure', 'example_block_inp.csv')
+
+# parameters of the Test_Cases (Case_002) all scenarios start from
+BASE = dict(dimension=3, box_size_y=None, box_size_z=None, number_of_rves=1, slope_offset=0,
+            abaqus_flag=False, damask_flag=True, moose_flag=False, calibration_rve_flag=False, element_type='HEX8',
+            pbc_flag=True, submodel_flag=False, phase2iso_flag={1: True, 2: True, 3: True, 4: True, 5: True},
+            smoothing_flag=False, xfem_flag=False, gui_flag=False, anim_flag=False, visualization_flag=False,
+            info_box_obj=None, progress_obj=None,
+            phases=['Ferrite', 'Martensite', 'Pearlite', 'Bainite', 'Austenite', 'Inclusions', 'Bands'],
+            number_of_bands=0, upper_band_bound=4, lower_band_bound=2, band_orientation='xy', band_filling=1,
+            subs_flag=False, subs_file_flag=False, subs_file=BLOCKS, equiv_d=5, p_sigma=0.1, t_mu=1.0, b_sigma=0.1,
+            decreasing_factor=0.95, lower=None, upper=None, circularity=1, plt_name='substructure_plot.png',
+            save=False, plot=False, filename='substructure_plot.png', orientation_relationship='KS')
+
+# scenario: (Test_Cases it is derived from, changes of BASE)
+SCENARIOS = {
+    'martensite': ('Case_002', dict(
+        file_dict={1: None, 2: MARTENSITE, 3: None, 4: None, 5: None, 6: None, 7: None},
+        phase_ratio={1: 0, 2: 1, 3: 0, 4: 0, 5: 0, 6: 0, 7: 0})),
+    'dual_phase': ('Case_011', dict(
+        file_dict={1: FERRITE, 2: MARTENSITE, 3: None, 4: None, 5: None, 6: None, 7: None},
+        phase_ratio={1: 0.7, 2: 0.3, 3: 0, 4: 0, 5: 0, 6: 0, 7: 0})),
+    'bands': ('Case_032', dict(
+        file_dict={1: FERRITE, 2: None, 3: None, 4: None, 5: None, 6: None, 7: MARTENSITE},
+        phase_ratio={1: 0.85, 2: 0, 3: 0, 4: 0, 5: 0, 6: 0, 7: 0.15}, number_of_bands=1)),
+    'inclusions': ('Case_026', dict(
+        file_dict={1: FERRITE, 2: None, 3: None, 4: None, 5: None, 6: MARTENSITE, 7: None},
+        phase_ratio={1: 0.95, 2: 0, 3: 0, 4: 0, 5: 0, 6: 0.05, 7: 0})),
+    'substructure': ('Case_047', dict(
+        file_dict={1: None, 2: None, 3: None, 4: None, 5: PAG, 6: None, 7: None},
+        phase_ratio={1: 0, 2: 0, 3: 0, 4: 0, 5: 1, 6: 0, 7: 0}, subs_flag=True, subs_file_flag=True,
+        # the substructure is only generated for the abaqus export
+        abaqus_flag=True, damask_flag=False)),
+}
+
+# (box_size, resolution)
+SMALL_SIZES = [(15, 1), (15, 2)]
+LARGE_SIZES = [(30, 2), (50, 2)]
+
+RESULTS = list()
+
+
+def revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def stage_times(timings: dict) -> dict:
+    """
+    wall time of every stage, summed if a stage ran more than once
+    """
+    stages = dict()
+    for record in timings['stages']:
+        stages[record['stage']] = stages.get(record['stage'], 0) + record.get('wall_time', 0)
+    return stages
+
+
+def benchmark_cases():
+    cases = [pytest.param(name, size, id='{}-{}x{}'.format(name, *size))
+             for size in SMALL_SIZES for name in SCENARIOS]
+    cases += [pytest.param(name, size, id='{}-{}x{}'.format(name, *size), marks=pytest.mark.bench_large)
+              for size in LARGE_SIZES for name in SCENARIOS]
+    return cases
+
+
+@pytest.fixture(scope='module', autouse=True)
+def results_file():
+    yield
+    if len(RESULTS) == 0:
+        return
+    bench_dir = os.environ.get('DRAGEN_BENCH_DIR', os.path.join(REPO, '.benchmarks'))
+    if not os.path.isdir(bench_dir):
+        os.makedirs(bench_dir)
+    rev = revision()
+    summary = {'revision': rev,
+               'date': str(datetime.datetime.now()),
+               'machine': {'python': platform.python_version(), 'platform': platform.platform(),
+                           'cpus': os.cpu_count()},
+               'seed': SEED,
+               'results': RESULTS}
+    path = os.path.join(bench_dir, '{}_{}.json'.format(rev, datetime.datetime.now().strftime('%Y%m%d-%H%M%S')))
+    with open(path, 'w') as f:
+        json.dump(summary, f, indent=4)
+    print('benchmark results written to {}'.format(path))
+
+
+@pytest.mark.parametrize('scenario, size', benchmark_cases())
+def test_benchmark(scenario, size, tmp_path, monkeypatch):
+    from dragen.run import Run
+
+    # logs and outputs of the run go to the temporary directory
+    monkeypatch.chdir(tmp_path)
+    box_size, resolution = size
+    case, changes = SCENARIOS[scenario]
+    parameters = dict(BASE, **changes)
+    Run(box_size=box_size, resolution=resolution, root=str(tmp_path), seed=SEED, **parameters).run()
+
+    timings_files = glob.glob(os.path.join(str(tmp_path), 'OutputData', '*', 'timings.json'))
+    assert len(timings_files) == 1
+    with open(timings_files[0]) as f:
+        timings = json.load(f)
+    stages = stage_times(timings)
+    assert 'run_rsa' in stages and 'run_tesselation' in stages
+    if changes.get('subs_flag'):
+        assert 'substructure' in stages
+
+    RESULTS.append({'scenario': scenario, 'test_case': case, 'box_size': box_size, 'resolution': resolution,
+                    'total_wall_time': timings['total_wall_time'], 'peak_rss_mb': timings['peak_rss_mb'],
+                    'stages': stages,
+                    'counts': {record['stage']: record['counts'] for record in timings['stages']}})
+
+
+def compare(old_path: str, new_path: str):
+    """
+    prints the wall time of every scenario and stage of two result files and the relative change
+    """
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    old_results = {(r['scenario'], r['box_size'], r['resolution']): r for r in old['results']}
+    print('{:<32}{:<28}{:>10}{:>10}{:>9}'.format('case', 'stage', old['revision'], new['revision'], 'change'))
+    for result in new['results']:
+        key = (result['scenario'], result['box_size'], result['resolution'])
+        if key not in old_results:
+            continue
+        name = '{}-{}x{}'.format(*key)
+        old_stages = dict(old_results[key]['stages'], total=old_results[key]['total_wall_time'])
+        new_stages = dict(result['stages'], total=result['total_wall_time'])
+        for stage, time in new_stages.items():
+            if stage not in old_stages:
+                continue
+            change = (time - old_stages[stage]) / old_stages[stage] * 100 if old_stages[stage] > 0 else 0
+            print('{:<32}{:<28}{:>10.3f}{:>10.3f}{:>8.1f}%'.format(name, stage, old_stages[stage], time, change))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print('usage: python Test_Cases/bench_stages.py <old results.json> <new results.json>')
+        sys.exit(1)
+    compare(sys.argv[1], sys.argv[2])
@@ -1,4 +1,19 @@
 import sys
 import os
+import pytest
 
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
\ No newline at end of file
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+def pytest_addoption(parser):
+    parser.addoption('--bench-large', action='store_true', default=False,
+                     help='also run the benchmarks with large rves (bench_stages.py)')
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption('--bench-large'):
+        return
+    skip_large = pytest.mark.skip(reason='large benchmark, run with --bench-large')
+    for item in items:
+        if 'bench_large' in item.keywords:
+            item.add_marker(skip_large)
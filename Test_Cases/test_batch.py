@@ -0,0 +1,62 @@
+"""
+dragen.run.Run.run_batch: a failing rve (also one which calls sys.exit) must not stop the batch, and every rve writes
+its results only into its own result-logs.
+"""
+import os
+import sys
+import logging
+import pandas as pd
+import pytest
+from dragen.run import Run
+from dragen.main3D import DataTask3D
+from dragen.utilities.InputInfo import RveInfo
+
+
+def sampled_grains(self):
+    total_df = pd.DataFrame({'a': [1.0], 'b': [1.0], 'c': [1.0], 'phaseID': [1]})
+    return total_df, total_df
+
+
+def failing_rve_generation(self, total_df):
+    # rve 1 fails like a helper with sys.exit, rve 2 with an exception
+    if self.context.store_path.endswith('_001'):
+        sys.exit()
+    if self.context.store_path.endswith('_002'):
+        raise RuntimeError('RSA Failed!')
+    return self.context.store_path
+
+
+def log_result(self, rve, total_df, ex_df):
+    RveInfo.RESULT_LOG.info('result of {}'.format(rve))
+
+
+@pytest.fixture
+def batch_rve(monkeypatch, tmp_path):
+    for name, value in dict(root=str(tmp_path), dimension=3, number_of_rves=4, num_cores=2, seed=7, subs_flag=False,
+                            calibration_rve_flag=False, memmap_flag=False, gui_flag=False).items():
+        monkeypatch.setattr(RveInfo, name, value)
+    monkeypatch.setattr(DataTask3D, 'grain_sampling', sampled_grains)
+    monkeypatch.setattr(DataTask3D, 'rve_generation', failing_rve_generation)
+    monkeypatch.setattr(DataTask3D, 'post_processing', log_result)
+    yield tmp_path
+    for logger in (RveInfo.LOGGER, RveInfo.RESULT_LOG):
+        for handler in list(logger.handlers):
+            if isinstance(handler, logging.FileHandler) and handler.baseFilename.startswith(str(tmp_path)):
+                logger.removeHandler(handler)
+                handler.close()
+
+
+def test_failing_rves_do_not_stop_the_batch(batch_rve):
+    results = Run.run_batch(None)
+    assert [result['status'] for result in results] == ['success', 'failed', 'failed', 'success']
+    assert 'SystemExit' in results[1]['error'] and 'RSA Failed!' in results[2]['error']
+
+    reports = [name for name in os.listdir(str(batch_rve) + '/OutputData') if name.endswith('_batch_report.csv')]
+    assert len(reports) == 1
+    report = pd.read_csv(str(batch_rve) + '/OutputData/' + reports[0])
+    assert list(report['status']) == ['success', 'failed', 'failed', 'success']
+
+    for result in (results[0], results[3]):
+        with open(result['store_path'] + '/result-logs') as f:
+            lines = f.read().splitlines()
+        assert len(lines) == 1 and lines[0].endswith('result of {}'.format(result['store_path']))
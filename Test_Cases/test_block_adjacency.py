@@ -0,0 +1,37 @@
+"""
+dragen.substructure.modification.block_adjacency must find the touching voxel faces of the blocks on the grid of the
+rve, also for a single layer of points and for coordinates with rounding noise.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from dragen.utilities.InputInfo import RveInfo
+from dragen.substructure.modification import block_adjacency
+
+
+@pytest.fixture
+def grid_rve(monkeypatch):
+    for name, value in dict(box_size=6, box_size_y=None, box_size_z=3, n_pts=12, n_pts_y=None, n_pts_z=6).items():
+        monkeypatch.setattr(RveInfo, name, value)
+
+
+def voxels(ijk, block_id, noise=0.0):
+    # the spacing of the grid is 0.5 along every axis
+    xyz = np.asarray(ijk, dtype=float) * 0.5
+    xyz += np.random.default_rng(0).uniform(-noise, noise, size=xyz.shape)
+    return pd.DataFrame({'x': xyz[:, 0], 'y': xyz[:, 1], 'z': xyz[:, 2], 'block_id': block_id})
+
+
+@pytest.mark.parametrize('noise', [0.0, 1e-6])
+def test_single_layer(grid_rve, noise):
+    # 4 x 3 points in the plane z = 2, block 1 in the first two rows of x, block 2 in the others
+    ijk = [(i, j, 2) for i in range(3, 7) for j in range(5, 8)]
+    rve_df = voxels(ijk, [1 if i < 5 else 2 for i, j, k in ijk], noise=noise)
+    pairs = block_adjacency(rve_df)
+    assert sorted(map(tuple, pairs.tolist())) == [(1, 2)] * 3
+
+
+def test_gaps_are_no_faces(grid_rve):
+    # the blocks in x = 1 and x = 4 don't touch, the ones in y = 1 and y = 2 touch
+    rve_df = voxels([(1, 1, 1), (4, 1, 1), (4, 2, 1)], [1, 2, 3])
+    assert block_adjacency(rve_df).tolist() == [[2, 3]]
@@ -0,0 +1,82 @@
+"""
+The checkpoints of the 3D stages (see dragen.utilities.checkpoints) are content addressed: a checkpoint is only
+resumed for the same grains and the same RveInfo fields the stages depend on.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from dragen.utilities.InputInfo import RveInfo
+from dragen.utilities.checkpoints import StageCheckpoints
+
+
+@pytest.fixture
+def checkpoint_rve(monkeypatch, tmp_path):
+    for name, value in dict(checkpoint_flag=True, resume=True, from_stage=None, checkpoint_path=str(tmp_path),
+                            rve_seed=42, slope_offset=0, lower_band_bound=2, upper_band_bound=4,
+                            band_ratio_final=0.75).items():
+        monkeypatch.setattr(RveInfo, name, value)
+
+
+@pytest.fixture
+def total_df():
+    return pd.DataFrame({'a': [2.0, 1.5], 'b': [1.0, 1.2], 'c': [1.1, 0.9], 'phaseID': [2, 2]})
+
+
+def test_resume_same_inputs(checkpoint_rve, total_df):
+    rve = np.arange(27, dtype='int16').reshape((3, 3, 3))
+    StageCheckpoints(total_df).save('rsa', {'rsa': rve, 'n_grains': 2, 'bands_df': None})
+    stage, state = StageCheckpoints(total_df).resume()
+    assert stage == 'rsa'
+    assert np.array_equal(state['rsa'], rve) and state['n_grains'] == 2 and state['bands_df'] is None
+
+
+@pytest.mark.parametrize('name, value', [('slope_offset', 0.5), ('upper_band_bound', 5), ('lower_band_bound', 1),
+                                         ('band_ratio_final', 0.8), ('rve_seed', 43)])
+def test_changed_input_is_not_resumed(checkpoint_rve, monkeypatch, total_df, name, value):
+    StageCheckpoints(total_df).save('rsa', {'rsa': np.zeros((3, 3, 3), dtype='int16')})
+    monkeypatch.setattr(RveInfo, name, value)
+    assert StageCheckpoints(total_df).resume() == (None, None)
+
+
+
+@pytest.mark.parametrize('from_stage', ['tesselation', 'inclusions', 'periodicity', 'export'])
+def test_resume_gives_the_uninterrupted_rve(monkeypatch, tmp_path, from_stage):
+    import random
+    from bench_stages import BASE, SCENARIOS
+    from dragen.run import Run
+    from dragen.main3D import DataTask3D
+    from dragen.generation.DiscreteRsa3D import DiscreteRsa3D
+    from dragen.utilities.InputInfo import GenerationContext
+
+    monkeypatch.chdir(tmp_path)
+    # the state before the export is the result of the checkpointed stages
+    monkeypatch.setattr(DataTask3D, 'export_stage', lambda self, state: state)
+    # the random numbers the inclusions are placed with
+    inclusion_states = list()
+    run_rsa_inclusions = DiscreteRsa3D.run_rsa_inclusions
+
+    def recorded_rsa_inclusions(self, rve):
+        inclusion_states.append((random.getstate(), np.random.get_state()[1].copy()))
+        return run_rsa_inclusions(self, rve)
+    monkeypatch.setattr(DiscreteRsa3D, 'run_rsa_inclusions', recorded_rsa_inclusions)
+
+    Run(box_size=15, resolution=1, root=str(tmp_path), seed=3, **dict(BASE, **SCENARIOS['inclusions'][1]))
+    Run.initializations(0)
+    context = GenerationContext.from_rveinfo(rve_seed=3, checkpoint_flag=True, checkpoint_path=str(tmp_path))
+    task = DataTask3D(context=context)
+    total_df, _ = task.grain_sampling()
+    expected = task.rve_generation(total_df)
+    assert len(inclusion_states) == 1
+
+    # a new process, the global generators are in any state
+    np.random.seed(1)
+    random.seed(1)
+    state = DataTask3D(context=task.context.replace(from_stage=from_stage)).rve_generation(total_df)
+    assert np.array_equal(state['periodic_rve'], expected['periodic_rve'])
+    assert np.array_equal(state['phases'], expected['phases'])
+    if from_stage in ('tesselation', 'inclusions'):
+        assert len(inclusion_states) == 2
+        assert inclusion_states[1][0] == inclusion_states[0][0]
+        assert np.array_equal(inclusion_states[1][1], inclusion_states[0][1])
+    else:
+        assert len(inclusion_states) == 1
@@ -0,0 +1,51 @@
+"""
+GenerationContext: an immutable snapshot of RveInfo which is written back into RveInfo when a generation runs.
+"""
+import pickle
+import numpy as np
+import pytest
+from dragen.utilities.InputInfo import RveInfo, GenerationContext
+
+
+@pytest.fixture
+def rve_info(monkeypatch):
+    for name, value in dict(box_size=10, n_pts=20, phase_ratio={1: 0.5, 2: 0.5}, phases=['Ferrite', 'Martensite'],
+                            bandwidths=np.array([1.5, 2.0]), t_mu=1.0).items():
+        monkeypatch.setattr(RveInfo, name, value)
+
+
+def test_values_are_frozen(rve_info):
+    context = GenerationContext.from_rveinfo()
+    assert context.box_size == 10 and context.phase_ratio[2] == 0.5 and context.phases == ('Ferrite', 'Martensite')
+    with pytest.raises(AttributeError):
+        context.box_size = 20
+    with pytest.raises(TypeError):
+        context.phase_ratio[1] = 1
+    with pytest.raises(TypeError):
+        context.values['box_size'] = 20
+    with pytest.raises(ValueError):
+        context.bandwidths[0] = 3.0
+    # the snapshot does not follow RveInfo
+    RveInfo.phase_ratio[1] = 1
+    assert context.phase_ratio[1] == 0.5
+
+
+def test_activate_and_pickle(rve_info):
+    context = GenerationContext.from_rveinfo().replace(box_size=12)
+    assert RveInfo.box_size == 10
+    context.activate()
+    assert RveInfo.box_size == 12
+    # values written by a stage (e.g. the substructure) are kept while the same context is active, a snapshot
+    # does not change the active context
+    RveInfo.t_mu = 2.0
+    GenerationContext.from_rveinfo()
+    context.activate()
+    assert RveInfo.t_mu == 2.0
+    # RveInfo gets mutable copies
+    RveInfo.phase_ratio[1] = 1
+    assert context.phase_ratio[1] == 0.5
+
+    copy = pickle.loads(pickle.dumps(context))
+    assert copy.box_size == 12 and copy.phase_ratio == {1: 0.5, 2: 0.5}
+    copy.activate()
+    assert RveInfo.phase_ratio == {1: 0.5, 2: 0.5}
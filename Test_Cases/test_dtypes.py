@@ -0,0 +1,46 @@
+"""
+Types of the rve arrays and the voxel table: the labels are int16 unless the grain ids need int32, the voxel table of
+the meshers has the same rows as the float64 meshgrid table it replaces.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from dragen.utilities.InputInfo import RveInfo
+from dragen.utilities.Helpers import HelperFunctions
+
+
+@pytest.fixture
+def small_rve(monkeypatch):
+    for name, value in dict(box_size=10, box_size_y=None, box_size_z=None, n_pts=20, n_pts_y=None, n_pts_z=None,
+                            bin_size=0.5, memmap_flag=False, subs_flag=False).items():
+        monkeypatch.setattr(RveInfo, name, value)
+
+
+def test_label_dtype(small_rve):
+    assert HelperFunctions.gen_array_new().dtype == np.int16
+    assert HelperFunctions.gen_array_new(n_labels=30000).dtype == np.int16
+    assert HelperFunctions.gen_array_new(n_labels=32000).dtype == np.int32
+
+
+def test_voxel_table(small_rve):
+    rve = np.random.default_rng(0).integers(1, 6, size=(20, 20, 20)).astype('int16')
+    rve[0, 0, 0] = -200
+    rve[1, 2, 3] = 9
+    periodic_rve = HelperFunctions().repair_periodicity_3D_new(rve)
+    assert periodic_rve.dtype == np.int16 and periodic_rve.shape == (21, 21, 21)
+
+    phases = np.array([0, 1, 2, 1, 2, 6])
+    rve_df = HelperFunctions.voxel_table(periodic_rve, phases)
+
+    axis = np.linspace(0, 10, 21, endpoint=True)
+    xx, yy, zz = np.meshgrid(axis, axis, axis, indexing='ij')
+    expected = pd.DataFrame({'x': xx.flatten(), 'y': yy.flatten(), 'z': zz.flatten(),
+                             'GrainID': periodic_rve.flatten().astype(float)})
+    assert list(rve_df.columns) == ['x', 'y', 'z', 'GrainID', 'box_size', 'n_pts', 'phaseID']
+    for column in ('x', 'y', 'z'):
+        assert rve_df[column].dtype == np.float32
+        assert np.allclose(rve_df[column], expected[column])
+    assert np.array_equal(rve_df['GrainID'], expected['GrainID'])
+    # the ids without a phase (-200 and 9) get phase 0
+    labels = periodic_rve.flatten()
+    assert np.array_equal(rve_df['phaseID'], np.where((labels >= 0) & (labels < 6), phases[labels.clip(0, 5)], 0))
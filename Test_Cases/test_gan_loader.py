@@ -0,0 +1,39 @@
+"""
+InputGenerator.gan_utils.GrainBatchLoader must give the same batches and leave the global torch generator in the same
+state as the DataLoader over the ConcatDataset it replaces.
+"""
+import pytest
+torch = pytest.importorskip('torch')
+from InputGenerator import gan_utils
+
+
+class LabeledData(torch.utils.data.Dataset):
+
+    def __init__(self, n, label):
+        self.result = torch.arange(n * 3, dtype=torch.float32).reshape(n, 3) + 100 * label
+        self.label = label
+
+    def __getitem__(self, x):
+        return self.result[x], self.label
+
+    def __len__(self):
+        return len(self.result)
+
+
+@pytest.mark.parametrize('shuffle', [True, False])
+def test_same_batches_as_dataloader(shuffle):
+    datasets = [LabeledData(37, 0), LabeledData(50, 1)]
+
+    torch.manual_seed(3)
+    loader = torch.utils.data.DataLoader(torch.utils.data.ConcatDataset(datasets), batch_size=16, shuffle=shuffle)
+    expected = [batch for _ in range(2) for batch in loader]
+    expected_next = torch.rand(3)
+
+    torch.manual_seed(3)
+    loader = gan_utils.GrainBatchLoader(datasets, batch_size=16, shuffle=shuffle)
+    batches = [batch for _ in range(2) for batch in loader]
+
+    assert len(batches) == len(expected) == 2 * len(loader)
+    for (data, labels), (expected_data, expected_labels) in zip(batches, expected):
+        assert torch.equal(data, expected_data) and torch.equal(labels, expected_labels)
+    assert torch.equal(torch.rand(3), expected_next)
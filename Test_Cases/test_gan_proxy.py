@@ -0,0 +1,23 @@
+"""
+InputGenerator.C_WGAN_GP.WGANCGP.proxy_loss (the online score of the top_k snapshots) must not change the generator.
+"""
+import os
+import pytest
+torch = pytest.importorskip('torch')
+pytest.importorskip('geomloss')
+pytest.importorskip('qhoptim')
+import pandas as pd
+from InputGenerator.C_WGAN_GP import WGANCGP
+
+INPUT = os.path.join(os.path.dirname(__file__), '..', 'ExampleInput', 'WGAN_Input')
+
+
+def test_proxy_keeps_the_batchnorm_stats(tmp_path):
+    dfs = [pd.read_csv(os.path.join(INPUT, name)) for name in ['Input_TDxBN_AR.csv', 'Input_RDxBN_AR.csv']]
+    gan = WGANCGP(df_list=dfs, storepath=str(tmp_path), num_features=3, normalize=True, top_k=2, n_proxy=64)
+    before = {name: value.clone() for name, value in gan.G.state_dict().items()}
+    assert any('running_mean' in name for name in before)
+
+    gan.proxy_loss()
+    assert gan.G.training
+    assert all(torch.equal(value, before[name]) for name, value in gan.G.state_dict().items())
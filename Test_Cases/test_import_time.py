@@ -0,0 +1,40 @@
+"""
+Import time regression test. Importing dragen.run (what every worker process of a parallel run does) must not load
+the heavy optional dependencies, they are imported where they are used. The import runs in a fresh interpreter, the
+time limit can be changed with the environment variable DRAGEN_IMPORT_LIMIT (seconds).
+"""
+import os
+import sys
+import json
+import subprocess
+
+REPO = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+HEAVY_MODULES = ('torch', 'damask', 'pyvista', 'vtk', 'tetgen', 'seaborn', 'sklearn', 'tkinter', 'cv2',
+                 'matplotlib.pyplot', 'scipy.stats', 'InputGenerator.C_WGAN_GP')
+
+IMPORT_LIMIT = float(os.environ.get('DRAGEN_IMPORT_LIMIT', 2.0))
+
+SCRIPT = """
+import sys, json, time
+start = time.perf_counter()
+import dragen.run
+print(json.dumps({'time': time.perf_counter() - start, 'modules': sorted(sys.modules)}))
+"""
+
+
+def import_dragen() -> dict:
+    output = subprocess.check_output([sys.executable, '-c', SCRIPT], cwd=REPO)
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def test_no_heavy_imports():
+    modules = import_dragen()['modules']
+    loaded = [module for module in HEAVY_MODULES if module in modules]
+    assert loaded == [], 'importing dragen.run loads {}'.format(loaded)
+
+
+def test_import_time():
+    # best of three, the first import also compiles the bytecode
+    import_time = min(import_dragen()['time'] for _ in range(3))
+    assert import_time < IMPORT_LIMIT, 'importing dragen.run took {:.2f} s'.format(import_time)
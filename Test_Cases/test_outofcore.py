@@ -0,0 +1,58 @@
+"""
+The out-of-core mode (RveInfo.memmap_flag, see dragen.utilities.outofcore) must give the same voxels as the in-memory
+version: the periodic grains evaluated in blocks, the counts and the free voxels picked slab by slab.
+"""
+import os
+import numpy as np
+import pytest
+from dragen.utilities.InputInfo import RveInfo
+from dragen.utilities.Helpers import HelperFunctions
+from dragen.utilities import outofcore
+
+
+@pytest.fixture
+def memmap_rve(monkeypatch, tmp_path):
+    # small cubic rve with slabs of a few planes
+    for name, value in dict(box_size=10, box_size_y=None, box_size_z=None, n_pts=20, n_pts_y=None, n_pts_z=None,
+                            bin_size=0.5, slope_offset=0, store_path=str(tmp_path), memmap_flag=True,
+                            memmap_chunk=1000).items():
+        monkeypatch.setattr(RveInfo, name, value)
+    return tmp_path
+
+
+@pytest.mark.parametrize('a, b, c, alpha, x_0, y_0, z_0', [(2.0, 1.5, 1.0, 0, 3, 17, 9),
+                                                            (4.5, 2.0, 3.0, 35, 0, 19, 19),
+                                                            (12.0, 8.0, 6.0, 80, 11, 2, 5)])
+def test_periodic_grain_blocks(memmap_rve, a, b, c, alpha, x_0, y_0, z_0):
+    helpers = HelperFunctions()
+    grain = np.zeros((20, 20, 20), dtype='int16')
+    grain[helpers.ellipsoid(a, b, c, alpha=alpha) <= 1] = 1
+    expected = helpers.make_periodic_3D_new(grain, x_0, y_0, z_0) == 1
+
+    rve = np.zeros((20, 20, 20), dtype=bool)
+    for index, inside in helpers.periodic_grain_blocks(a, b, c, x_0, y_0, z_0, shape=rve.shape, alpha=alpha):
+        block = rve[index]
+        block[inside] = True
+        rve[index] = block
+    assert np.array_equal(rve, expected)
+
+
+def test_slab_operations(memmap_rve):
+    values = np.random.default_rng(0).integers(-2, 6, size=(20, 20, 20)).astype('int16')
+    rve = outofcore.voxel_array(values.shape, dtype='int16')
+    assert isinstance(rve, np.memmap)
+    rve[:] = values
+
+    assert outofcore.count_equal(rve, 0) == np.count_nonzero(values == 0)
+    assert list(outofcore.label_counts(rve, 5)) == [np.count_nonzero(values == i) for i in range(6)]
+    free = np.where(values == 0)
+    positions = [len(free[0]) - 1, 0, 345]
+    assert outofcore.nth_indices(rve, 0, positions) == [tuple(axis[p] for axis in free) for p in positions]
+
+    copy = outofcore.copy_array(rve)
+    outofcore.replace(copy, -1, 7)
+    values[values == -1] = 7
+    assert np.array_equal(copy, values)
+
+    outofcore.release_arrays(str(memmap_rve))
+    assert not os.path.isdir(outofcore.memmap_path(str(memmap_rve)))
@@ -1,14 +1,15 @@
-import matplotlib.pyplot as plt
 import numpy as np
 import logging
-from dragen.utilities.InputInfo import RveInfo
+from dragen.utilities.InputInfo import in_context
+from dragen.utilities.progress import Progress, notify
 
 from dragen.utilities.Helpers import HelperFunctions
 
 
 class Tesselation2D(HelperFunctions):
-    def __init__(self, grains_df):
-        super().__init__()
+    @in_context
+    def __init__(self, grains_df, context=None):
+        super().__init__(context=context)
 
         self.grains_df = grains_df
         self.a = grains_df['a'].tolist()
@@ -31,11 +32,8 @@ class Tesselation2D(HelperFunctions):
         y_0 = self.y_0[iterator-1]
         a_i = a[iterator - 1]
         b_i = b[iterator - 1]
-        a_i = a_i + a_i/self.a_max*RveInfo.bin_size
-        b_i = b_i + b_i/self.b_max*RveInfo.bin_size
-        if iterator == 1:
-            print(a_i)
-            print(b_i)
+        a_i = a_i + a_i/self.a_max*self.context.bin_size
+        b_i = b_i + b_i/self.b_max*self.context.bin_size
         a[iterator - 1] = a_i
         b[iterator - 1] = b_i
 
@@ -44,6 +42,7 @@ class Tesselation2D(HelperFunctions):
         return ellipse, a, b
 
     def tesselation_plotter(self, array, epoch):
+        import matplotlib.pyplot as plt
         n_grains = len(self.a)
         rve_x, rve_y = np.where(array >= 1)
         unoccupied_pts_x, unoccupied_pts_y = np.where(array == 0)
@@ -61,11 +60,12 @@ class Tesselation2D(HelperFunctions):
         fig = plt.figure()
         plt.scatter(unoccupied_area_x, unoccupied_area_y, c='gray', s=1)
         plt.scatter(grains_x, grains_y, c=array[np.where(array > 0)], s=1, vmin=0, vmax=n_grains, cmap='seismic')
-        plt.xlim(-5, RveInfo.box_size + 5)
-        plt.ylim(-5, RveInfo.box_size + 5)
-        plt.savefig(RveInfo.fig_path+'/2D_Tesselation_Epoch_{}.png'.format(epoch))
+        plt.xlim(-5, self.context.box_size + 5)
+        plt.ylim(-5, self.context.box_size + 5)
+        plt.savefig(self.context.fig_path+'/2D_Tesselation_Epoch_{}.png'.format(epoch))
         plt.close(fig)
 
+    @in_context
     def run_tesselation(self, rsa):
 
         # define some variables
@@ -76,10 +76,12 @@ class Tesselation2D(HelperFunctions):
         b = self.b
         epoch = 0
         n_grains = len(self.a)
+        # the progress of the tesselation is the filled area in %
+        progress = Progress('tesselation', total=100).start()
 
         # load some variables
         rve = rsa
-        empty_rve = np.zeros((2 * RveInfo.n_pts, 2 * RveInfo.n_pts), dtype=np.int32)
+        empty_rve = np.zeros((2 * self.context.n_pts, 2 * self.context.n_pts), dtype=np.int32)
         empty_rve = super().gen_boundaries_2D(empty_rve)
         rve_boundaries = empty_rve.copy()  # empty rve grid with defined boundaries
 
@@ -100,7 +102,7 @@ class Tesselation2D(HelperFunctions):
                 periodic_grain = super().make_periodic_2D(grain, ellipse, iterator=idx)
                 rve[(periodic_grain == idx) & (rve == 0)] = idx
                 freepoints = np.count_nonzero(rve == 0)
-                grain_vol = np.count_nonzero(rve == idx)*RveInfo.bin_size**2
+                grain_vol = np.count_nonzero(rve == idx)*self.context.bin_size**2
                 if freepoints == 0:
                     break
 
@@ -121,20 +123,19 @@ class Tesselation2D(HelperFunctions):
 
             if not grain_idx:
                 repeat = True
-                RveInfo.LOGGER.info('grain growth had to be reset at {}% of volume filling'.format(packingratio))
-                #self.infobox_obj.emit('grain growth had to be reset at {}% of volume filling'.format(packingratio))
+                notify('grain growth had to be reset at {}% of volume filling'.format(packingratio), 'tesselation')
                 if packingratio < 90:
-                    RveInfo.LOGGER.info('your microstructure data does not contain enough data to fill this boxsize please decrease the boxsize for reasonable results')
-                #    self.infobox_obj.emit('your microstructure data does not contain \n'
-                #                          'enough data to fill this boxsize\n'
-                #                          'please decrease the boxsize for reasonable results')
+                    notify('your microstructure data does not contain \n'
+                           'enough data to fill this boxsize\n'
+                           'please decrease the boxsize for reasonable results', 'tesselation')
                 grain_idx = grain_idx_backup.copy()
 
             epoch += 1
             packingratio = (1-freepoints/vol_0)*100
-            print('packingratio:', packingratio, '%')
+            progress.update(packingratio, epochs=epoch)
         if packingratio == 100:
             status = True
+        progress.finish(epochs=epoch)
         return rve, status
 
 
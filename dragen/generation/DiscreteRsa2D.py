@@ -1,15 +1,16 @@
 import numpy as np
-import matplotlib.pyplot as plt
 import random
 import datetime
 import logging
 from scipy.ndimage import convolve
 
 from dragen.utilities.Helpers import HelperFunctions
-from dragen.utilities.InputInfo import RveInfo
+from dragen.utilities.InputInfo import RveInfo, in_context
+from dragen.utilities.progress import Progress
 
 class DiscreteRsa2D(HelperFunctions):
-    def __init__(self, a, b, alpha):
+    @in_context
+    def __init__(self, a, b, alpha, context=None):
 
 
         self.a = a
@@ -17,7 +18,7 @@ class DiscreteRsa2D(HelperFunctions):
         self.alpha = alpha
         self.n_grains = len(a)
 
-        super().__init__()
+        super().__init__(context=context)
 
         self.x_grid, self.y_grid = super().gen_grid2d()
 
@@ -36,7 +37,6 @@ class DiscreteRsa2D(HelperFunctions):
         idx = random.choice(range(len(unoccupied_area_x)))
         x_0 = unoccupied_area_x[idx]
         y_0 = unoccupied_area_y[idx]
-        print('x_0_{}: {}, y_0_{}: {}'.format(iterator, x_0, iterator, y_0))
         a = a[iterator]
         b = b[iterator]
         alpha = alpha[iterator]
@@ -46,6 +46,7 @@ class DiscreteRsa2D(HelperFunctions):
         return ellipse, x_0, y_0
 
     def rsa_plotter(self, array, n_grains, iterator, attempt):
+        import matplotlib.pyplot as plt
         rsa_x, rsa_y = np.where((array >= 1) | (array == -200) | (array < -200))
         outside_x, outside_y = np.where(array < 0)
         unoccupied_pts_x, unoccupied_pts_y = np.where(array == 0)
@@ -69,11 +70,12 @@ class DiscreteRsa2D(HelperFunctions):
         plt.scatter(grains_x, grains_y, c=array[np.where(array > 0)], s=1, vmin=0, vmax=n_grains, cmap='seismic')
         # plt.scatter(boundary_x, boundary_y, c='r')
         # plt.scatter(ellipse_outside_x, ellipse_outside_y, c='k')
-        plt.xlim(-5, RveInfo.box_size + 5)
-        plt.ylim(-5, RveInfo.box_size + 5)
-        plt.savefig(RveInfo.store_path+'/Figs/2D_RSA_Epoch_{}_{}.png'.format(iterator, attempt))
+        plt.xlim(-5, self.context.box_size + 5)
+        plt.ylim(-5, self.context.box_size + 5)
+        plt.savefig(self.context.store_path+'/Figs/2D_RSA_Epoch_{}_{}.png'.format(iterator, attempt))
         plt.close(fig)
 
+    @in_context
     def run_rsa(self):
 
         # define some variables
@@ -85,6 +87,7 @@ class DiscreteRsa2D(HelperFunctions):
         rsa = super().gen_array_2d()
         rsa = super().gen_boundaries_2D(rsa)
         rsa_boundaries = rsa.copy()
+        progress = Progress('rsa', total=self.n_grains).start()
 
         free_points = np.count_nonzero(rsa == 0)
         while i < self.n_grains + 1 | attempt < free_points:
@@ -95,7 +98,7 @@ class DiscreteRsa2D(HelperFunctions):
             periodic_grain = super().make_periodic_2D(grain, ellipse, iterator=i)
             rsa[(periodic_grain == i) & (rsa == 0)] = i
 
-            if RveInfo.anim_flag:
+            if self.context.anim_flag:
                 self.rsa_plotter(rsa, self.n_grains, iterator=i, attempt=attempt)
 
             free_points = np.count_nonzero(rsa == 0)
@@ -108,11 +111,13 @@ class DiscreteRsa2D(HelperFunctions):
                 x_0_list.append(x0)
                 y_0_list.append(y0)
                 attempt = 0
+            progress.update(len(x_0_list), attempts=attempt)
 
         if len(x_0_list) == self.n_grains:
             status = True
         else:
             RveInfo.LOGGER.info("Not all grains could be placed please decrease shrinkfactor!")
+        progress.finish(grains=len(x_0_list))
 
         return rsa, x_0_list, y_0_list, status
 
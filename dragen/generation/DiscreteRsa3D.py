@@ -2,20 +2,22 @@ import sys
 import time
 
 import numpy as np
-import matplotlib.pyplot as plt
 import random
 import datetime
 
 
 from scipy.ndimage import convolve
-from tqdm import tqdm
 from dragen.utilities.Helpers import HelperFunctions
-from dragen.utilities.InputInfo import RveInfo
+from dragen.utilities.InputInfo import RveInfo, in_context
+from dragen.utilities.instrumentation import timed_stage
+from dragen.utilities.progress import Progress
+from dragen.utilities.outofcore import count_equal, nth_indices
 
 
 class DiscreteRsa3D(HelperFunctions):
 
-    def __init__(self, a, b, c, alpha):
+    @in_context
+    def __init__(self, a, b, c, alpha, context=None):
 
         self.a = a
         self.b = b
@@ -23,7 +25,7 @@ class DiscreteRsa3D(HelperFunctions):
         self.alpha = alpha
         self.n_grains = len(a)
 
-        super().__init__()
+        super().__init__(context=context)
         """n_x = RveInfo.n_pts
         n_y = RveInfo.n_pts
         n_z = RveInfo.n_pts
@@ -34,8 +36,6 @@ class DiscreteRsa3D(HelperFunctions):
         shape = (n_x, n_y, n_z)"""
 
         self.x_grid, self.y_grid, self.z_grid = super().gen_grid_new()
-        if not RveInfo.gui_flag:
-            self.pbar = tqdm(total=self.n_grains)
 
     def gen_ellipsoid(self, array, iterator):
         t_0 = datetime.datetime.now()
@@ -44,22 +44,8 @@ class DiscreteRsa3D(HelperFunctions):
         c = self.c
         alpha = self.alpha
 
-        unoccupied_pts_x, unoccupied_pts_y, unoccupied_pts_z = np.where(array == 0)
-        unoccupied_tuples = [*zip(unoccupied_pts_x, unoccupied_pts_y, unoccupied_pts_z)]
-
-
-        """unoccupied_area_x = [self.x_grid[unoccupied_tuples_i[0]][unoccupied_tuples_i[1]][unoccupied_tuples_i[2]]
-                             for unoccupied_tuples_i in unoccupied_tuples]
-        unoccupied_area_y = [self.y_grid[unoccupied_tuples_i[0]][unoccupied_tuples_i[1]][unoccupied_tuples_i[2]]
-                             for unoccupied_tuples_i in unoccupied_tuples]
-        unoccupied_area_z = [self.z_grid[unoccupied_tuples_i[0]][unoccupied_tuples_i[1]][unoccupied_tuples_i[2]]
-                             for unoccupied_tuples_i in unoccupied_tuples]
-        """
-        #print(unoccupied_pts_z)
-        #sys.exit()
-        x_0 = random.choice(unoccupied_pts_x)
-        y_0 = random.choice(unoccupied_pts_y)
-        z_0 = random.choice(unoccupied_pts_z)
+        # a random free voxel for each coordinate, looked up without listing all free voxels
+        x_0, y_0, z_0 = self.gen_center(array, count_equal(array, 0))
 
         #x_0 = int(unoccupied_area_x[idx])
         #y_0 = int(unoccupied_area_y[idx])
@@ -72,15 +58,84 @@ class DiscreteRsa3D(HelperFunctions):
 
         ellipsoid = super().ellipsoid(a, b, c, alpha=alpha)
 
-        inside = ellipsoid <= 1
-        ellipsoid_array = np.zeros_like(ellipsoid, dtype='int16')
-        ellipsoid_array[inside] = 1
         time_elapse = datetime.datetime.now() - t_0
-        if RveInfo.debug:
+        if self.context.debug:
             RveInfo.LOGGER.info('time spent on ellipsoid{}: {}'.format(iterator, time_elapse.total_seconds()))
         return ellipsoid, x_0, y_0, z_0
 
+    def gen_center(self, array, free_points):
+        """
+        center of gen_ellipsoid: the x, y and z of three random free voxels (as random.choice on the lists of
+        np.where(array == 0) picks them), looked up slab by slab instead of listing all free voxels
+        :param free_points: number of free voxels (0) in array
+        """
+        positions = [random.randrange(free_points) for _ in range(3)]
+        x_0, y_0, z_0 = [index[axis] for axis, index in enumerate(nth_indices(array, 0, positions))]
+        return x_0, y_0, z_0
+
+    def place_grains_blocks(self, rsa, progress):
+        """
+        placement loop of run_rsa for cubic boxes: a grain is only evaluated in blocks of its bounding box (see HelperFunctions.periodic_grain_blocks) and written to rsa after
+        it is accepted, so no backup of rsa is needed and the free and band voxels are counted while placing
+        :return: x_0_list, y_0_list, z_0_list and the index of the next grain
+        """
+        x_0_list = list()
+        y_0_list = list()
+        z_0_list = list()
+
+        i = 1
+        attempt = 0
+        free_points = count_equal(rsa, 0)
+        band_points = count_equal(rsa, -200)
+        while i < self.n_grains + 1 | attempt < free_points:
+            t_0 = datetime.datetime.now()
+            x0, y0, z0 = self.gen_center(rsa, free_points)
+            grain_args = (self.a[i - 1], self.b[i - 1], self.c[i - 1], x0, y0, z0)
+            grain_kwargs = dict(shape=rsa.shape, alpha=self.alpha[i - 1], grain_id=i, single_voxel=True)
+
+            # first pass: count the voxels of the grain and the free and band voxels it would take
+            grain_points, free_hits, band_hits = 0, 0, 0
+            for index, inside in super().periodic_grain_blocks(*grain_args, **grain_kwargs):
+                block = rsa[index]
+                grain_points += np.count_nonzero(inside)
+                free_hits += np.count_nonzero(inside & (block == 0))
+                band_hits += np.count_nonzero(inside & (block == -200))
+
+            if grain_points == 0:
+                accepted = False
+            elif band_points > 0:
+                intersecting_pts = grain_points - (free_hits + band_hits)
+                accepted = not intersecting_pts / grain_points > self.context.allowed_intersection_ratio
+            else:
+                intersecting_pts = grain_points - free_hits
+                accepted = not intersecting_pts / grain_points > 0.01
+
+            if accepted:
+                # second pass: place the grain
+                for index, inside in super().periodic_grain_blocks(*grain_args, **grain_kwargs):
+                    block = rsa[index]
+                    block[inside & ((block == 0) | (block == -200))] = i
+                    rsa[index] = block
+                free_points -= free_hits
+                band_points -= band_hits
+                if self.context.anim_flag:
+                    self.rsa_plotter(rsa, iterator=i, attempt=attempt)
+                x_0_list.append(x0)
+                y_0_list.append(y0)
+                z_0_list.append(z0)
+                i = i + 1
+                attempt = 0
+                if self.context.debug:
+                    time_elapse = datetime.datetime.now() - t_0
+                    RveInfo.LOGGER.info(
+                        'total time needed for placement of grain {}: {}'.format(i, time_elapse.total_seconds()))
+            else:
+                attempt = attempt + 1
+            progress.update(len(x_0_list), attempts=attempt)
+        return x_0_list, y_0_list, z_0_list, i
+
     def rsa_plotter(self, array, iterator, attempt):
+        import matplotlib.pyplot as plt
         plt.ioff()
         t_0 = datetime.datetime.now()
         n_grains = self.n_grains
@@ -110,9 +165,9 @@ class DiscreteRsa3D(HelperFunctions):
                    vmax=n_grains, cmap='seismic')  # lower -200 for band grains and inclusions
         ax.scatter(free_space_x, free_space_y, free_space_z, color='grey', alpha=0.5)
 
-        ax.set_xlim(-5, RveInfo.box_size + 5)
-        ax.set_ylim(-5, RveInfo.box_size + 5)
-        ax.set_zlim(-5, RveInfo.box_size + 5)
+        ax.set_xlim(-5, self.context.box_size + 5)
+        ax.set_ylim(-5, self.context.box_size + 5)
+        ax.set_zlim(-5, self.context.box_size + 5)
         ax.set_xlabel('x (µm)')
         ax.set_ylabel('y (µm)')
         ax.set_zlabel('z (µm)')
@@ -123,105 +178,104 @@ class DiscreteRsa3D(HelperFunctions):
         # ax.view_init(90, 270) #facing against z-direction (counterclockwise rotation)
         #plt.show()
 
-        plt.savefig(RveInfo.store_path + '/Figs/3D_Epoch_{}_{}.png'.format(iterator, attempt))
+        plt.savefig(self.context.store_path + '/Figs/3D_Epoch_{}_{}.png'.format(iterator, attempt))
         plt.close(fig)
         time_elapse = datetime.datetime.now() - t_0
-        if RveInfo.debug:
+        if self.context.debug:
             RveInfo.LOGGER.info('time spent on plotter for grain {}: {}'.format(iterator, time_elapse.total_seconds()))
 
+    @in_context
+    @timed_stage('run_rsa', counts=lambda result, self, *args, **kwargs: {'voxels': result[0].size,
+                                                                         'grains': self.n_grains})
     def run_rsa(self, band_ratio_rsa=None, banded_rsa_array=None, x0_alt=None, y0_alt=None, z0_alt=None):
-        if RveInfo.gui_flag:
-            RveInfo.infobox_obj.emit('starting RSA')
-        else:
-            print('starting RSA')
+        progress = Progress('rsa', total=self.n_grains).start()
         status = False
 
         if banded_rsa_array is None:
-            rsa = super().gen_array_new()
+            rsa = super().gen_array_new(n_labels=self.n_grains)
 
         else:
             rsa = banded_rsa_array
 
-        x_0_list = list()
-        y_0_list = list()
-        z_0_list = list()
-
-        i = 1
-        attempt = 0
-        free_points = np.count_nonzero(rsa == 0)
-        while i < self.n_grains + 1 | attempt < free_points:
-
-            t_0 = datetime.datetime.now()
-            free_points_old = np.count_nonzero(rsa == 0)
-            band_points_old = np.count_nonzero(rsa == -200)
-            backup_rsa = rsa.copy()
-            ellipsoid, x0, y0, z0 = self.gen_ellipsoid(rsa, iterator=i - 1)
-            grain = np.zeros_like(ellipsoid, dtype='int16')
-            grain[ellipsoid <= 1] = i
-            # check that at least one element is not 0
-            if np.count_nonzero(grain) == 0:
-                # if there is no element set to the value i give set one element at x_0, y_0, z_0 to i manually
-                grain[x0, y0, z0] = i
-
-            periodic_grain = super().make_periodic_3D_new(grain, x0, y0, z0)
-
-            rsa[(periodic_grain == i) & ((rsa == 0) | (rsa == -200))] = i
-            if RveInfo.anim_flag:
-                self.rsa_plotter(rsa, iterator=i, attempt=attempt)
+        if self.context.box_size_y is None and self.context.box_size_z is None:
+            x_0_list, y_0_list, z_0_list, i = self.place_grains_blocks(rsa, progress)
+        else:
+            x_0_list = list()
+            y_0_list = list()
+            z_0_list = list()
 
+            i = 1
+            attempt = 0
             free_points = np.count_nonzero(rsa == 0)
-            band_points = np.count_nonzero(rsa == -200)
-
-            if band_points_old > 0:
-                intersecting_pts = np.count_nonzero(periodic_grain) - (free_points_old + band_points_old - free_points - band_points)
-                intersecting_ratio = intersecting_pts/np.count_nonzero(periodic_grain)
-                if intersecting_ratio > RveInfo.allowed_intersection_ratio:
-                    rsa = backup_rsa.copy()
-                    attempt = attempt + 1
-
+            while i < self.n_grains + 1 | attempt < free_points:
+
+                t_0 = datetime.datetime.now()
+                free_points_old = np.count_nonzero(rsa == 0)
+                band_points_old = np.count_nonzero(rsa == -200)
+                backup_rsa = rsa.copy()
+                ellipsoid, x0, y0, z0 = self.gen_ellipsoid(rsa, iterator=i - 1)
+                grain = np.zeros_like(ellipsoid, dtype=rsa.dtype)
+                grain[ellipsoid <= 1] = i
+                # check that at least one element is not 0
+                if np.count_nonzero(grain) == 0:
+                    # if there is no element set to the value i give set one element at x_0, y_0, z_0 to i manually
+                    grain[x0, y0, z0] = i
+
+                periodic_grain = super().make_periodic_3D_new(grain, x0, y0, z0)
+
+                rsa[(periodic_grain == i) & ((rsa == 0) | (rsa == -200))] = i
+                if self.context.anim_flag:
+                    self.rsa_plotter(rsa, iterator=i, attempt=attempt)
+
+                free_points = np.count_nonzero(rsa == 0)
+                band_points = np.count_nonzero(rsa == -200)
+
+                if band_points_old > 0:
+                    intersecting_pts = np.count_nonzero(periodic_grain) - (free_points_old + band_points_old - free_points - band_points)
+                    intersecting_ratio = intersecting_pts/np.count_nonzero(periodic_grain)
+                    if intersecting_ratio > self.context.allowed_intersection_ratio:
+                        rsa = backup_rsa.copy()
+                        attempt = attempt + 1
+
+                    else:
+                        x_0_list.append(x0)
+                        y_0_list.append(y0)
+                        z_0_list.append(z0)
+                        i = i + 1
+                        attempt = 0
+                        if self.context.debug:
+                            time_elapse = datetime.datetime.now() - t_0
+                            RveInfo.LOGGER.info(
+                                'total time needed for placement of grain {}: {}'.format(i, time_elapse.total_seconds()))
                 else:
-                    x_0_list.append(x0)
-                    y_0_list.append(y0)
-                    z_0_list.append(z0)
-                    i = i + 1
-                    attempt = 0
-                    if RveInfo.debug:
-                        time_elapse = datetime.datetime.now() - t_0
-                        RveInfo.LOGGER.info(
-                            'total time needed for placement of grain {}: {}'.format(i, time_elapse.total_seconds()))
-            else:
-                # free points old - free points should equal non zero in periodic grain
-                if np.count_nonzero(periodic_grain) == 0:
-                    rsa = backup_rsa.copy()
-                    attempt = attempt + 1
-                    continue
-                intersecting_pts = np.count_nonzero(periodic_grain) - (free_points_old - free_points)
-                intersecting_ratio = intersecting_pts / np.count_nonzero(periodic_grain)
-
-                if intersecting_ratio > 0.01:
-                    rsa = backup_rsa.copy()
-                    attempt = attempt + 1
-                else:
-                    x_0_list.append(x0)
-                    y_0_list.append(y0)
-                    z_0_list.append(z0)
-                    i = i + 1
-                    attempt = 0
-                    if RveInfo.debug:
-                        time_elapse = datetime.datetime.now() - t_0
-                        RveInfo.LOGGER.info(
-                            'total time needed for placement of grain {}: {}'.format(i, time_elapse.total_seconds()))
-            progress = int((float(len(x_0_list))/self.n_grains * 100))
-            if RveInfo.gui_flag:
-                RveInfo.progress_obj.emit(progress)
-            else:
-                inc = i - self.pbar.n
-                self.pbar.update(n=inc)
+                    # free points old - free points should equal non zero in periodic grain
+                    if np.count_nonzero(periodic_grain) == 0:
+                        rsa = backup_rsa.copy()
+                        attempt = attempt + 1
+                        continue
+                    intersecting_pts = np.count_nonzero(periodic_grain) - (free_points_old - free_points)
+                    intersecting_ratio = intersecting_pts / np.count_nonzero(periodic_grain)
+
+                    if intersecting_ratio > 0.01:
+                        rsa = backup_rsa.copy()
+                        attempt = attempt + 1
+                    else:
+                        x_0_list.append(x0)
+                        y_0_list.append(y0)
+                        z_0_list.append(z0)
+                        i = i + 1
+                        attempt = 0
+                        if self.context.debug:
+                            time_elapse = datetime.datetime.now() - t_0
+                            RveInfo.LOGGER.info(
+                                'total time needed for placement of grain {}: {}'.format(i, time_elapse.total_seconds()))
+                progress.update(len(x_0_list), attempts=attempt)
 
         if (len(x_0_list) == self.n_grains) or (i - 1) == self.n_grains:
             status = True
         else:
             RveInfo.LOGGER.info("Not all grains could be placed please decrease shrinkfactor!")
+        progress.finish(grains=len(x_0_list))
 
         # If a list from previous Band grains is given:
         if x0_alt is None and y0_alt is None and z0_alt is None:
@@ -233,6 +287,9 @@ class DiscreteRsa3D(HelperFunctions):
 
         return rsa, x_0_list, y_0_list, z_0_list, status
 
+    @in_context
+    @timed_stage('run_rsa_clustered', counts=lambda result, self, *args, **kwargs: {'voxels': result[0].size,
+                                                                                   'grains': self.n_grains})
     def run_rsa_clustered(self, previous_rsa, band_array, animation=True, startindex=0):
         """
         Parameters:
@@ -261,13 +318,12 @@ class DiscreteRsa3D(HelperFunctions):
         rsa[np.where(shadow_rsa == 0)] = -200
         # Init
         band_vol_0 = np.count_nonzero(rsa == -200)  # Zähle -200 für initiales Gefüge
-        print('Initiales, nicht belegbares Volumen:', band_vol_0)
+        RveInfo.LOGGER.debug('Initiales, nicht belegbares Volumen: {}'.format(band_vol_0))
+        progress = Progress('rsa_clustered', total=self.n_grains).start()
         x_0_list = list()
         y_0_list = list()
         z_0_list = list()
 
-        rsa_boundaries = rsa.copy()
-
         i = 1
         attempt = 0
         sum_attempts = 0
@@ -279,10 +335,9 @@ class DiscreteRsa3D(HelperFunctions):
             t_0 = datetime.datetime.now()
             free_points_old = np.count_nonzero(rsa == 0)
             band_points_old = np.count_nonzero(rsa == -200)  # Same as band_vol_0
-            grain = rsa_boundaries.copy()
             backup_rsa = rsa.copy()
             ellipsoid, x0, y0, z0 = self.gen_ellipsoid(rsa, iterator=i - 1)
-            grain = np.zeros_like(ellipsoid, dtype='int16')
+            grain = np.zeros_like(ellipsoid, dtype=rsa.dtype)
             grain[ellipsoid <= 1] = i
             periodic_grain = super().make_periodic_3D_new(grain, x0, y0, z0)
 
@@ -298,7 +353,6 @@ class DiscreteRsa3D(HelperFunctions):
                 ##        (band_points / band_vol_0 < 0.90):  # Prozentbereich nach außen muss möglich sein (90%)
                 if ((free_points_old + band_points_old - free_points - band_points) != 1.0 * np.count_nonzero(periodic_grain)) and \
                         (band_points / band_vol_0 < 0.90):  # Prozentbereich nach außen muss möglich sein (90%)
-                    print('Attempt: ', attempt)
                     rsa = backup_rsa.copy()
                     attempt = attempt + 1
                 else:
@@ -309,9 +363,10 @@ class DiscreteRsa3D(HelperFunctions):
                     z_0_list.append(z0)
                     i = i + 1
                     sum_attempts = sum_attempts + attempt
-                    if RveInfo.anim_flag:
+                    if self.context.anim_flag:
                         self.rsa_plotter(placement_rsa, iterator=-(1000 + i + startindex), attempt=attempt)
                     attempt = 1
+            progress.update(len(x_0_list), attempts=attempt)
 
 
         # Mindestens 90% der Körner müssen platziert werden.
@@ -320,18 +375,21 @@ class DiscreteRsa3D(HelperFunctions):
         else:
             RveInfo.LOGGER.info("Not all grains could be placed please decrease shrinkfactor!")
 
+        progress.finish(grains=len(x_0_list), attempts=sum_attempts)
+
         # Change -200 in rsa_array back to 0
-        print(np.asarray(np.unique(placement_rsa, return_counts=True)).T)
         placement_rsa[np.where(placement_rsa == -200)] = 0
-        print(np.asarray(np.unique(placement_rsa, return_counts=True)).T)
 
         rsa[np.where(placement_rsa == -200)] = 0
 
-        with open(RveInfo.store_path + '/rve.log', 'a') as log:
+        with open(self.context.store_path + '/rve.log', 'a') as log:
             log.writelines('Total number of attempts needed: {}\n\n'.format(sum_attempts))
 
         return placement_rsa, x_0_list, y_0_list, z_0_list, status
 
+    @in_context
+    @timed_stage('run_rsa_inclusions', counts=lambda result, self, rve: {'voxels': result[0].size,
+                                                                         'grains': self.n_grains})
     def run_rsa_inclusions(self, rve):
         """
         RSA-Algorithm to place Inclusions in the RVE: The main difference between the inclusions and "normal" (e.g.
@@ -364,14 +422,14 @@ class DiscreteRsa3D(HelperFunctions):
         #new_rve = super().gen_boundaries_3D(new_rve)
         inc_rve = rve.copy()
 
+        progress = Progress('rsa_inclusions', total=self.n_grains).start()
         i = 1
         attempt = 0
         while (i < self.n_grains + 1) & (attempt < 5000):
-            grain = new_rve.copy()
             backup = inc_rve.copy()
             ellipsoid, x0, y0, z0 = self.gen_ellipsoid(new_rve, iterator=i - 1)
 
-            grain = np.zeros_like(ellipsoid, dtype='int16')
+            grain = np.zeros_like(ellipsoid, dtype=inc_rve.dtype)
             grain[ellipsoid <= 1] = i
             periodic_grain = super().make_periodic_3D_new(grain, x0, y0, z0)
 
@@ -382,13 +440,14 @@ class DiscreteRsa3D(HelperFunctions):
             check = set(rve[np.where(inc_rve == -(200 + i))])
 
             if check.__len__() > 1:
-                print('Inclusion cuts grain boundary! - Cutted Grains: {}'.format(check))
+                # inclusion cuts a grain boundary
                 inc_rve = backup.copy()
                 attempt = attempt + 1
             else:
-                print('Placed inclusion successfully in grain {}'.format(check))
                 i += 1
                 rve = inc_rve.copy()  # To recognize inclusions
+            progress.update(i - 1, attempts=attempt)
 
+        progress.finish(inclusions=i - 1, attempts=attempt)
         status = True
         return inc_rve, status
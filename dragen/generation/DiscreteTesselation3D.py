@@ -1,17 +1,19 @@
 import sys
 
-import matplotlib.pyplot as plt
 import numpy as np
 import datetime
-from tqdm import tqdm
-from dragen.utilities.InputInfo import RveInfo
+from dragen.utilities.InputInfo import RveInfo, in_context
+from dragen.utilities.instrumentation import timed_stage, add_counts
+from dragen.utilities.progress import Progress, notify
+from dragen.utilities.outofcore import label_counts, count_equal
 from dragen.utilities.Helpers import HelperFunctions
 
 
 class Tesselation3D(HelperFunctions):
 
-    def __init__(self, grains_df):
-        super().__init__()
+    @in_context
+    def __init__(self, grains_df, context=None):
+        super().__init__(context=context)
 
         self.grains_df = grains_df
         self.a = grains_df['a'].tolist()
@@ -27,36 +29,57 @@ class Tesselation3D(HelperFunctions):
         self.b_max = max(self.b)
         self.c_max = max(self.c)
 
-        n_x = RveInfo.n_pts
-        n_y = RveInfo.n_pts
-        n_z = RveInfo.n_pts
-        if RveInfo.n_pts_y is not None:
-            n_y = RveInfo.n_pts_y
-        if RveInfo.n_pts_z is not None:
-            n_y = RveInfo.n_pts_z
+        n_x = self.context.n_pts
+        n_y = self.context.n_pts
+        n_z = self.context.n_pts
+        if self.context.n_pts_y is not None:
+            n_y = self.context.n_pts_y
+        if self.context.n_pts_z is not None:
+            n_y = self.context.n_pts_z
         shape = (n_x, n_y, n_z)
 
         self.x_grid, self.y_grid, self.z_grid = super().gen_grid_new()
-        self.pbar = tqdm(total=100)
 
-    def grow(self, iterator, a, b, c, shape):
-
-        alpha = self.alpha[iterator]
+    def grow_axes(self, iterator, a, b, c):
+        """
+        grows the half axes of grain iterator by one bin (in a, b and c)
+        """
         a_i = a[iterator]
         b_i = b[iterator]
         c_i = c[iterator]
-        a_i = a_i + a_i / self.a_max * RveInfo.bin_size
-        b_i = b_i + b_i / self.b_max * RveInfo.bin_size
-        c_i = c_i + c_i / self.c_max * RveInfo.bin_size
+        a_i = a_i + a_i / self.a_max * self.context.bin_size
+        b_i = b_i + b_i / self.b_max * self.context.bin_size
+        c_i = c_i + c_i / self.c_max * self.context.bin_size
         a[iterator] = a_i
         b[iterator] = b_i
         c[iterator] = c_i
-
-        ellipsoid = super().ellipsoid(a_i, b_i, c_i, alpha=alpha)
-
-        return ellipsoid, a, b, c
+        return a_i, b_i, c_i
+
+    def grow_blocks(self, rve, idx, a, b, c, overwrite_band):
+        """
+        one growth step of run_tesselation: the grown grain is only evaluated and written in blocks of its bounding
+        box (see HelperFunctions.periodic_grain_blocks)
+        :param overwrite_band: band voxels (-200) are taken by the grain too
+        :return: number of free voxels and of band voxels the grain took
+        """
+        grain_id = idx + 1
+        a_i, b_i, c_i = self.grow_axes(idx, a, b, c)
+        filled, band_filled = 0, 0
+        for index, inside in super().periodic_grain_blocks(a_i, b_i, c_i, self.x_0[idx], self.y_0[idx], self.z_0[idx],
+                                                           shape=rve.shape, alpha=self.alpha[idx], grain_id=grain_id):
+            block = rve[index]
+            free = inside & (block == 0)
+            filled += np.count_nonzero(free)
+            if overwrite_band:
+                band = inside & (block == -200)
+                band_filled += np.count_nonzero(band)
+                free |= band
+            block[free] = grain_id
+            rve[index] = block
+        return filled, band_filled
 
     def tesselation_plotter(self, array, epoch):
+        import matplotlib.pyplot as plt
         t_0 = datetime.datetime.now()
         n_grains = self.n_grains
         rve_x, rve_y, rve_z = np.where((array >= 1) | (array == -200))
@@ -87,31 +110,33 @@ class Tesselation3D(HelperFunctions):
         #            for free_space_tuples_i in free_space_tuples]
         #ax.scatter(free_space_x, free_space_y, free_space_z, color='grey', alpha=0.01)
 
-        ax.set_xlim(-5, RveInfo.box_size + 5)
-        ax.set_ylim(-5, RveInfo.box_size + 5)
-        ax.set_zlim(-5, RveInfo.box_size + 5)
+        ax.set_xlim(-5, self.context.box_size + 5)
+        ax.set_ylim(-5, self.context.box_size + 5)
+        ax.set_zlim(-5, self.context.box_size + 5)
         ax.set_xlabel('x (µm)')
         ax.set_ylabel('y (µm)')
         ax.set_zlabel('z (µm)')
         # ax.view_init(90, 270) #facing against z-direction (counterclockwise rotation)
         # plt.show()
-        plt.savefig(RveInfo.store_path + '/Figs/3D_Tesselation_Epoch_{}.png'.format(epoch))
+        plt.savefig(self.context.store_path + '/Figs/3D_Tesselation_Epoch_{}.png'.format(epoch))
         plt.close(fig)
         time_elapse = datetime.datetime.now() - t_0
-        if RveInfo.debug:
+        if self.context.debug:
             RveInfo.LOGGER.info('time spent on plotter for epoch {}: {}'.format(epoch, time_elapse.total_seconds()))
 
+    @in_context
+    @timed_stage('run_tesselation', counts=lambda result, self, *args, **kwargs: {'voxels': result[0].size,
+                                                                                 'grains': self.n_grains})
     def run_tesselation(self, rsa, grain_df=None, band_idx_start=None):
-        if RveInfo.gui_flag:
-            RveInfo.infobox_obj.emit('starting Tesselation')
-            RveInfo.progress_obj.emit(0)
+        # the progress of the tesselation is the filled volume in %
+        progress = Progress('tesselation', total=100).start()
 
         # set some variables
         status = False
         repeat = False
         packingratio = 0
         epoch = 0
-        band_vol_0 = np.count_nonzero(rsa == -200)  # This volume is already affected by the First band ratio
+        band_vol_0 = count_equal(rsa, -200)  # This volume is already affected by the First band ratio
         # So total Band ratio is band_ratio_rsa * band_ratio_tesselator
 
         # load some variables
@@ -125,14 +150,14 @@ class Tesselation3D(HelperFunctions):
         else:
             band_idx = [i for i in range(band_idx_start, n_grains+1)]
 
-        # define boundaries and empty rve array
-        empty_rve = np.zeros_like(rsa)
-        vol_0 = np.count_nonzero(empty_rve == 0)
-
-        freepoints = np.count_nonzero(rve == 0)
+        # voxels of the grains and free voxels are counted while growing instead of in the whole rve
+        vol_0 = rve.size
+        grain_voxels = label_counts(rve, n_grains)
+        band_vol = count_equal(rve, -200)
+        freepoints = count_equal(rve, 0)
         grain_idx = [i for i in range(n_grains)]
         grain_idx_backup = grain_idx.copy()
-        voxel_volume = RveInfo.box_volume/(rve.shape[0]*rve.shape[1]*rve.shape[2])
+        voxel_volume = self.context.box_volume/(rve.shape[0]*rve.shape[1]*rve.shape[2])
         while freepoints > 0:
             freepoints_old = freepoints   # Zum Abgleich
             i = 0
@@ -142,25 +167,12 @@ class Tesselation3D(HelperFunctions):
                 idx = grain_idx[i]
                 grainID = idx+1
 
-                ellipsoid, _, _, _ = self.grow(idx, a, b, c, shape=rsa.shape)
-                grain = np.zeros_like(ellipsoid, dtype='int16')
-                grain[ellipsoid <= 1] = grainID
-
-                periodic_grain = super().make_periodic_3D_new(grain, self.x_0[idx], self.y_0[idx], self.z_0[idx])
-                band_vol = np.count_nonzero(rve == -200)
-
-                if band_vol_0 > 0:
-                    band_ratio = band_vol / band_vol_0
-                    if band_ratio > RveInfo.band_ratio_final:
-                        rve[((periodic_grain == grainID) & (rve == 0)) | ((periodic_grain == grainID) & (rve == -200))] = grainID
-                    else:
-                        rve[((periodic_grain == grainID) & (rve == 0))] = grainID
-                else:
-                    rve[((periodic_grain == grainID) & (rve == 0))] = grainID
-
-                freepoints = np.count_nonzero(rve == 0)
-
-                grain_vol = np.count_nonzero(rve == grainID) * voxel_volume
+                overwrite_band = band_vol_0 > 0 and band_vol / band_vol_0 > self.context.band_ratio_final
+                filled, band_filled = self.grow_blocks(rve, idx, a, b, c, overwrite_band)
+                freepoints -= filled
+                band_vol -= band_filled
+                grain_voxels[grainID] += filled + band_filled
+                grain_vol = grain_voxels[grainID] * voxel_volume
                 if freepoints == 0:
                     break
 
@@ -190,39 +202,25 @@ class Tesselation3D(HelperFunctions):
 
             if not grain_idx:
                 repeat = True
-                if RveInfo.gui_flag:
-                    RveInfo.infobox_obj.emit('grain growth had to be reset at {}% of volume filling'.format(packingratio))
-                else:
-                    print(f'grain growth had to be reset at {packingratio}% of volume filling')
+                notify('grain growth had to be reset at {}% of volume filling'.format(packingratio), 'tesselation')
                 if packingratio < 90:
-                    if RveInfo.gui_flag:
-                        RveInfo.infobox_obj.emit('your microstructure data does not contain \n'
-                                              'enough data to fill this boxsize\n'
-                                              'please decrease the boxsize for reasonable results')
-                    else:
-                        print('your microstructure data does not contain')
-                        print('enough data to fill this boxsize')
-                        print('please decrease the boxsize for reasonable results')
+                    notify('your microstructure data does not contain \n'
+                           'enough data to fill this boxsize\n'
+                           'please decrease the boxsize for reasonable results', 'tesselation')
                 grain_idx = grain_idx_backup.copy()
-            if RveInfo.anim_flag:
+            if self.context.anim_flag:
                 self.tesselation_plotter(rve, epoch)
             epoch += 1
             packingratio = (1 - freepoints / vol_0) * 100
-            # print('packingratio:', packingratio, '%')
-            if RveInfo.gui_flag:
-                RveInfo.progress_obj.emit(packingratio)
-            else:
-                if RveInfo.gui_flag:
-                    RveInfo.progress_obj.emit('packingratio: ', packingratio)
-                else:
-                    inc = packingratio - self.pbar.n
-                    self.pbar.update(n=inc)
+            progress.update(packingratio, epochs=epoch)
 
         if packingratio == 100:
             status = True
 
+        add_counts(epochs=epoch)
+        progress.finish(epochs=epoch)
         # Save for further usage
-        np.save(RveInfo.store_path + '/' + 'RVE_Numpy.npy', rve)
+        np.save(self.context.store_path + '/' + 'RVE_Numpy.npy', rve)
         return rve, status
 
 if __name__ == '__main__':
@@ -6,13 +6,13 @@ import os
 from math import isclose
 import datetime
 from dragen.utilities.Helpers import HelperFunctions
-from dragen.utilities.InputInfo import RveInfo
+from dragen.utilities.InputInfo import GenerationContext, in_context
 
 
 class Mesher_2D(HelperFunctions):
 
     def __init__(self,rve_df: pd.DataFrame, grains_df: pd.DataFrame, store_path, phase_two_isotropic = True,
-                 animation=True, infobox_obj=None, progress_obj=None):
+                 animation=True, infobox_obj=None, progress_obj=None, context=None):
         self.rve = rve_df
         self.grains_df = grains_df
         self.store_path = store_path
@@ -33,7 +33,7 @@ class Mesher_2D(HelperFunctions):
         self.bin_size = rve_df.box_size[0] / (self.n_pts+1) ## test
         self.logger = logging.getLogger("RVE-Gen")
 
-        super().__init__()
+        super().__init__(context=context)
 
     def polyline_from_points(self,points):
         poly = pv.PolyData()
@@ -114,7 +114,6 @@ class Mesher_2D(HelperFunctions):
         label_set = list(set(np.asarray(lines.line_labels)))
 
         for i in range(n_iter):
-            print(i)
             for label in label_set:
 
                 current_lines = lines.loc[lines['line_labels'] == label]
@@ -247,7 +246,7 @@ class Mesher_2D(HelperFunctions):
             grain_surf = grain_grid.extract_surface()
             grain_surf_df = pd.DataFrame(data=grain_surf.points, columns=['x', 'y', 'z'])
             merged_pts_df = grain_surf_df.join(all_points_df_old.set_index(['x', 'y', 'z']), on=['x', 'y', 'z'])
-            if RveInfo.smoothing_flag:
+            if self.context.smoothing_flag:
                 n_iter=250
             else:
                 n_iter=0
@@ -271,6 +270,7 @@ class Mesher_2D(HelperFunctions):
 
         return grid
 
+    @in_context
     def run_mesher_2D(self):
         grid = self.gen_blocks()
         grid = self.gen_grains(grid)
@@ -279,8 +279,10 @@ class Mesher_2D(HelperFunctions):
 
 class BuildAbaqus2D:
 
-    def __init__(self, pv_mesh, rve_df, grains_df: pd.DataFrame):
+    def __init__(self, pv_mesh, rve_df, grains_df: pd.DataFrame, context=None):
 
+        # parameters of the generation (a snapshot of RveInfo if none is given)
+        self.context = context if context is not None else GenerationContext.from_rveinfo()
         self.mesh = pv_mesh
         self.rve_df = rve_df
         self.n_grains = int(max(pv_mesh.cell_data['GrainID']))
@@ -299,7 +301,7 @@ class BuildAbaqus2D:
         #tri = np.asarray(tri)
         #smooth_points = poly_data.points
 
-        f = open(RveInfo.store_path + '/DRAGen_RVE_2D.inp', 'w+')
+        f = open(self.context.store_path + '/DRAGen_RVE_2D.inp', 'w+')
         f.write('*Heading\n')
         f.write('** Job name: Job-1 Model name: Job-1\n')
         f.write('** Generated by: DRAGen \n')
@@ -318,7 +320,7 @@ class BuildAbaqus2D:
 
         """simple function to write the assembly definition in the input file"""
 
-        f = open(RveInfo.store_path + '/DRAGen_RVE_2D.inp', 'a')
+        f = open(self.context.store_path + '/DRAGen_RVE_2D.inp', 'a')
         f.write('** ASSEMBLY\n')
         f.write('**\n')
         f.write('*Assembly, name=Assembly\n')
@@ -328,17 +330,17 @@ class BuildAbaqus2D:
         self.make_meshio_inp_file()
         self.generate_elementsets()
         self.assign_materials()
-        f = open(RveInfo.store_path + '/DRAGen_RVE_2D.inp', 'a')
+        f = open(self.context.store_path + '/DRAGen_RVE_2D.inp', 'a')
         f.write('*End Instance\n')
-        if RveInfo.xfem_flag:
+        if self.context.xfem_flag:
             f.write("*Enrichment, name=Crack-1, type=PROPAGATION CRACK, elset=Part-1-1.Set-XFEM, interaction=IntProp-1\n")
         f.write('**\n')
-        if RveInfo.pbc_flag:
+        if self.context.pbc_flag:
             f.write('*Include, Input=Nsets.inp\n')
             f.write('*Include, input=Edges.inp\n')
             f.write('*Include, input=Corners.inp\n')
             f.write('*Include, input=VerticeSets.inp\n')
-        elif RveInfo.submodel_flag:
+        elif self.context.submodel_flag:
             f.write('*Include, Input=HullPointSet.inp\n')
         f.write('*End Assembly\n')
         f.write('** INCLUDE MATERIAL FILE **\n')
@@ -357,7 +359,7 @@ class BuildAbaqus2D:
         abaq_nodes_df = pd.DataFrame(data=node_dict)
         abaq_elem_df = pd.DataFrame(data=elem_dict)
 
-        f = open(RveInfo.store_path + '/DRAGen_RVE_2D.inp', 'a')
+        f = open(self.context.store_path + '/DRAGen_RVE_2D.inp', 'a')
         f.write('*Part, name=PART-1\n')
         f.write('*NODE\n')
         for i in range(len(abaq_nodes_df)):
@@ -389,7 +391,7 @@ class BuildAbaqus2D:
         grid_hull_df = grid_df.loc[(grid_df['x'] == max_x) | (grid_df['x'] == min_x) |
                                    (grid_df['y'] == max_y) | (grid_df['y'] == min_y) |
                                    (grid_df['z'] == max_z) | (grid_df['z'] == min_z)]
-        OutPutFile = open(RveInfo.store_path + '/HullPointSet.inp', 'w+')
+        OutPutFile = open(self.context.store_path + '/HullPointSet.inp', 'w+')
         grid_hull_df.sort_values(by=['x', 'y', 'z'], inplace=True)
         grid_hull_df.index.rename('pointNumber', inplace=True)
         grid_hull_df = grid_hull_df.reset_index()
@@ -399,26 +401,25 @@ class BuildAbaqus2D:
         OutPutFile.close()
 
     def make_meshio_inp_file(self):
-        pv.save_meshio(f'{RveInfo.store_path}/rve-part.inp', self.mesh)
-        f = open(f'{RveInfo.store_path}/rve-part.inp', 'r')
+        pv.save_meshio(f'{self.context.store_path}/rve-part.inp', self.mesh)
+        f = open(f'{self.context.store_path}/rve-part.inp', 'r')
         lines = f.readlines()
         f.close()
         lines = [line.lower() for line in lines]
         startingLine = lines.index('*node\n')
-        f = open(RveInfo.store_path + '/DRAGen_RVE_2D.inp', 'a')
+        f = open(self.context.store_path + '/DRAGen_RVE_2D.inp', 'a')
         idx = [i for i, s in enumerate(lines) if '*element' in s.lower()][0]
         lines[idx] = '*ELEMENT, TYPE=C3D8\n'
         for line in lines[startingLine:]:
             f.write(line)
         f.close()
-        os.remove(f'{RveInfo.store_path}/rve-part.inp')
+        os.remove(f'{self.context.store_path}/rve-part.inp')
 
     def generate_elementsets(self):
-        f = open(RveInfo.store_path + '/DRAGen_RVE_2D.inp', 'a')
+        f = open(self.context.store_path + '/DRAGen_RVE_2D.inp', 'a')
         f.write('**\n')
         for i in range(self.n_grains):
             nGrain = i + 1
-            print('in for nGrain=', nGrain, self.mesh.cell_data.keys())
             cells = np.where(self.mesh.cell_data['GrainID'] == nGrain)[0]
             f.write('*Elset, elset=Set-{}\n'.format(nGrain))
             for j, cell in enumerate(cells + 1):
@@ -426,14 +427,14 @@ class BuildAbaqus2D:
                     f.write('\n')
                 f.write(' {},'.format(cell))
             f.write('\n''**\n')
-        if RveInfo.xfem_flag:
+        if self.context.xfem_flag:
             f.write('*Elset, elset=Set-XFEM, instance=Part-1-1, generate\n')
             f.write(f'1,  {self.mesh.number_of_cells},      1\n')
         f.write('**\n')
         f.close()
 
     def assign_materials(self):
-        f = open(RveInfo.store_path + '/DRAGen_RVE_2D.inp', 'a')
+        f = open(self.context.store_path + '/DRAGen_RVE_2D.inp', 'a')
         phase1_idx = 0
         phase2_idx = 0
         for i in range(self.n_grains):
@@ -443,7 +444,7 @@ class BuildAbaqus2D:
                 f.write('** Section: Section - {}\n'.format(nGrain))
                 f.write('*Solid Section, elset=Set-{}, material=Ferrite_{}\n'.format(nGrain, phase1_idx))
             elif self.rve_df.loc[self.rve_df['GrainID'] == nGrain].phaseID.values[0] == 2:
-                if not RveInfo.phase2iso_flag[2]:
+                if not self.context.phase2iso_flag[2]:
                     phase2_idx += 1
                     f.write('** Section: Section - {}\n'.format(nGrain))
                     f.write('*Solid Section, elset=Set-{}, material=Martensite_{}\n'.format(nGrain, phase2_idx))
@@ -592,14 +593,14 @@ class BuildAbaqus2D:
         FrontSet = faces_df.loc[faces_df['z'] == max_z]['Eqn-Set'].to_list()
 
 
-        OutPutFile = open(RveInfo.store_path + '/Nsets.inp', 'w')
+        OutPutFile = open(self.context.store_path + '/Nsets.inp', 'w')
         for i in grid_hull_df.index:
             OutPutFile.write('*Nset, nset=Eqn-Set-{}, instance=PART-1-1\n'.format(i + 1))
             OutPutFile.write(' {},\n'.format(int(grid_hull_df.loc[i]['pointNumber'] + 1)))
         OutPutFile.close()
 
         ############### Define Equations ###################################
-        OutPutFile = open(RveInfo.store_path + '/LeftToRight.inp', 'w')
+        OutPutFile = open(self.context.store_path + '/LeftToRight.inp', 'w')
 
         OutPutFile.write('**** X-DIR \n')
         for i in range(len(LeftSet)):
@@ -634,7 +635,7 @@ class BuildAbaqus2D:
             OutPutFile.write('Eqn-Set-' + str(V1Eqn + 1) + ',3, 1 \n')
         OutPutFile.close()
 
-        OutPutFile = open(RveInfo.store_path + '/BottomToTop.inp', 'w')
+        OutPutFile = open(self.context.store_path + '/BottomToTop.inp', 'w')
 
         OutPutFile.write('**** X-DIR \n')
         for i in range(len(BottomSet)):
@@ -669,7 +670,7 @@ class BuildAbaqus2D:
             OutPutFile.write('Eqn-Set-' + str(V4Eqn + 1) + ',3, 1 \n')
         OutPutFile.close()
 
-        OutPutFile = open(RveInfo.store_path + '/FrontToRear.inp', 'w')
+        OutPutFile = open(self.context.store_path + '/FrontToRear.inp', 'w')
 
         OutPutFile.write('**** X-DIR \n')
         for i in range(len(RearSet)):
@@ -704,7 +705,7 @@ class BuildAbaqus2D:
             OutPutFile.write('Eqn-Set-' + str(H1Eqn + 1) + ',3,1 \n')
         OutPutFile.close()
 
-        OutPutFile = open(RveInfo.store_path + '/Edges.inp', 'w')
+        OutPutFile = open(self.context.store_path + '/Edges.inp', 'w')
 
         # Edges in x-y Plane
         # right top edge to left top edge
@@ -989,7 +990,7 @@ class BuildAbaqus2D:
             OutPutFile.write('Eqn-Set-' + str(V1Eqn + 1) + ',3, 1 \n')
         OutPutFile.close()
 
-        OutPutFile = open(RveInfo.store_path + '/Corners.inp', 'w')
+        OutPutFile = open(self.context.store_path + '/Corners.inp', 'w')
 
         # V3 zu V4
         OutPutFile.write('**** X-DIR \n')
@@ -1084,7 +1085,7 @@ class BuildAbaqus2D:
         OutPutFile.write('Eqn-Set-' + str(V1Eqn + 1) + ',3, 1 \n')
         OutPutFile.close()
 
-        OutPutFile = open(RveInfo.store_path + '/VerticeSets.inp', 'w')
+        OutPutFile = open(self.context.store_path + '/VerticeSets.inp', 'w')
         OutPutFile.write('*Nset, nset=V1, instance=PART-1-1\n')
         OutPutFile.write(' {},\n'.format(V1 + 1))
         OutPutFile.write('*Nset, nset=V2, instance=PART-1-1\n')
@@ -1112,11 +1113,11 @@ class BuildAbaqus2D:
         numberofgrains = self.n_grains
 
         phase = [self.rve_df.loc[self.rve_df['GrainID'] == i].phaseID.values[0] for i in range(1, numberofgrains+1)]
-        f = open(RveInfo.store_path + '/Materials.inp', 'w+')  # open in write mode to overwrite old files in case ther are any
+        f = open(self.context.store_path + '/Materials.inp', 'w+')  # open in write mode to overwrite old files in case ther are any
         f.write('** MATERIALS\n')
         f.write('**\n')
         f.close()
-        f = open(RveInfo.store_path + '/Materials.inp', 'a')
+        f = open(self.context.store_path + '/Materials.inp', 'a')
 
         for i in range(numberofgrains):
             ngrain = i+1
@@ -1126,72 +1127,72 @@ class BuildAbaqus2D:
                 f.write('    176,\n')
                 f.write('*User Material, constants=2\n')
                 f.write(f'{ngrain}.,3.\n')
-                if RveInfo.xfem_flag:
+                if self.context.xfem_flag:
                     f.write('*include, input=Ferrite_dmg.inp\n')
             elif phase[i] == 2:
-                if not RveInfo.phase2iso_flag[2]:
+                if not self.context.phase2iso_flag[2]:
                     f.write(f'*Material, name=Martensite_{ngrain}\n')
                     f.write('*Depvar\n')
                     f.write('    176,\n')
                     f.write('*User Material, constants=2\n')
                     f.write(f'{ngrain}.,4.\n')
-                    if RveInfo.xfem_flag:
+                    if self.context.xfem_flag:
                         f.write('*include, input=Martensite_dmg.inp\n')
             elif phase[i] == 3:
-                if not RveInfo.phase2iso_flag[2]:
+                if not self.context.phase2iso_flag[2]:
                     f.write(f'*Material, name=Pearlite_{ngrain}\n')
                     f.write('*Depvar\n')
                     f.write('    176,\n')
                     f.write('*User Material, constants=2\n')
                     f.write(f'{ngrain}.,4.\n')
-                    if RveInfo.xfem_flag:
+                    if self.context.xfem_flag:
                         f.write('*include, input=Pearlite_dmg.inp\n')
             elif phase[i] == 4:
-                if not RveInfo.phase2iso_flag[3]:
+                if not self.context.phase2iso_flag[3]:
                     f.write(f'*Material, name=Bainite_{ngrain}\n')
                     f.write('*Depvar\n')
                     f.write('    176,\n')
                     f.write('*User Material, constants=2\n')
                     f.write(f'{ngrain}.,4.\n')
-                    if RveInfo.xfem_flag:
+                    if self.context.xfem_flag:
                         f.write('*include, input=Bainite_dmg.inp\n')
             elif phase[i] == 5: #add
-                if not RveInfo.phase2iso_flag[3]:
+                if not self.context.phase2iso_flag[3]:
                     f.write(f'*Material, name=Austenite_{ngrain}\n')
                     f.write('*Depvar\n')
                     f.write('    176,\n')
                     f.write('*User Material, constants=2\n')
                     f.write(f'{ngrain}.,2.\n')
-                    if RveInfo.xfem_flag:
+                    if self.context.xfem_flag:
                         f.write('*include, input=Austenite_dmg.inp\n')
 
-        if RveInfo.phase2iso_flag[2] and RveInfo.phase_ratio[2] > 0:
+        if self.context.phase2iso_flag[2] and self.context.phase_ratio[2] > 0:
             f.write('**\n')
             f.write('*Material, name=Martensite\n')
             f.write('*Elastic\n')
             f.write('0.21, 0.3\n')
             f.write('**')
-        if RveInfo.phase2iso_flag[3] and RveInfo.phase_ratio[3] > 0:
+        if self.context.phase2iso_flag[3] and self.context.phase_ratio[3] > 0:
             f.write('**\n')
             f.write('*Material, name=Pearlite\n')
             f.write('*Elastic\n')
             f.write('0.21, 0.3\n')
             f.write('**')
-        if RveInfo.phase2iso_flag[4] and RveInfo.phase_ratio[4] > 0:
+        if self.context.phase2iso_flag[4] and self.context.phase_ratio[4] > 0:
             f.write('**\n')
             f.write('*Material, name=Bainite\n')
             f.write('*Elastic\n')
             f.write('0.21, 0.3\n')
             f.write('**')
-        if RveInfo.phase2iso_flag[5] and RveInfo.phase_ratio[5] > 0:
+        if self.context.phase2iso_flag[5] and self.context.phase_ratio[5] > 0:
             f.write('**\n')
             f.write('*Material, name=Austenite\n')
             f.write('*Elastic\n')
             f.write('0.21, 0.3\n')
             f.write('**')
         f.close()
-        if RveInfo.xfem_flag and RveInfo.phase_ratio[1] > 0:
-            f = open(RveInfo.store_path + '/Ferrite_dmg.inp', 'a')
+        if self.context.xfem_flag and self.context.phase_ratio[1] > 0:
+            f = open(self.context.store_path + '/Ferrite_dmg.inp', 'a')
             f.write('*Damage Initiation, Criterion=User, Failure Mechanisms=1, Properties=2 \n')
             f.write('** damage variable, max. element number \n')
             f.write(f'0.01, {self.mesh.number_of_cells} \n')
@@ -1201,8 +1202,8 @@ class BuildAbaqus2D:
             f.write('0.012 \n')
             f.close()
 
-        if RveInfo.xfem_flag and RveInfo.phase_ratio[2] > 0:
-            f = open(RveInfo.store_path + '/martensite_dmg.inp', 'a')
+        if self.context.xfem_flag and self.context.phase_ratio[2] > 0:
+            f = open(self.context.store_path + '/martensite_dmg.inp', 'a')
             f.write('*Damage Initiation, Criterion=User, Failure Mechanisms=1, Properties=2 \n')
             f.write('** damage variable, max. element number \n')
             f.write(f'0.01, {self.mesh.number_of_cells} \n')
@@ -1212,8 +1213,8 @@ class BuildAbaqus2D:
             f.write('0.012 \n')
             f.close()
 
-        if RveInfo.xfem_flag and RveInfo.phase_ratio[3] > 0:
-            f = open(RveInfo.store_path + '/Pearlite_dmg.inp', 'a')
+        if self.context.xfem_flag and self.context.phase_ratio[3] > 0:
+            f = open(self.context.store_path + '/Pearlite_dmg.inp', 'a')
             f.write('*Damage Initiation, Criterion=User, Failure Mechanisms=1, Properties=2 \n')
             f.write('** damage variable, max. element number \n')
             f.write(f'0.01, {self.mesh.number_of_cells} \n')
@@ -1223,8 +1224,8 @@ class BuildAbaqus2D:
             f.write('0.012 \n')
             f.close()
 
-        if RveInfo.xfem_flag and RveInfo.phase_ratio[4] > 0:
-            f = open(RveInfo.store_path + '/Bainite_dmg.inp', 'a')
+        if self.context.xfem_flag and self.context.phase_ratio[4] > 0:
+            f = open(self.context.store_path + '/Bainite_dmg.inp', 'a')
             f.write('*Damage Initiation, Criterion=User, Failure Mechanisms=1, Properties=2 \n')
             f.write('** damage variable, max. element number \n')
             f.write(f'0.01, {self.mesh.number_of_cells} \n')
@@ -1233,8 +1234,8 @@ class BuildAbaqus2D:
             f.write('*Damage Stabilization \n')
             f.write('0.012 \n')
             f.close()
-        if RveInfo.xfem_flag and RveInfo.phase_ratio[5] > 0: #add
-            f = open(RveInfo.store_path + '/Austenite_dmg.inp', 'a')
+        if self.context.xfem_flag and self.context.phase_ratio[5] > 0: #add
+            f = open(self.context.store_path + '/Austenite_dmg.inp', 'a')
             f.write('*Damage Initiation, Criterion=User, Failure Mechanisms=1, Properties=2 \n')
             f.write('** damage variable, max. element number \n')
             f.write(f'0.01, {self.mesh.number_of_cells} \n')
@@ -1250,7 +1251,7 @@ class BuildAbaqus2D:
         variables should be introduced to give the user an option
         to modify amplidtude, and other parameters"""
 
-        f = open(RveInfo.store_path + '/Step.inp', 'w+')
+        f = open(self.context.store_path + '/Step.inp', 'w+')
         f.write('**\n')
         f.write('**BOUNDARY CONDITIONS\n')
         f.write('**\n')
@@ -1269,7 +1270,7 @@ class BuildAbaqus2D:
         f.write('**V4, 1\n')
         f.write('**V4, 2\n')
         f.write('**V4, 3\n')
-        if RveInfo.xfem_flag:
+        if self.context.xfem_flag:
             f.write('** INTERACTION PROPERTIES\n')
             f.write('**\n')
             f.write('*Surface Interaction, name=IntProp-1\n')
@@ -1302,7 +1303,7 @@ class BuildAbaqus2D:
         f.write('*Boundary\n')
         f.write('V4, 2, 2, 0.01\n')
         f.write('**\n')
-        if RveInfo.xfem_flag:
+        if self.context.xfem_flag:
             f.write('** INTERACTIONS\n')
             f.write('**\n')
             f.write('*Enrichment Activation, name=Crack-1, activate=ON\n')
@@ -1333,7 +1334,7 @@ class BuildAbaqus2D:
         variables should be introduced to give the user an option
         to modify amplidtude, and other parameters"""
 
-        f = open(RveInfo.store_path + '/Step.inp', 'w+')
+        f = open(self.context.store_path + '/Step.inp', 'w+')
         f.write('**\n')
         f.write('** ----------------------------------------------------------------\n')
         f.write('**\n')
@@ -1363,7 +1364,7 @@ class BuildAbaqus2D:
         f.write('Set-Hull, 2, 2\n')
         f.write('Set-Hull, 3, 3\n')
         f.write('**\n')
-        if RveInfo.xfem_flag:
+        if self.context.xfem_flag:
             f.write('*Include, input=Interactions.inp')
         f.write('** OUTPUT REQUESTS\n')
         f.write('**\n')
@@ -1386,23 +1387,24 @@ class BuildAbaqus2D:
         f.close()
 
     def write_grain_data(self) -> None:
-        f = open(RveInfo.store_path + '/graindata.inp', 'w+')
+        f = open(self.context.store_path + '/graindata.inp', 'w+')
         f.write('!MMM Crystal Plasticity Input File\n')
         phase1_idx = 0
         numberofgrains = self.n_grains
         phase = [self.rve_df.loc[self.rve_df['GrainID'] == i].phaseID.values[0] for i in range(1, numberofgrains + 1)]
         grainsize = [np.cbrt(self.rve_df.loc[self.rve_df['GrainID'] == i].shape[0] *
-                             RveInfo.bin_size**3*3/4/np.pi) for i in range(1, numberofgrains + 1)]
+                             self.context.bin_size**3*3/4/np.pi) for i in range(1, numberofgrains + 1)]
 
         for i in range(numberofgrains):
             ngrain = i+1
-            if not RveInfo.phase2iso_flag[phase[i]]:
+            if not self.context.phase2iso_flag[phase[i]]:
                 phi1 = self.tex_phi1[i]
                 PHI = self.tex_PHI[i]
                 phi2 = self.tex_phi2[i]
                 f.write('Grain: {}: {}: {}: {}: {}\n'.format(ngrain, phi1, PHI, phi2, grainsize[i]))
         f.close()
 
+    @in_context
     def run(self):
 
         self.build_abaqus_header()
@@ -1410,14 +1412,14 @@ class BuildAbaqus2D:
 
 
 
-        if RveInfo.submodel_flag:
+        if self.context.submodel_flag:
             self.submodelSet()
-        elif RveInfo.pbc_flag:
+        elif self.context.pbc_flag:
             self.pbc()
         self.write_material_def()  # functions here
-        if RveInfo.pbc_flag:
+        if self.context.pbc_flag:
             self.write_pbc_step_def()  # it will lead to a faulty inputfile
-        elif RveInfo.submodel_flag:
+        elif self.context.submodel_flag:
             self.write_submodel_step_def()
         self.write_grain_data()
 
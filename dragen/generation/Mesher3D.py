@@ -6,18 +6,20 @@ import pyvista as pv
 import datetime
 import os
 from dragen.utilities.PvGridGeneration import MeshingHelper
-from dragen.utilities.InputInfo import RveInfo
+from dragen.utilities.InputInfo import in_context
+from dragen.utilities.instrumentation import timed_stage
+from dragen.utilities.progress import Progress
 from dragen.utilities.Helpers import HelperFunctions
 
 class AbaqusMesher(MeshingHelper):
 
-    def __init__(self, rve_shape: tuple, rve: pd.DataFrame, grains_df: pd.DataFrame):
-        super().__init__(rve_shape, rve, grains_df)
+    def __init__(self, rve_shape: tuple, rve: pd.DataFrame, grains_df: pd.DataFrame, context=None):
+        super().__init__(rve_shape, rve, grains_df, context=context)
 
     def make_assembly(self) -> None:
 
         """simple function to write the assembly definition in the input file"""
-        f = open(RveInfo.store_path + '/DRAGen_RVE.inp', 'a')
+        f = open(self.context.store_path + '/DRAGen_RVE.inp', 'a')
         f.write('*End Part\n')
         f.write('**\n')
         f.write('** ASSEMBLY\n')
@@ -27,9 +29,9 @@ class AbaqusMesher(MeshingHelper):
         f.write('*Instance, name=Part-1-1, part=Part-1\n')
         f.write('*End Instance\n')
         f.write('**\n')
-        if RveInfo.submodel_flag:
+        if self.context.submodel_flag:
             f.write('*Include, Input=HullPointSet.inp\n')
-        if RveInfo.pbc_flag:
+        if self.context.pbc_flag:
             f.write('*Include, Input=Nsets.inp\n')
             f.write('*Include, input=LeftToRight.inp\n')
             f.write('*Include, input=BottomToTop.inp\n')
@@ -39,7 +41,7 @@ class AbaqusMesher(MeshingHelper):
             f.write('*Include, input=VerticeSets.inp\n')
             f.write('*Include, Input=BoxSets.inp\n')
         f.write('*End Assembly\n')
-        if RveInfo.reduced_elements:
+        if self.context.reduced_elements:
             f.write('*Section Controls, name = EC - 1, hourglass = Enhanced\n')
             f.write('1., 1., 1.\n')
         f.write('** INCLUDE MATERIAL FILE **\n')
@@ -49,7 +51,7 @@ class AbaqusMesher(MeshingHelper):
         f.close()
 
     def submodelSet(self, grid_hull_df: pd.DataFrame) -> None:
-        OutPutFile = open(RveInfo.store_path + '/HullPointSet.inp', 'w')
+        OutPutFile = open(self.context.store_path + '/HullPointSet.inp', 'w')
         grid_hull_df.sort_values(by=['x', 'y', 'z'], inplace=True)
         grid_hull_df.index.rename('pointNumber', inplace=True)
         grid_hull_df = grid_hull_df.reset_index()
@@ -64,6 +66,8 @@ class AbaqusMesher(MeshingHelper):
         OutPutFile.write('SET-HULL, \n')
         OutPutFile.close()
 
+    @timed_stage('pbc', counts=lambda result, self, rve, grid_hull_df: {'nodes': rve.n_points,
+                                                                        'hull_nodes': len(grid_hull_df)})
     def pbc(self, rve: pv.UnstructuredGrid, grid_hull_df: pd.DataFrame) -> None:
 
         """function to define the periodic boundary conditions
@@ -218,14 +222,14 @@ class AbaqusMesher(MeshingHelper):
                                            (grid_hull_df['z'] == max_z)]['pointNumber'].to_list()
 
         ######### Write input file for corners Sets #############
-        OutPutFile = open(RveInfo.store_path + '/VerticeSets.inp', 'w')
+        OutPutFile = open(self.context.store_path + '/VerticeSets.inp', 'w')
         for key, value in corner_dict.items():
             OutPutFile.write(f'*Nset, nset={key}, instance=PART-1-1\n')
             OutPutFile.write(f' {value},\n')
         OutPutFile.close()
 
         ######### Write input file for all nodesets on Edges and faces without corners #############
-        OutPutFile = open(RveInfo.store_path + '/Nsets.inp', 'w')
+        OutPutFile = open(self.context.store_path + '/Nsets.inp', 'w')
         for key, values in edges_dict.items():
             i = 1
             for value in values:
@@ -241,7 +245,7 @@ class AbaqusMesher(MeshingHelper):
         OutPutFile.close()
 
         ######### Write input files for equations on faces #############
-        OutPutFile = open(RveInfo.store_path + '/LeftToRight.inp', 'w')
+        OutPutFile = open(self.context.store_path + '/LeftToRight.inp', 'w')
         for dir in range(1, 4):
             OutPutFile.write(f'**** {dir}-DIR ****\n')
             for i in range(1, len(faces_dict['LeftSet'])+1):
@@ -254,7 +258,7 @@ class AbaqusMesher(MeshingHelper):
                 OutPutFile.write(f'H1, {dir}, 1 \n')
         OutPutFile.close()
 
-        OutPutFile = open(RveInfo.store_path + '/BottomToTop.inp', 'w')
+        OutPutFile = open(self.context.store_path + '/BottomToTop.inp', 'w')
         for dir in range(1, 4):
             OutPutFile.write(f'**** {dir}-DIR ****\n')
             for i in range(1, len(faces_dict['BottomSet'])+1):
@@ -267,7 +271,7 @@ class AbaqusMesher(MeshingHelper):
                 OutPutFile.write(f'H1, {dir}, 1 \n')
         OutPutFile.close()
 
-        OutPutFile = open(RveInfo.store_path + '/RearToFront.inp', 'w')
+        OutPutFile = open(self.context.store_path + '/RearToFront.inp', 'w')
         for dir in range(1, 4):
             OutPutFile.write(f'**** {dir}-DIR ****\n')
             for i in range(1, len(faces_dict['RearSet'])+1):
@@ -281,7 +285,7 @@ class AbaqusMesher(MeshingHelper):
         OutPutFile.close()
 
         ######### Write input files for equations on edges #############
-        OutPutFile = open(RveInfo.store_path + '/Edges.inp', 'w')
+        OutPutFile = open(self.context.store_path + '/Edges.inp', 'w')
         OutPutFile.write('**** 1-DIR ****')
         for i in range(1, len(edges_dict['E_x_1'])+1):
             OutPutFile.write('*Equation \n')
@@ -434,7 +438,7 @@ class AbaqusMesher(MeshingHelper):
         OutPutFile.close()
 
         ######### Write input file for equations on corners #############
-        OutPutFile = open(RveInfo.store_path + '/Corners.inp', 'w')
+        OutPutFile = open(self.context.store_path + '/Corners.inp', 'w')
         OutPutFile.write('**** 1-DIR ****\n' )
         OutPutFile.write('*Equation \n')
         OutPutFile.write('4 \n')
@@ -504,7 +508,7 @@ class AbaqusMesher(MeshingHelper):
         OutPutFile.close()
 
         ######### Write input file for boxsets defined above #############
-        OutPutFile = open(RveInfo.store_path + '/BoxSets.inp', 'w')
+        OutPutFile = open(self.context.store_path + '/BoxSets.inp', 'w')
         for key, values in Box_Sets_dict.items():
             OutPutFile.write(f'*Nset, nset={key}, instance=PART-1-1\n')
             for i, value in enumerate(values):
@@ -653,14 +657,14 @@ class AbaqusMesher(MeshingHelper):
         # rear set
         FrontSet = faces_df.loc[faces_df['z'] == max_z]['Eqn-Set'].to_list()
 
-        OutPutFile = open(RveInfo.store_path + '/Nsets.inp', 'w')
+        OutPutFile = open(self.context.store_path + '/Nsets.inp', 'w')
         for i in grid_hull_df.index:
             OutPutFile.write('*Nset, nset=Eqn-Set-{}, instance=PART-1-1\n'.format(i + 1))
             OutPutFile.write(' {},\n'.format(int(grid_hull_df.loc[i]['pointNumber'] + 1)))
         OutPutFile.close()
 
         ############### Define Equations ###################################
-        OutPutFile = open(RveInfo.store_path + '/LeftToRight.inp', 'w')
+        OutPutFile = open(self.context.store_path + '/LeftToRight.inp', 'w')
 
         OutPutFile.write('**** X-DIR \n')
         for i in range(len(LeftSet)):
@@ -695,7 +699,7 @@ class AbaqusMesher(MeshingHelper):
             OutPutFile.write('Eqn-Set-' + str(V1Eqn + 1) + ',3, 1 \n')
         OutPutFile.close()
 
-        OutPutFile = open(RveInfo.store_path + '/BottomToTop.inp', 'w')
+        OutPutFile = open(self.context.store_path + '/BottomToTop.inp', 'w')
 
         OutPutFile.write('**** X-DIR \n')
         for i in range(len(BottomSet)):
@@ -730,7 +734,7 @@ class AbaqusMesher(MeshingHelper):
             OutPutFile.write('Eqn-Set-' + str(V4Eqn + 1) + ',3, 1 \n')
         OutPutFile.close()
 
-        OutPutFile = open(RveInfo.store_path + '/FrontToRear.inp', 'w')
+        OutPutFile = open(self.context.store_path + '/FrontToRear.inp', 'w')
 
         OutPutFile.write('**** X-DIR \n')
         for i in range(len(RearSet)):
@@ -765,7 +769,7 @@ class AbaqusMesher(MeshingHelper):
             OutPutFile.write('Eqn-Set-' + str(H1Eqn + 1) + ',3,1 \n')
         OutPutFile.close()
 
-        OutPutFile = open(RveInfo.store_path + '/Edges.inp', 'w')
+        OutPutFile = open(self.context.store_path + '/Edges.inp', 'w')
 
         # Edges in x-y Plane
         # right top edge to left top edge
@@ -1050,7 +1054,7 @@ class AbaqusMesher(MeshingHelper):
             OutPutFile.write('Eqn-Set-' + str(V1Eqn + 1) + ',3, 1 \n')
         OutPutFile.close()
 
-        OutPutFile = open(RveInfo.store_path + '/Corners.inp', 'w')
+        OutPutFile = open(self.context.store_path + '/Corners.inp', 'w')
 
         # V3 zu V4
         OutPutFile.write('**** X-DIR \n')
@@ -1145,7 +1149,7 @@ class AbaqusMesher(MeshingHelper):
         OutPutFile.write('Eqn-Set-' + str(V1Eqn + 1) + ',3, 1 \n')
         OutPutFile.close()
 
-        OutPutFile = open(RveInfo.store_path + '/VerticeSets.inp', 'w')
+        OutPutFile = open(self.context.store_path + '/VerticeSets.inp', 'w')
         OutPutFile.write('*Nset, nset=V1, instance=PART-1-1\n')
         OutPutFile.write(' {},\n'.format(V1 + 1))
         OutPutFile.write('*Nset, nset=V2, instance=PART-1-1\n')
@@ -1171,63 +1175,63 @@ class AbaqusMesher(MeshingHelper):
         numberofgrains = self.n_grains
 
         phase = [self.rve.loc[self.rve['GrainID'] == i].phaseID.values[0] for i in range(1, numberofgrains+1)]
-        f = open(RveInfo.store_path + '/Materials.inp', 'w+')  # open in write mode to overwrite old files in case ther are any
+        f = open(self.context.store_path + '/Materials.inp', 'w+')  # open in write mode to overwrite old files in case ther are any
         f.write('** MATERIALS\n')
         f.write('**\n')
-        if RveInfo.phase2iso_flag[1] and RveInfo.phase_ratio[1] > 0:
+        if self.context.phase2iso_flag[1] and self.context.phase_ratio[1] > 0:
             f.write('**\n')
             f.write('*Include, Input=Ferrite.inp\n')
-            ff = open(RveInfo.store_path + '/Ferrite.inp', 'w+') 
+            ff = open(self.context.store_path + '/Ferrite.inp', 'w+') 
             ff.write('** MATERIALS\n')
             ff.write('**\n')
             ff.write('*Material, name=Ferrite\n')
             ff.write('*Elastic\n')
             ff.write('210000, 0.3')
             ff.close()
-        if RveInfo.phase2iso_flag[2] and RveInfo.phase_ratio[2] > 0:
+        if self.context.phase2iso_flag[2] and self.context.phase_ratio[2] > 0:
             f.write('**\n')
             f.write('*Include, Input=Martensite.inp\n')
-            ff = open(RveInfo.store_path + '/Martensite.inp', 'w+') 
+            ff = open(self.context.store_path + '/Martensite.inp', 'w+') 
             ff.write('** MATERIALS\n')
             ff.write('**\n')
             ff.write('*Material, name=Martensite\n')
             ff.write('*Elastic\n')
             ff.write('210000, 0.3')
             ff.close()
-        if RveInfo.phase2iso_flag[3] and RveInfo.phase_ratio[3] > 0:
+        if self.context.phase2iso_flag[3] and self.context.phase_ratio[3] > 0:
             f.write('**\n')
             f.write('*Include, Input=Pearlite.inp\n')
-            ff = open(RveInfo.store_path + '/Pearlite.inp', 'w+') 
+            ff = open(self.context.store_path + '/Pearlite.inp', 'w+') 
             ff.write('** MATERIALS\n')
             ff.write('**\n')
             ff.write('*Material, name=Pearlite\n')
             ff.write('*Elastic\n')
             ff.write('210000, 0.3')
             ff.close()
-        if RveInfo.phase2iso_flag[4] and RveInfo.phase_ratio[4] > 0:
+        if self.context.phase2iso_flag[4] and self.context.phase_ratio[4] > 0:
             f.write('**\n')
             f.write('*Include, Input=Bainite.inp\n')
-            ff = open(RveInfo.store_path + '/Bainite.inp', 'w+') 
+            ff = open(self.context.store_path + '/Bainite.inp', 'w+') 
             ff.write('** MATERIALS\n')
             ff.write('**\n')
             ff.write('*Material, name=Bainite\n')
             ff.write('*Elastic\n')
             ff.write('210000, 0.3')
             ff.close()
-        if RveInfo.phase2iso_flag[5] and RveInfo.phase_ratio[5] > 0:
+        if self.context.phase2iso_flag[5] and self.context.phase_ratio[5] > 0:
             f.write('**\n')
             f.write('*Include, Input=Austenite.inp\n')
-            ff = open(RveInfo.store_path + '/Austenite.inp', 'w+') 
+            ff = open(self.context.store_path + '/Austenite.inp', 'w+') 
             ff.write('** MATERIALS\n')
             ff.write('**\n')
             ff.write('*Material, name=Austenite\n')
             ff.write('*Elastic\n')
             ff.write('210000, 0.3')
             ff.close()
-        if RveInfo.phase_ratio[6] > 0:
+        if self.context.phase_ratio[6] > 0:
             f.write('**\n')
             f.write('*Include, Input=Inclusions.inp\n')
-            ff = open(RveInfo.store_path + '/Inclusions.inp', 'w+') 
+            ff = open(self.context.store_path + '/Inclusions.inp', 'w+') 
             ff.write('** MATERIALS\n')
             ff.write('**\n')
             ff.write('*Material, name=Inclusions\n')
@@ -1245,7 +1249,7 @@ class AbaqusMesher(MeshingHelper):
         variables should be introduced to give the user an option
         to modify amplidtude, and other parameters"""
 
-        f = open(RveInfo.store_path + '/Step.inp', 'w+')
+        f = open(self.context.store_path + '/Step.inp', 'w+')
         f.write('**\n')
         f.write('** ----------------------------------------------------------------\n')
         f.write('**\n')
@@ -1301,7 +1305,7 @@ class AbaqusMesher(MeshingHelper):
         variables should be introduced to give the user an option
         to modify amplidtude, and other parameters"""
 
-        f = open(RveInfo.store_path + '/Step.inp', 'w+')
+        f = open(self.context.store_path + '/Step.inp', 'w+')
         f.write('**\n')
         f.write('** Step time needs to be in agreement with amplitude\n')
         f.write('*Amplitude, name=Amp-1\n')
@@ -1374,18 +1378,18 @@ class AbaqusMesher(MeshingHelper):
         f.close()
 
     def write_grain_data(self) -> None:
-        f = open(RveInfo.store_path + '/graindata.inp', 'w+')
+        f = open(self.context.store_path + '/graindata.inp', 'w+')
         f.write('!MMM Crystal Plasticity Input File\n')
         numberofgrains = self.n_grains
         phase = [self.rve.loc[self.rve['GrainID'] == i].phaseID.values[0] for i in range(1, numberofgrains + 1)]
         grainsize = [np.cbrt(self.rve.loc[self.rve['GrainID'] == i].shape[0] *
-                             RveInfo.bin_size**3*3/4/np.pi) for i in range(1, numberofgrains + 1)]
+                             self.context.bin_size**3*3/4/np.pi) for i in range(1, numberofgrains + 1)]
 
 
         for i in range(numberofgrains - 1):
             ngrain = i+1
             if phase[i] <= 5 :
-                if not RveInfo.phase2iso_flag[phase[i]]:
+                if not self.context.phase2iso_flag[phase[i]]:
                     """phi1 = int(np.random.rand() * 360)
                     PHI = int(np.random.rand() * 360)
                     phi2 = int(np.random.rand() * 360)"""
@@ -1420,28 +1424,25 @@ class AbaqusMesher(MeshingHelper):
         if storename == 'default':
             plotter.show()
         elif storename != 'default' and display:
-            plotter.show(screenshot=RveInfo.store_path + '/' + storename + '.png')
+            plotter.show(screenshot=self.context.store_path + '/' + storename + '.png')
         else:
-            plotter.show(screenshot=RveInfo.store_path + '/' + storename + '.png', auto_close=True)
+            plotter.show(screenshot=self.context.store_path + '/' + storename + '.png', auto_close=True)
 
+    @in_context
     def run(self) -> None:
-        if RveInfo.gui_flag:
-            RveInfo.progress_obj.emit(0)
-            RveInfo.infobox_obj.emit('starting mesher')
+        progress = Progress('mesher', total=100).start()
         GRID = self.gen_blocks()
-        if RveInfo.gui_flag:
-            RveInfo.progress_obj.emit(25)
+        progress.update(25)
         GRID = self.gen_grains(GRID)
         smooth_mesh = self.smoothen_mesh(GRID, n_iter=200)
         pbc_grid = smooth_mesh
-        if RveInfo.gui_flag:
-            RveInfo.progress_obj.emit(50)
-        if RveInfo.roughness_flag:
+        progress.update(50)
+        if self.context.roughness_flag:
             roughness = GRID.bounds[3]/5
             perlin_octave = 8
             GRID = self.apply_roughness(grid=GRID, max_roughness=roughness, perlinOctave=perlin_octave)
 
-        f = open(RveInfo.store_path + '/DRAGen_RVE.inp', 'w+')
+        f = open(self.context.store_path + '/DRAGen_RVE.inp', 'w+')
         f.write('*Heading\n')
         f.write('** Job name: Job-1 Model name: Job-1\n')
         f.write('** Generated by: DRAGen \n')
@@ -1453,19 +1454,19 @@ class AbaqusMesher(MeshingHelper):
         f.write('**\n')
         f.close()
 
-        pv.save_meshio(RveInfo.store_path + '/rve-part.inp', smooth_mesh)
-        pv.save_meshio(RveInfo.store_path + '/rve-part.vtk', smooth_mesh)
-        f = open(RveInfo.store_path + '/rve-part.inp', 'r')
+        pv.save_meshio(self.context.store_path + '/rve-part.inp', smooth_mesh)
+        pv.save_meshio(self.context.store_path + '/rve-part.vtk', smooth_mesh)
+        f = open(self.context.store_path + '/rve-part.inp', 'r')
         lines = f.readlines()
         f.close()
         lines = [line.lower() for line in lines]
         startingLine = lines.index('*node\n')
-        f = open(RveInfo.store_path + '/DRAGen_RVE.inp', 'a')
+        f = open(self.context.store_path + '/DRAGen_RVE.inp', 'a')
         f.write('*Part, name=PART-1\n')
         for line in lines[startingLine:]:
-            if (line.replace(" ", "") == "*element,type=c3d8rh\n") and (not RveInfo.reduced_elements):
+            if (line.replace(" ", "") == "*element,type=c3d8rh\n") and (not self.context.reduced_elements):
                 line = "*element,type=c3d8\n"
-            elif (line.replace(" ", "") == "*element,type=c3d8rh\n") and (RveInfo.reduced_elements):
+            elif (line.replace(" ", "") == "*element,type=c3d8rh\n") and (self.context.reduced_elements):
                 line = "*element,type=c3d8r\n"
             if '*end' in line:
                 line = line.replace('*end', '**\n')
@@ -1484,22 +1485,22 @@ class AbaqusMesher(MeshingHelper):
             nGrain = i + 1
             if self.rve.loc[GRID.cell_data['GrainID'] == nGrain].phaseID.values[0] == 1:
                 f.write('** Section: Section - {}\n'.format(nGrain))
-                if not RveInfo.reduced_elements:
+                if not self.context.reduced_elements:
                     f.write(f'*Solid Section, elset=Set-{nGrain}, material=Ferrite_{nGrain}\n')
                 else:
                     f.write(f'*Solid Section, elset=Set-{nGrain}, controls=EC-1, material=Ferrite_{nGrain}\n')
                     f.write('*Hourglass Stiffness\n')
                     f.write('1., , 1., 1.\n')
             elif self.rve.loc[GRID.cell_data['GrainID'] == nGrain].phaseID.values[0] == 2:
-                if not RveInfo.reduced_elements:
-                    if not RveInfo.phase2iso_flag[2]:
+                if not self.context.reduced_elements:
+                    if not self.context.phase2iso_flag[2]:
                         f.write(f'** Section: Section - {nGrain}\n')
                         f.write(f'*Solid Section, elset=Set-{nGrain}, material=Martensite_{nGrain}\n')
                     else:
                         f.write(f'** Section: Section - {nGrain}\n')
                         f.write(f'*Solid Section, elset=Set-{nGrain}, material=Martensite\n')
                 else:
-                    if not RveInfo.phase2iso_flag[2]:
+                    if not self.context.phase2iso_flag[2]:
                         f.write(f'*Solid Section, elset=Set-{nGrain}, controls=EC-1, material=Martensite_{nGrain}\n')
                         f.write('*Hourglass Stiffness\n')
                         f.write('1., , 1., 1.\n')
@@ -1507,15 +1508,15 @@ class AbaqusMesher(MeshingHelper):
                         f.write('** Section: Section - {}\n'.format(nGrain))
                         f.write(f'*Solid Section, elset=Set-{nGrain}, controls=EC-1, material=Martensite\n')
             elif self.rve.loc[GRID.cell_data['GrainID'] == nGrain].phaseID.values[0] == 3:
-                if not RveInfo.reduced_elements:
-                    if not RveInfo.phase2iso_flag[3]:
+                if not self.context.reduced_elements:
+                    if not self.context.phase2iso_flag[3]:
                         f.write('** Section: Section - {}\n'.format(nGrain))
                         f.write(f'*Solid Section, elset=Set-{nGrain}, material=Pearlite_{nGrain}\n')
                     else:
                         f.write('** Section: Section - {}\n'.format(nGrain))
                         f.write('*Solid Section, elset=Set-{}, material=Pearlite\n'.format(nGrain))
                 else:
-                    if not RveInfo.phase2iso_flag[3]:
+                    if not self.context.phase2iso_flag[3]:
                         f.write(f'*Solid Section, elset=Set-{nGrain}, controls=EC-1, material=Pearlite_{nGrain}\n')
                         f.write('*Hourglass Stiffness\n')
                         f.write('1., , 1., 1.\n')
@@ -1523,15 +1524,15 @@ class AbaqusMesher(MeshingHelper):
                         f.write('** Section: Section - {}\n'.format(nGrain))
                         f.write(f'*Solid Section, elset=Set-{nGrain}, controls=EC-1, material=Pearlite\n')
             elif self.rve.loc[GRID.cell_data['GrainID'] == nGrain].phaseID.values[0] == 4:
-                if not RveInfo.reduced_elements:
-                    if not RveInfo.phase2iso_flag[4]:
+                if not self.context.reduced_elements:
+                    if not self.context.phase2iso_flag[4]:
                         f.write(f'** Section: Section - {nGrain}\n')
                         f.write(f'*Solid Section, elset=Set-{nGrain}, material=Bainite_{nGrain}\n')
                     else:
                         f.write(f'** Section: Section - {nGrain}\n')
                         f.write(f'*Solid Section, elset=Set-{nGrain}, material=Bainite\n')
                 else:
-                    if not RveInfo.phase2iso_flag[4]:
+                    if not self.context.phase2iso_flag[4]:
                         f.write(f'*Solid Section, elset=Set-{nGrain}, controls=EC-1, material=Bainite_{nGrain}\n')
                         f.write('*Hourglass Stiffness\n')
                         f.write('1., , 1., 1.\n')
@@ -1539,15 +1540,15 @@ class AbaqusMesher(MeshingHelper):
                         f.write(f'** Section: Section - {nGrain}\n')
                         f.write(f'*Solid Section, elset=Set-{nGrain}, controls=EC-1, material=Bainite\n')
             elif self.rve.loc[GRID.cell_data['GrainID'] == nGrain].phaseID.values[0] == 5:
-                if not RveInfo.reduced_elements:
-                    if not RveInfo.phase2iso_flag[5]:
+                if not self.context.reduced_elements:
+                    if not self.context.phase2iso_flag[5]:
                         f.write(f'** Section: Section - {nGrain}\n')
                         f.write(f'*Solid Section, elset=Set-{nGrain}, material=Austenite_{nGrain}\n')
                     else:
                         f.write(f'** Section: Section - {nGrain}\n')
                         f.write(f'*Solid Section, elset=Set-{nGrain}, material=Austenite\n')
                 else:
-                    if not RveInfo.phase2iso_flag[5]:
+                    if not self.context.phase2iso_flag[5]:
                         f.write(f'*Solid Section, elset=Set-{nGrain}, controls=EC-1, material=Austenite_{nGrain}\n')
                         f.write('*Hourglass Stiffness\n')
                         f.write('1., , 1., 1.\n')
@@ -1555,7 +1556,7 @@ class AbaqusMesher(MeshingHelper):
                         f.write(f'** Section: Section - {nGrain}\n')
                         f.write(f'*Solid Section, elset=Set-{nGrain}, controls=EC-1, material=Austenite\n')
             elif self.rve.loc[GRID.cell_data['GrainID'] == nGrain].phaseID.values[0] == 6:
-                if not RveInfo.reduced_elements:
+                if not self.context.reduced_elements:
                     f.write(f'** Section: Section - {nGrain}\n')
                     f.write(f'*Solid Section, elset=Set-{nGrain}, material=Inclusions\n')
                 else:
@@ -1564,7 +1565,7 @@ class AbaqusMesher(MeshingHelper):
                 # add inclusions as isotropic
 
         f.close()
-        os.remove(RveInfo.store_path + '/rve-part.inp')
+        os.remove(self.context.store_path + '/rve-part.inp')
         x_max = max(GRID.points[:, 0])
         x_min = min(GRID.points[:, 0])
         y_max = max(GRID.points[:, 1])
@@ -1578,18 +1579,17 @@ class AbaqusMesher(MeshingHelper):
                                         (grid_hull_df['z'] == z_max) | (grid_hull_df['z'] == z_min)]
 
         self.make_assembly()
-        if RveInfo.gui_flag:
-            RveInfo.progress_obj.emit(75)
-        if RveInfo.submodel_flag:
+        progress.update(75)
+        if self.context.submodel_flag:
             self.submodelSet(grid_hull_df)
-        if RveInfo.pbc_flag:
+        if self.context.pbc_flag:
             self.pbc(GRID, grid_hull_df)
         self.write_material_def()
-        if RveInfo.submodel_flag:
+        if self.context.submodel_flag:
             self.write_submodel_step_def()
-        elif RveInfo.pbc_flag:
+        elif self.context.pbc_flag:
             self.write_pbc_step_def()
-        if RveInfo.subroutinetype['ICAMS']:
+        if self.context.subroutinetype['ICAMS']:
             self.write_grain_data()
 
         plotter = pv.Plotter(off_screen=True)
@@ -1597,7 +1597,7 @@ class AbaqusMesher(MeshingHelper):
                          show_edges=False, interpolate_before_map=True)
         plotter.add_axes()
         plotter.show(interactive=True, auto_close=True, window_size=[800, 600],
-                     screenshot=RveInfo.store_path+'/Figs/pyvista_smooth_Mesh_phases.png')
+                     screenshot=self.context.store_path+'/Figs/pyvista_smooth_Mesh_phases.png')
         plotter.close()
 
         plotter = pv.Plotter(off_screen=True)
@@ -1605,8 +1605,6 @@ class AbaqusMesher(MeshingHelper):
                          show_edges=False, interpolate_before_map=True)
         plotter.add_axes()
         plotter.show(interactive=True, auto_close=True, window_size=[800, 600],
-                     screenshot=RveInfo.store_path + '/Figs/pyvista_smooth_Mesh_grains.png')
+                     screenshot=self.context.store_path + '/Figs/pyvista_smooth_Mesh_grains.png')
         plotter.close()
-
-        if RveInfo.gui_flag:
-            RveInfo.progress_obj.emit(100)
\ No newline at end of file
+        progress.finish(elements=smooth_mesh.n_cells, nodes=smooth_mesh.n_points)
\ No newline at end of file
@@ -9,7 +9,9 @@ import sys
 import matplotlib.pyplot as plt
 import pandas as pd
 from dragen.generation.Mesher3D import AbaqusMesher
-from dragen.utilities.InputInfo import RveInfo
+from dragen.utilities.InputInfo import RveInfo, in_context
+from dragen.utilities.instrumentation import timed_stage
+from dragen.utilities.progress import Progress
 from dragen.utilities.Helpers import HelperFunctions
 import pyvista as pv
 import numpy as np
@@ -25,8 +27,9 @@ class SubMesher(AbaqusMesher):
     self.gen_blocks() is already available.
     """
 
-    def __init__(self, rve_shape: tuple, rve: pd.DataFrame, subs_df: pd.DataFrame):
-        super().__init__(rve_shape, rve, subs_df)
+    @in_context
+    def __init__(self, rve_shape: tuple, rve: pd.DataFrame, subs_df: pd.DataFrame, context=None):
+        super().__init__(rve_shape, rve, subs_df, context=context)
 
         self.rve = rve
         self.subs_df = subs_df
@@ -50,32 +53,26 @@ class SubMesher(AbaqusMesher):
         self.subsnum = {1: 'Grain', 2: 'Packet', 3: 'Block'}
 
     def gen_subs(self):
-        if RveInfo.gui_flag:
-            RveInfo.progress_obj.emit(0)
-            RveInfo.infobox_obj.emit('starting mesher')
         grid = self.gen_blocks()
-        if RveInfo.gui_flag:
-            RveInfo.progress_obj.emit(25)
         grid = self.gen_grains(grid)
 
         self.rve.sort_values(by=['z','y','x'], inplace=True)
         grid.cell_data['packet_id'] = self.rve['packet_id'].to_numpy()
         grid.cell_data['block_id'] = self.rve['block_id'].to_numpy()
-        print("block id are ")
         bids = list(set(grid.cell_data['block_id']))
         bids = sorted(bids)
+        RveInfo.LOGGER.debug('block ids: {}...{} ({} blocks)'.format(bids[0], bids[-1], len(bids)))
         bid_dict = dict()
         for bid in bids:
-            print(bid)
             bid_dict[bid] = grid.cell_data
         #sys.exit()
-        if RveInfo.anim_flag:
+        if self.context.anim_flag:
             plotter = pv.Plotter(off_screen=True)
             plotter.add_mesh(grid, scalars='packet_id',
                              show_edges=True, interpolate_before_map=True)
             plotter.add_axes()
             plotter.show(interactive=True, auto_close=True, window_size=[800, 600],
-                         screenshot=RveInfo.store_path + '/Figs/pyvista_Hex_Mesh_packets.png')
+                         screenshot=self.context.store_path + '/Figs/pyvista_Hex_Mesh_packets.png')
             plotter.close()
 
             plotter = pv.Plotter(off_screen=True)
@@ -83,7 +80,7 @@ class SubMesher(AbaqusMesher):
                              show_edges=True, interpolate_before_map=True)
             plotter.add_axes()
             plotter.show(interactive=True, auto_close=True, window_size=[800, 600],
-                         screenshot=RveInfo.store_path + '/Figs/pyvista_Hex_Mesh_blocks.png')
+                         screenshot=self.context.store_path + '/Figs/pyvista_Hex_Mesh_blocks.png')
             plotter.close()
 
         return grid
@@ -92,64 +89,64 @@ class SubMesher(AbaqusMesher):
         numberofblocks = self.n_blocks
 
         phase = [self.rve.loc[self.rve['block_id'] == i].phaseID.values[0] for i in range(1, numberofblocks + 1)]
-        f = open(RveInfo.store_path + '/Materials.inp',
+        f = open(self.context.store_path + '/Materials.inp',
                  'w+')  # open in write mode to overwrite old files in case ther are any
         f.write('** MATERIALS\n')
         f.write('**\n')
-        if RveInfo.phase2iso_flag[1] and RveInfo.phase_ratio[1] > 0:
+        if self.context.phase2iso_flag[1] and self.context.phase_ratio[1] > 0:
             f.write('**\n')
             f.write('*Include, Input=Ferrite.inp\n')
-            ff = open(RveInfo.store_path + '/Ferrite.inp', 'w+') 
+            ff = open(self.context.store_path + '/Ferrite.inp', 'w+') 
             ff.write('** MATERIALS\n')
             ff.write('**\n')
             ff.write('*Material, name=Ferrite\n')
             ff.write('*Elastic\n')
             ff.write('210000, 0.3')
             ff.close()
-        if RveInfo.phase2iso_flag[2] and RveInfo.phase_ratio[2] > 0:
+        if self.context.phase2iso_flag[2] and self.context.phase_ratio[2] > 0:
             f.write('**\n')
             f.write('*Include, Input=Martensite.inp\n')
-            ff = open(RveInfo.store_path + '/Martensite.inp', 'w+') 
+            ff = open(self.context.store_path + '/Martensite.inp', 'w+') 
             ff.write('** MATERIALS\n')
             ff.write('**\n')
             ff.write('*Material, name=Martensite\n')
             ff.write('*Elastic\n')
             ff.write('210000, 0.3')
             ff.close()
-        if RveInfo.phase2iso_flag[3] and RveInfo.phase_ratio[3] > 0:
+        if self.context.phase2iso_flag[3] and self.context.phase_ratio[3] > 0:
             f.write('**\n')
             f.write('*Include, Input=Pearlite.inp\n')
-            ff = open(RveInfo.store_path + '/Pearlite.inp', 'w+') 
+            ff = open(self.context.store_path + '/Pearlite.inp', 'w+') 
             ff.write('** MATERIALS\n')
             ff.write('**\n')
             ff.write('*Material, name=Pearlite\n')
             ff.write('*Elastic\n')
             ff.write('210000, 0.3')
             ff.close()
-        if RveInfo.phase2iso_flag[4] and RveInfo.phase_ratio[4] > 0:
+        if self.context.phase2iso_flag[4] and self.context.phase_ratio[4] > 0:
             f.write('**\n')
             f.write('*Include, Input=Bainite.inp\n')
-            ff = open(RveInfo.store_path + '/Bainite.inp', 'w+') 
+            ff = open(self.context.store_path + '/Bainite.inp', 'w+') 
             ff.write('** MATERIALS\n')
             ff.write('**\n')
             ff.write('*Material, name=Bainite\n')
             ff.write('*Elastic\n')
             ff.write('210000, 0.3')
             ff.close()
-        if RveInfo.phase2iso_flag[5] and RveInfo.phase_ratio[5] > 0:
+        if self.context.phase2iso_flag[5] and self.context.phase_ratio[5] > 0:
             f.write('**\n')
             f.write('*Include, Input=Austenite.inp\n')
-            ff = open(RveInfo.store_path + '/Austenite.inp', 'w+') 
+            ff = open(self.context.store_path + '/Austenite.inp', 'w+') 
             ff.write('** MATERIALS\n')
             ff.write('**\n')
             ff.write('*Material, name=Austenite\n')
             ff.write('*Elastic\n')
             ff.write('210000, 0.3')
             ff.close()
-        if RveInfo.phase_ratio[6] > 0:
+        if self.context.phase_ratio[6] > 0:
             f.write('**\n')
             f.write('*Include, Input=Inclusions.inp\n')
-            ff = open(RveInfo.store_path + '/Inclusions.inp', 'w+') 
+            ff = open(self.context.store_path + '/Inclusions.inp', 'w+') 
             ff.write('** MATERIALS\n')
             ff.write('**\n')
             ff.write('*Material, name=Inclusions\n')
@@ -163,7 +160,7 @@ class SubMesher(AbaqusMesher):
             HelperFunctions.write_material_helper(i, phase, self.grains_df)
 
     def write_block_data(self) -> None:
-        f = open(RveInfo.store_path + '/graindata.inp', 'w+')
+        f = open(self.context.store_path + '/graindata.inp', 'w+')
         f.write('!MMM Crystal Plasticity Input File\n')
         phase1_idx = 0
         numberofblocks = self.n_blocks
@@ -174,7 +171,7 @@ class SubMesher(AbaqusMesher):
         #phase as its grain size in the future
         for i in range(numberofblocks):
             nblock = i + 1
-            if not RveInfo.phase2iso_flag:  #[]?(12-03-2024)
+            if not self.context.phase2iso_flag:  #[]?(12-03-2024)
                 """phi1 = int(np.random.rand() * 360)
                 PHI = int(np.random.rand() * 360)
                 phi2 = int(np.random.rand() * 360)"""
@@ -204,6 +201,8 @@ class SubMesher(AbaqusMesher):
 
         return int(gid_list.iloc[0])
 
+    @timed_stage('smoothen_mesh', counts=lambda result, *args, **kwargs: {'elements': result.n_cells,
+                                                                          'nodes': result.n_points})
     def smoothen_mesh(self, grid: pv.UnstructuredGrid, element_type: str = 'C3D8') -> pv.UnstructuredGrid:
 
         """information about grainboundary elements of hex-mesh
@@ -223,14 +222,12 @@ class SubMesher(AbaqusMesher):
         pak_id_list = list()
 
         ######################################
-        if RveInfo.element_type != 'C3D8' and RveInfo.element_type != 'HEX8':
+        if self.context.element_type != 'C3D8' and self.context.element_type != 'HEX8':
             old_grid = grid.copy()
             grid_tet = pv.UnstructuredGrid()
+            progress = Progress('tetrahedral_mesh', total=numberOfBlocks - 1).start()
             for i in range(1, numberOfBlocks):
                 phase = self.rve.loc[self.rve['block_id'] == i].phaseID.values[0]
-                print(f"celldata:{old_grid.cell_data['block_id']}")
-
-                print("print here block id {}".format(i),np.where(np.asarray(old_grid.cell_data['block_id'] == i)))
                 grain_grid_tet = old_grid.extract_cells(np.asarray(old_grid.cell_data['block_id'] == i))
                 grain_surf_tet = grain_grid_tet.extract_surface(pass_pointid=True, pass_cellid=True)
                 grain_surf_tet.triangulate(inplace=True)
@@ -238,15 +235,14 @@ class SubMesher(AbaqusMesher):
                     grain_surf_tet.plot()
                     plt.show()
                 tet = tetgen.TetGen(grain_surf_tet)
-                if RveInfo.element_type == 'C3D4':
+                if self.context.element_type == 'C3D4':
                     tet.tetrahedralize(order=1, mindihedral=10, minratio=1.5, supsteiner_level=0, steinerleft=0)
-                elif RveInfo.element_type == 'C3D10':
+                elif self.context.element_type == 'C3D10':
                     tet.tetrahedralize(order=2, mindihedral=10, minratio=1.5, supsteiner_level=0, steinerleft=0)
                 tet_grain_grid = tet.grid
                 ncells = tet_grain_grid.n_cells
 
-                if RveInfo.gui_flag:
-                    RveInfo.progress_obj.emit(75+(100*(i+1)/self.n_blocks/4))
+                progress.update(i)
 
                 blockIDList = [i]
                 packetIDList = [self.bid_to_pid(i)]
@@ -265,6 +261,7 @@ class SubMesher(AbaqusMesher):
                     grid_tet = tet_grain_grid
                 else:
                     grid_tet = tet_grain_grid.merge(grid_tet, merge_points=True)
+            progress.finish(elements=grid_tet.n_cells)
 
             grid_tet.cell_data["block_id"] = np.asarray(bid_list)
             grid_tet.cell_data["packet_id"] = np.asarray(pak_id_list)
@@ -306,7 +303,7 @@ class SubMesher(AbaqusMesher):
             self.grains_df.loc[self.grains_df['GrainID'] == i-1, 'meshed_conti_volume'] = grain_vol * 10 ** 9
 
         self.grains_df[['GrainID','meshed_conti_volume', 'phaseID']].\
-        to_csv(RveInfo.store_path + '/Generation_Data/grain_data_output_conti.csv', index=False)
+        to_csv(self.context.store_path + '/Generation_Data/grain_data_output_conti.csv', index=False)
 
         all_points_df.loc[all_points_df_old['x_min'], 'x'] = x_min
         all_points_df.loc[all_points_df_old['y_min'], 'y'] = y_min
@@ -318,20 +315,22 @@ class SubMesher(AbaqusMesher):
         grid.points = all_points_df[['x', 'y', 'z']].values
         return grid
 
+    @in_context
     def run(self) -> None:
-
+        progress = Progress('mesher', total=100).start()
         GRID = self.gen_subs()
+        progress.update(25)
         smooth_mesh = self.smoothen_mesh(GRID)
 
         pbc_grid = smooth_mesh
 
 
-        if RveInfo.roughness_flag:
+        if self.context.roughness_flag:
             # TODO: roghness einbauen
             # grid = self.apply_roughness(grid)
             pass
 
-        f = open(RveInfo.store_path + '/DRAGen_RVE.inp', 'w+')
+        f = open(self.context.store_path + '/DRAGen_RVE.inp', 'w+')
         f.write('*Heading\n')
         f.write('** Job name: Job-1 Model name: Job-1\n')
         f.write('** Generated by: DRAGen \n')
@@ -343,13 +342,13 @@ class SubMesher(AbaqusMesher):
         f.write('**\n')
         f.close()
 
-        pv.save_meshio(RveInfo.store_path + '/rve-part.inp', smooth_mesh)
-        f = open(RveInfo.store_path + '/rve-part.inp', 'r')
+        pv.save_meshio(self.context.store_path + '/rve-part.inp', smooth_mesh)
+        f = open(self.context.store_path + '/rve-part.inp', 'r')
         lines = f.readlines()
         f.close()
         lines = [line.lower() for line in lines]
         startingLine = lines.index('*node\n')
-        f = open(RveInfo.store_path + '/DRAGen_RVE.inp', 'a')
+        f = open(self.context.store_path + '/DRAGen_RVE.inp', 'a')
         f.write('*Part, name=PART-1\n')
         for line in lines[startingLine:]:
             if line.replace(" ", "") == "*element,type=c3d8rh\n":
@@ -359,7 +358,7 @@ class SubMesher(AbaqusMesher):
             f.write(line)
         n = 1
         for nSubs in [self.n_grains,self.n_packets,self.n_blocks]:
-            print('current sub is {},number is {}'.format(self.subsnum[n],nSubs))
+            RveInfo.LOGGER.debug('current sub is {},number is {}'.format(self.subsnum[n],nSubs))
             for i in range(nSubs):
                 nSub = i + 1
                 cells = np.where(smooth_mesh.cell_data[self.idnum[n]] == nSub)[0]
@@ -384,7 +383,7 @@ class SubMesher(AbaqusMesher):
                 f.write('** Section: Section - {}\n'.format(nBlock))
                 f.write('*Solid Section, elset=Set-Block{}, material=Ferrite_{}\n'.format(nBlock, phase1_idx))
             elif self.rve.loc[GRID.cell_data['block_id'] == nBlock].phaseID.values[0] == 2:
-                if not RveInfo.phase2iso_flag[2]:
+                if not self.context.phase2iso_flag[2]:
                     phase2_idx += 1
                     f.write('** Section: Section - {}\n'.format(nBlock))
                     f.write('*Solid Section, elset=Set-Block{}, material=Martensite_{}\n'.format(nBlock, phase2_idx))
@@ -392,7 +391,7 @@ class SubMesher(AbaqusMesher):
                     f.write('** Section: Section - {}\n'.format(nBlock))
                     f.write('*Solid Section, elset=Set-Block{}, material=Martensite\n'.format(nBlock))
             elif self.rve.loc[GRID.cell_data['block_id'] == nBlock].phaseID.values[0] == 3:
-                if not RveInfo.phase2iso_flag[3]:
+                if not self.context.phase2iso_flag[3]:
                     phase3_idx += 1
                     f.write('** Section: Section - {}\n'.format(nBlock))
                     f.write(
@@ -402,7 +401,7 @@ class SubMesher(AbaqusMesher):
                     f.write('*Solid Section, elset=Set-Block{}, material=Pearlite\n'.format(nBlock))
 
             elif self.rve.loc[GRID.cell_data['block_id'] == nBlock].phaseID.values[0] == 4:
-                if not RveInfo.phase2iso_flag[4]:
+                if not self.context.phase2iso_flag[4]:
                     phase4_idx += 1
                     f.write('** Section: Section - {}\n'.format(nBlock))
                     f.write('*Solid Section, elset=Set-Block{}, material=Bainite_{}\n'.format(nBlock, phase4_idx))
@@ -410,7 +409,7 @@ class SubMesher(AbaqusMesher):
                     f.write('** Section: Section - {}\n'.format(nBlock))
                     f.write('*Solid Section, elset=Set-Block{}, material=Bainite\n'.format(nBlock))
             elif self.rve.loc[GRID.cell_data['block_id'] == nBlock].phaseID.values[0] == 5: 
-                if not RveInfo.phase2iso_flag[5]:
+                if not self.context.phase2iso_flag[5]:
                     phase5_idx += 1
                     f.write('** Section: Section - {}\n'.format(nBlock))
                     f.write('*Solid Section, elset=Set-Block{}, material=Austenite_{}\n'.format(nBlock, phase5_idx))
@@ -420,7 +419,7 @@ class SubMesher(AbaqusMesher):
 
 
         f.close()
-        os.remove(RveInfo.store_path + '/rve-part.inp')
+        os.remove(self.context.store_path + '/rve-part.inp')
         x_max = max(GRID.points[:, 0])
         x_min = min(GRID.points[:, 0])
         y_max = max(GRID.points[:, 1])
@@ -436,22 +435,18 @@ class SubMesher(AbaqusMesher):
         self.make_assembly()  # Don't change the order
         #self.pbc(GRID, grid_hull_df)  # of these four
         #self.write_substruct_material_def()  # functions here
-        if RveInfo.gui_flag:
-            RveInfo.progress_obj.emit(50)
-        if RveInfo.submodel_flag:
+        progress.update(50)
+        if self.context.submodel_flag:
             self.submodelSet(grid_hull_df)
-        if RveInfo.pbc_flag:
+        if self.context.pbc_flag:
             self.pbc(GRID, grid_hull_df)
         self.write_substruct_material_def()
-        if RveInfo.submodel_flag:
+        if self.context.submodel_flag:
             self.write_submodel_step_def()
-        elif RveInfo.pbc_flag:
-            print('pbcs were assumed')
+        elif self.context.pbc_flag:
             self.write_pbc_step_def()
-        #if RveInfo.pbc_flag:
+        #if self.context.pbc_flag:
         #    self.write_pbc_step_def()  # it will lead to a faulty inputfile
-        if RveInfo.gui_flag:
-            RveInfo.progress_obj.emit(75)
+        progress.update(75)
         self.write_block_data()
-        if RveInfo.gui_flag:
-            RveInfo.progress_obj.emit(100)
\ No newline at end of file
+        progress.finish(elements=smooth_mesh.n_cells, nodes=smooth_mesh.n_points)
\ No newline at end of file
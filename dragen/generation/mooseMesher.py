@@ -3,19 +3,28 @@ import pandas as pd
 
 from dragen.utilities.generateExodus import NetCDFWrapper
 from dragen.utilities.PvGridGeneration import MeshingHelper
-from dragen.utilities.InputInfo import RveInfo
+from dragen.utilities.InputInfo import in_context
+from dragen.utilities.instrumentation import timed_stage
 
 
 class MooseMesher(MeshingHelper):
 
-    def __init__(self, rve_shape: tuple, rve: pd.DataFrame, grains_df: pd.DataFrame):
-        super().__init__(rve_shape, rve, grains_df)
+    def __init__(self, rve_shape: tuple, rve: pd.DataFrame, grains_df: pd.DataFrame, context=None):
+        super().__init__(rve_shape, rve, grains_df, context=context)
 
+    @in_context
     def run(self):
         grid = self.gen_blocks()
         grid = self.gen_grains(grid)
         grid = self.smoothen_mesh(grid, n_iter=200)
-
+        self.write_exodus(grid)
+
+    @timed_stage('exodus_export', counts=lambda result, self, grid: {'elements': grid.n_cells,
+                                                                     'nodes': grid.n_points})
+    def write_exodus(self, grid):
+        """
+        writes the smoothed grid with grain blocks, side node sets and the phaseID of every element to DRAGen_RVE.e
+        """
         points = grid.points
         nNodes = grid.n_points
         nElems = grid.n_cells
@@ -26,7 +35,7 @@ class MooseMesher(MeshingHelper):
         # NetCDF4 starts counting at 1, cell id of 0 leads to errors
         grainIds = ['grain-{}'.format(i + 1) for i in range(nBlocks)]
         print('grainIds: ', grainIds)
-        assert RveInfo.element_type == 'HEX8', 'only Hexagonal elements supported for Moose'
+        assert self.context.element_type == 'HEX8', 'only Hexagonal elements supported for Moose'
 
         nNodeSets = 6
         n_elem_nodes = 8
@@ -40,7 +49,7 @@ class MooseMesher(MeshingHelper):
                        'front': {'z': max(grid.points[:, 2])}, 'back': {'z': min(grid.points[:, 2])}}
 
         exoFile = NetCDFWrapper('DRAGen_RVE', num_nodes=nNodes, num_elems=nElems, num_blocks=nBlocks,
-                                num_node_sets=nNodeSets)
+                                num_node_sets=nNodeSets, context=self.context)
 
         exoFile.set_coord_names(['x', 'y', 'z'])
         xcoords = np.array(points[:, 0])
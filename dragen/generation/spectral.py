@@ -5,6 +5,8 @@ import damask
 import numpy as np
 import pandas as pd
 from dragen.utilities.InputInfo import RveInfo
+from dragen.utilities.seeding import random_seed
+from dragen.utilities.instrumentation import timed_stage
 import pyvista as pv
 
 
@@ -70,10 +72,10 @@ def write_material(store_path: str, grains: list, angles: pd.DataFrame) -> None:
             matdata = matdata.material_add(phase=['Ferrite'], O=o,
                                            homogenization='SX')
         elif p == 2:
-            matdata = matdata.material_add(phase=['Martensite'], O=damask.Rotation.from_random(1),
+            matdata = matdata.material_add(phase=['Martensite'], O=damask.Rotation.from_random(1, rng_seed=random_seed()),
                                            homogenization='SX')
         elif p == 6:
-            matdata = matdata.material_add(phase=['ThirdPhase'], O=damask.Rotation.from_random(1),
+            matdata = matdata.material_add(phase=['ThirdPhase'], O=damask.Rotation.from_random(1, rng_seed=random_seed()),
                                            homogenization='SX')
         i += 1
 
@@ -97,9 +99,14 @@ def write_load(store_path: str) -> None:
     load_case.save(store_path + '/load.yaml')
 
 
-def write_grid(store_path: str, rve: np.ndarray, spacing: float) -> None:
-    if rve.dtype != np.int64:
-        rve = rve.astype('int64')
+@timed_stage('write_grid', counts=lambda result, store_path, rve, spacing, **kwargs: {'voxels': rve.size})
+def write_grid(store_path: str, rve: np.ndarray, spacing: float, dtype='int32') -> None:
+    """
+    :param dtype: integer type of the material ids in grid.vti, int32 holds every grain id and DAMASK reads it (int64
+    doubles the copies damask makes of large grids)
+    """
+    if rve.dtype != np.dtype(dtype):
+        rve = rve.astype(dtype)
     grid = damask.Grid(material=rve, size=[spacing, spacing, spacing])
 
     print('Anzahl Materialien im Grid', grid.N_materials)
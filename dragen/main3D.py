@@ -1,112 +1,114 @@
 import random
-import sys
 import math
 import numpy as np
 
-import damask
 import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
-from PIL import Image, ImageOps
 import time
 from dragen.generation.DiscreteRsa3D import DiscreteRsa3D
 from dragen.generation.DiscreteTesselation3D import Tesselation3D
 from dragen.utilities.Helpers import HelperFunctions
-from dragen.generation.mesh_subs import SubMesher
-from dragen.generation.Mesher3D import AbaqusMesher
-from dragen.generation.mooseMesher import MooseMesher
-from dragen.postprocessing.voldistribution import PostProcVol
-from dragen.postprocessing.Shape_analysis import shape
-from dragen.postprocessing.texture_analysis import Texture
-from dragen.utilities.InputInfo import RveInfo
+from dragen.utilities.InputInfo import RveInfo, in_context
+from dragen.utilities.seeding import seed_stage, random_seed
+from dragen.utilities.checkpoints import StageCheckpoints, CHECKPOINT_STAGES
+from dragen.utilities.instrumentation import timed_stage
+from dragen.utilities.progress import notify
+from dragen.utilities.outofcore import copy_array, replace
 from dragen.substructure.run import Run as substrucRun
-
-import dragen.generation.spectral as spectral
+# matplotlib, the meshers (pyvista, tetgen, damask) and the post processing (seaborn, PIL, sklearn, cv2) are imported
+# in the methods which use them, see Helpers
 
 
 class DataTask3D(HelperFunctions):
 
-    def __init__(self):
-        super().__init__()
+    def __init__(self, context=None):
+        """
+        :param context: GenerationContext of this rve, activated in every step (None: snapshot of RveInfo)
+        """
+        super().__init__(context=context)
 
+    @in_context
+    @timed_stage('grain_sampling', counts=lambda result, self: {'grains': len(result[0])})
     def grain_sampling(self):
         """
         In this function the correct number of grains for the chosen Volume is sampled from given csv files
         """
-        files = RveInfo.file_dict
+        seed_stage('sampling')
+        files = self.context.file_dict
         RveInfo.LOGGER.info("RVE generation process has started...")
         total_df = pd.DataFrame()
         all_phases_input_df = pd.DataFrame()
 
         # TODO: Generiere Bandwidths hier!
-        if RveInfo.number_of_bands > 0:
-            low = RveInfo.lower_band_bound
-            high = RveInfo.upper_band_bound
-            RveInfo.bandwidths = np.random.uniform(low=low, high=high, size=RveInfo.number_of_bands)
-            print(RveInfo.bandwidths)
-            sum_bw = RveInfo.bandwidths.sum()
+        if self.context.number_of_bands > 0:
+            low = self.context.lower_band_bound
+            high = self.context.upper_band_bound
+            # the drawn bandwidths are part of the context of this rve from now on
+            self.context = self.context.replace(
+                bandwidths=np.random.uniform(low=low, high=high, size=self.context.number_of_bands))
+            RveInfo.LOGGER.debug('bandwidths: {}'.format(self.context.bandwidths))
+            sum_bw = self.context.bandwidths.sum()
         else:
             sum_bw = 0
         input_data = pd.DataFrame()
-        for phase in RveInfo.phases:
+        for phase in self.context.phases:
             
-            file_idx = RveInfo.PHASENUM[phase]
-            if RveInfo.phase_ratio[file_idx] == 0:
+            file_idx = self.context.PHASENUM[phase]
+            if self.context.phase_ratio[file_idx] == 0:
                 continue
 
-            print('current phase is', phase, ';phase input file is', files[file_idx])
-            print('current phase is', phase, ';phase ratio file is', RveInfo.phase_ratio[file_idx])
+            notify('current phase is {} ;phase input file is {}'.format(phase, files[file_idx]))
+            notify('current phase is {} ;phase ratio file is {}'.format(phase, self.context.phase_ratio[file_idx]))
 
             # Check file ending:
             if files[file_idx].endswith('.csv'):
-                phase_input_df = super().read_input(files[file_idx], RveInfo.dimension)
+                phase_input_df = super().read_input(files[file_idx], self.context.dimension)
             elif files[file_idx].endswith('.pkl'):
                 size = 1000
-                if RveInfo.PHASENUM[phase] == 7:
+                if self.context.PHASENUM[phase] == 7:
                     size = 25000
-                phase_input_df = super().read_input_gan(files[file_idx], RveInfo.dimension, size=size)
+                phase_input_df = super().read_input_gan(files[file_idx], self.context.dimension, size=size)
             else:
-                print(files, file_idx)
+                RveInfo.LOGGER.error('input file {} of phase {} is neither .csv nor .pkl'.format(files[file_idx], phase))
 
             if phase != 'Bands':
-                phase_id = RveInfo.PHASENUM[phase]
-                if RveInfo.box_size_y is None and RveInfo.box_size_z is None:
+                phase_id = self.context.PHASENUM[phase]
+                if self.context.box_size_y is None and self.context.box_size_z is None:
 
-                    adjusted_size = np.cbrt((RveInfo.box_size ** 3 -
-                                             (RveInfo.box_size ** 2 * sum_bw))
-                                            * RveInfo.phase_ratio[file_idx])
+                    adjusted_size = np.cbrt((self.context.box_size ** 3 -
+                                             (self.context.box_size ** 2 * sum_bw))
+                                            * self.context.phase_ratio[file_idx])
                     grains_df = super().sample_input_3D(phase_input_df,bs=adjusted_size, phase_id=phase_id)
-                elif RveInfo.box_size_y is not None and RveInfo.box_size_z is None:
-                    adjusted_size = np.cbrt((RveInfo.box_size ** 2 * RveInfo.box_size_y -
-                                             (RveInfo.box_size ** 2 * sum_bw))
-                                            * RveInfo.phase_ratio[file_idx])
+                elif self.context.box_size_y is not None and self.context.box_size_z is None:
+                    adjusted_size = np.cbrt((self.context.box_size ** 2 * self.context.box_size_y -
+                                             (self.context.box_size ** 2 * sum_bw))
+                                            * self.context.phase_ratio[file_idx])
                     grains_df = super().sample_input_3D(phase_input_df, bs=adjusted_size, phase_id=phase_id)
-                elif RveInfo.box_size_y is None and RveInfo.box_size_z is not None:
-                    adjusted_size = np.cbrt((RveInfo.box_size ** 2 * RveInfo.box_size_z -
-                                             (RveInfo.box_size ** 2 * sum_bw))
-                                            * RveInfo.phase_ratio[file_idx])
+                elif self.context.box_size_y is None and self.context.box_size_z is not None:
+                    adjusted_size = np.cbrt((self.context.box_size ** 2 * self.context.box_size_z -
+                                             (self.context.box_size ** 2 * sum_bw))
+                                            * self.context.phase_ratio[file_idx])
                     grains_df = super().sample_input_3D(phase_input_df, bs=adjusted_size, phase_id=phase_id)
                 else:
-                    adjusted_size = np.cbrt((RveInfo.box_size * RveInfo.box_size_y * RveInfo.box_size_z -
-                                             (RveInfo.box_size ** 2 * sum_bw))
-                                            * RveInfo.phase_ratio[file_idx])
+                    adjusted_size = np.cbrt((self.context.box_size * self.context.box_size_y * self.context.box_size_z -
+                                             (self.context.box_size ** 2 * sum_bw))
+                                            * self.context.phase_ratio[file_idx])
                     grains_df = super().sample_input_3D(phase_input_df, bs=adjusted_size, phase_id=phase_id)
 
-                grains_df['phaseID'] = RveInfo.PHASENUM[phase]
+                grains_df['phaseID'] = self.context.PHASENUM[phase]
                 total_df = pd.concat([total_df, grains_df])
-                phase_input_df['phaseID'] = RveInfo.PHASENUM[phase]
+                phase_input_df['phaseID'] = self.context.PHASENUM[phase]
                 all_phases_input_df = pd.concat([all_phases_input_df,phase_input_df])
                 input_data = pd.concat([input_data, phase_input_df])
 
             else:
                 grains_df = phase_input_df.copy()
-                grains_df['phaseID'] = RveInfo.PHASENUM[phase]
+                grains_df['phaseID'] = self.context.PHASENUM[phase]
                 total_df = pd.concat([total_df, grains_df])
                 all_phases_input_df = pd.concat([all_phases_input_df,phase_input_df])
 
-        print('Processing now')
-        #total_df.to_csv(RveInfo.gen_path + '/complete_input_data.csv', index=False)
-        total_df = super().process_df(total_df, RveInfo.SHRINK_FACTOR)
+        notify('Processing now')
+        #total_df.to_csv(self.context.gen_path + '/complete_input_data.csv', index=False)
+        total_df = super().process_df(total_df, self.context.SHRINK_FACTOR)
         total_volume = sum(
             total_df[total_df['phaseID'] <= 7]['final_conti_volume'].values)  # Inclusions and bands dont influence filling #7>5
         estimated_boxsize = np.cbrt(total_volume)
@@ -114,11 +116,12 @@ class DataTask3D(HelperFunctions):
         RveInfo.LOGGER.info("the total volume of your dataframe is {}. A boxsize of {} is recommended.".
                             format(total_volume, estimated_boxsize))
 
-        input_data.to_csv(RveInfo.gen_path + '/complete_input_data.csv', index=False)
-        grains_df.to_csv(RveInfo.gen_path + '/sampled_grains.csv', index=False)
+        input_data.to_csv(self.context.gen_path + '/complete_input_data.csv', index=False)
+        grains_df.to_csv(self.context.gen_path + '/sampled_grains.csv', index=False)
 
         return total_df, all_phases_input_df
 
+    @in_context
     def rve_generation(self, total_df):
 
         """
@@ -126,33 +129,64 @@ class DataTask3D(HelperFunctions):
             grains_df = Grains which are used in RSA and Tesselation directly
             inclusions_df = data which is placed directly after the tesselation (not growing)
             bands_df = data used for the formation of bands
+        The stages rsa, tesselation, inclusions and periodicity write a checkpoint if RveInfo.checkpoint_flag is set.
+        With RveInfo.resume or RveInfo.from_stage the latest checkpoint of the same inputs is loaded and only the
+        following stages run (see dragen.utilities.checkpoints)
+        """
+        checkpoints = StageCheckpoints(total_df)
+        done_stage, state = checkpoints.resume()
+        stages = {'rsa': self.rsa_stage, 'tesselation': self.tesselation_stage,
+                  'inclusions': self.inclusions_stage, 'periodicity': self.periodicity_stage}
+        first = 0 if done_stage is None else CHECKPOINT_STAGES.index(done_stage) + 1
+        if done_stage is None:
+            state = {'total_df': total_df}
+        elif first > CHECKPOINT_STAGES.index('tesselation'):
+            # the output of the skipped tesselation
+            np.save(self.context.store_path + '/' + 'RVE_Numpy.npy', state['tesselation_rve'])
+        for stage in CHECKPOINT_STAGES[first:]:
+            state = stages[stage](state)
+            if state['rve_status']:
+                checkpoints.save(stage, state)
+        return self.export_stage(state)
+
+    def rsa_stage(self, state: dict) -> dict:
         """
+        rsa of the bands and the grains
+        :param state: dict with the sampled grains total_df
+        """
+        total_df = state['total_df']
+        inclusions_df = None
+        bands_df = None
+        seed_stage('rsa')
         grains_df = total_df.loc[total_df['phaseID'] <= 6, :] 
         grains_df = grains_df.sort_values(by='final_conti_volume', ascending=False)
         grains_df.reset_index(inplace=True, drop=True)
         grains_df.loc[:, 'GrainID'] = grains_df.index + 1
 
-        if RveInfo.phase_ratio[RveInfo.PHASENUM['Inclusions']] > 0:
+        if self.context.phase_ratio[self.context.PHASENUM['Inclusions']] > 0:
             inclusions_df = total_df[total_df['phaseID'] == 6]
             inclusions_df.sort_values(by='final_conti_volume', inplace=True, ascending=False)
             inclusions_df.reset_index(inplace=True, drop=True)
             inclusions_df['GrainID'] = inclusions_df.index
 
-        if RveInfo.number_of_bands > 0:
+        if self.context.number_of_bands > 0:
             bands_df = total_df[total_df['phaseID'] == 7]
             bands_df = bands_df.sort_values(by='final_conti_volume', ascending=False)
             bands_df.reset_index(inplace=True, drop=True)
             bands_df.loc[:, 'GrainID'] = bands_df.index
 
+        # upper bound of the grain ids in the rsa arrays, the grains of every band are sampled from the band grains
+        n_labels = len(grains_df) + self.context.number_of_bands * (0 if bands_df is None else len(bands_df))
+
         """
         BAND GENERATION HERE!
         """
-        if RveInfo.number_of_bands > 0:
-            box_size_y = RveInfo.box_size if RveInfo.box_size_y is None else RveInfo.box_size_y
+        if self.context.number_of_bands > 0:
+            box_size_y = self.context.box_size if self.context.box_size_y is None else self.context.box_size_y
             #print(box_size_y)
             band_data = bands_df.copy()
-            adjusted_size = np.cbrt((RveInfo.bandwidths[0] * RveInfo.box_size ** 2) * RveInfo.band_filling)
-            bands_df = super().sample_input_3D(band_data, adjusted_size, phase_id=7, constraint=RveInfo.bandwidths[0])
+            adjusted_size = np.cbrt((self.context.bandwidths[0] * self.context.box_size ** 2) * self.context.band_filling)
+            bands_df = super().sample_input_3D(band_data, adjusted_size, phase_id=7, constraint=self.context.bandwidths[0])
             bands_df.sort_values(by='final_conti_volume', inplace=True, ascending=False)
             bands_df.reset_index(inplace=True, drop=True)
             bands_df['GrainID'] = bands_df.index
@@ -160,19 +194,19 @@ class DataTask3D(HelperFunctions):
             discrete_RSA_obj = DiscreteRsa3D(bands_df['a'].tolist(),
                                              bands_df['b'].tolist(),
                                              bands_df['c'].tolist(),
-                                             bands_df['alpha'].tolist())
+                                             bands_df['alpha'].tolist(), context=self.context)
 
             # Zum abspeichern der Werte
             band_list = list()
 
             # Berechne center and store the values:
-            band_center_0 = int(RveInfo.bin_size + np.random.rand() * (box_size_y - RveInfo.bin_size))
-            band_half_0 = float(RveInfo.bandwidths[0] / 2)
+            band_center_0 = int(self.context.bin_size + np.random.rand() * (box_size_y - self.context.bin_size))
+            band_half_0 = float(self.context.bandwidths[0] / 2)
             band_list.append([band_half_0, band_center_0])
 
             # initialize empty grid_array for bands called band_array
-            band_rsa = super().gen_array_new()
-            rsa_start = super().band_generator(band_array=band_rsa, bandwidth=RveInfo.bandwidths[0], center=band_center_0)
+            band_rsa = super().gen_array_new(n_labels=n_labels)
+            rsa_start = super().band_generator(band_array=band_rsa, bandwidth=self.context.bandwidths[0], center=band_center_0)
 
             # Place first band
             x_0_list = list()
@@ -189,14 +223,14 @@ class DataTask3D(HelperFunctions):
             z_0_list.extend(z_0)
 
             # Place the Rest of the Bands
-            for i in range(1, RveInfo.number_of_bands):
+            for i in range(1, self.context.number_of_bands):
                 #print(i)
-                print('RSA zu Beginn Band 2.')
+                RveInfo.LOGGER.debug('rsa of band {}'.format(i + 1))
 
                 # ---------------------------------------------------------------------------------------------------
                 # Sample grains for the second band
-                adjusted_size = np.cbrt((RveInfo.bandwidths[i] * RveInfo.box_size ** 2) * RveInfo.band_filling)
-                new_df = super().sample_input_3D(band_data, adjusted_size, phase_id=7, constraint=RveInfo.bandwidths[0])
+                adjusted_size = np.cbrt((self.context.bandwidths[i] * self.context.box_size ** 2) * self.context.band_filling)
+                new_df = super().sample_input_3D(band_data, adjusted_size, phase_id=7, constraint=self.context.bandwidths[0])
                 new_df.sort_values(by='final_conti_volume', inplace=True, ascending=False)
                 new_df.reset_index(inplace=True, drop=True)
                 new_df['GrainID'] = new_df.index
@@ -208,8 +242,8 @@ class DataTask3D(HelperFunctions):
                 # Berechne neuen Center und prüfe überschneidung
                 intersect = True
                 while intersect == True:
-                    band_center = int(RveInfo.bin_size + np.random.rand() * (box_size_y - RveInfo.bin_size))
-                    band_half = float(RveInfo.bandwidths[0] / 2)
+                    band_center = int(self.context.bin_size + np.random.rand() * (box_size_y - self.context.bin_size))
+                    band_half = float(self.context.bandwidths[0] / 2)
                     # Intersection when c_old - c_new < b_old + b_new (for each band)
                     for [bw_old, bc_old] in band_list:
                         bw_dist = bw_old + band_half
@@ -225,14 +259,14 @@ class DataTask3D(HelperFunctions):
                 startindex = int(np.amin(rsa) + 1000) * -1
                #print(startindex)
 
-                rsa = super().gen_array_new()
+                rsa = super().gen_array_new(n_labels=n_labels)
                 band_rsa = super().gen_boundaries_3D(rsa)
-                band_array_new = super().band_generator(band_array=band_rsa, bandwidth=RveInfo.bandwidths[0], center=band_center)
+                band_array_new = super().band_generator(band_array=band_rsa, bandwidth=self.context.bandwidths[0], center=band_center)
 
                 discrete_RSA_obj = DiscreteRsa3D(new_df['a'].tolist(),
                                                  new_df['b'].tolist(),
                                                  new_df['c'].tolist(),
-                                                 new_df['alpha'].tolist())
+                                                 new_df['alpha'].tolist(), context=self.context)
 
                 rsa, x_0, y_0, z_0, rsa_status = discrete_RSA_obj.run_rsa_clustered(previous_rsa=rsa,
                                                                                     band_array=band_array_new,
@@ -252,9 +286,9 @@ class DataTask3D(HelperFunctions):
             discrete_RSA_obj = DiscreteRsa3D(grains_df['a'].tolist(),
                                              grains_df['b'].tolist(),
                                              grains_df['c'].tolist(),
-                                             grains_df['alpha'].tolist())
+                                             grains_df['alpha'].tolist(), context=self.context)
 
-            if RveInfo.number_of_bands > 0:
+            if self.context.number_of_bands > 0:
                 rsa, x_0_list, y_0_list, z_0_list, rsa_status = discrete_RSA_obj.run_rsa(band_ratio_rsa=1,
                                                                                          banded_rsa_array=rsa,
                                                                                          x0_alt=x_0_list,
@@ -264,13 +298,24 @@ class DataTask3D(HelperFunctions):
             else:
                 rsa, x_0_list, y_0_list, z_0_list, rsa_status = discrete_RSA_obj.run_rsa()
         else:
-            print('RSA Failed!')
-            sys.exit()
+            notify('RSA Failed!')
+            raise RuntimeError('RSA Failed!')
+        return {'rsa': rsa, 'rve_status': rsa_status, 'grains_df': grains_df, 'bands_df': bands_df,
+                'inclusions_df': inclusions_df, 'x_0_list': x_0_list, 'y_0_list': y_0_list, 'z_0_list': z_0_list}
+
+    def tesselation_stage(self, state: dict) -> dict:
+        """
+        tesselation of the rsa, bands are marked with -200
+        """
+        rsa, rsa_status = state['rsa'], state['rve_status']
+        grains_df, bands_df = state['grains_df'], state['bands_df']
+        x_0_list, y_0_list, z_0_list = state['x_0_list'], state['y_0_list'], state['z_0_list']
         """
         TESSELATOR HERE
         """
+        seed_stage('tesselation')
         if rsa_status:
-            if RveInfo.number_of_bands > 0:
+            if self.context.number_of_bands > 0:
                 rsa = super().rearange_grain_ids_bands(bands_df=bands_df,
                                                        grains_df=grains_df,
                                                        rsa=rsa)
@@ -283,7 +328,7 @@ class DataTask3D(HelperFunctions):
                 whole_df['x_0'] = x_0_list
                 whole_df['y_0'] = y_0_list
                 whole_df['z_0'] = z_0_list
-                discrete_tesselation_obj = Tesselation3D(whole_df)
+                discrete_tesselation_obj = Tesselation3D(whole_df, context=self.context)
                 rve, rve_status = discrete_tesselation_obj.run_tesselation(rsa, band_idx_start=grains_df.__len__())
             else:
                 whole_df = grains_df.copy()
@@ -292,168 +337,196 @@ class DataTask3D(HelperFunctions):
                 whole_df['x_0'] = x_0_list
                 whole_df['y_0'] = y_0_list
                 whole_df['z_0'] = z_0_list
-                discrete_tesselation_obj = Tesselation3D(whole_df)
-                if RveInfo.low_rsa_resolution:
+                discrete_tesselation_obj = Tesselation3D(whole_df, context=self.context)
+                if self.context.low_rsa_resolution:
                     rsa = super().upsampling_rsa(rsa)
                 rve, rve_status = discrete_tesselation_obj.run_tesselation(rsa)
 
+            # RVE_Numpy.npy written by the tesselation, kept for runs resumed after this stage
+            tesselation_rve = copy_array(rve, name='tesselation_rve')
             # Change the band_ids to -200
             for i in range(len(grains_df), len(whole_df)+1):
-                rve[np.where(rve == i + 1)] = -200
+                replace(rve, i + 1, -200)
 
         else:
             RveInfo.LOGGER.info("The RSA did not succeed...")
-            sys.exit()
+            raise RuntimeError('The RSA did not succeed')
+
+        return {'rve': rve, 'rve_status': rve_status, 'grains_df': grains_df, 'inclusions_df': state['inclusions_df'],
+                'tesselation_rve': tesselation_rve}
 
+    def inclusions_stage(self, state: dict) -> dict:
+        """
+        places the inclusions in the tesselated rve
+        """
+        rve, rve_status = state['rve'], state['rve_status']
+        inclusions_df = state['inclusions_df']
         """
         PLACE THE INCLUSIONS!
         """
-        if rve_status and RveInfo.phase_ratio[RveInfo.PHASENUM['Inclusions']] != 0:
+        seed_stage('inclusions')
+        if rve_status and self.context.phase_ratio[self.context.PHASENUM['Inclusions']] != 0:
             discrete_RSA_inc_obj = DiscreteRsa3D(inclusions_df['a'].tolist(),
                                                  inclusions_df['b'].tolist(),
                                                  inclusions_df['c'].tolist(),
-                                                 inclusions_df['alpha'].tolist())
+                                                 inclusions_df['alpha'].tolist(), context=self.context)
 
             rve, rve_status = discrete_RSA_inc_obj.run_rsa_inclusions(rve)
         elif not rve_status:
-            print('Tesselator Failed!')
+            notify('Tesselator Failed!')
 
+        return {'rve': rve, 'rve_status': rve_status, 'grains_df': state['grains_df'], 'inclusions_df': inclusions_df,
+                'tesselation_rve': state['tesselation_rve']}
+
+    def periodicity_stage(self, state: dict) -> dict:
         """
-        GENERATE INPUT DATA FOR SIMULATIONS HERE
+        periodic rve with the final grain ids and the phaseID of every grain id (phases, index = GrainID)
         """
-        if rve_status:
-            # TODO: Hier gibt es einen relativ großen Mesh/Grid-Preprocessing Block --> Auslagern
-            periodic_rve_df, periodic_rve = super().repair_periodicity_3D_new(rve)
-            print('line 308:', periodic_rve.shape)
-            periodic_rve_df['phaseID'] = 0
-            print('len rve edge:', np.cbrt(len(periodic_rve_df)))
-            # An den NaN-Werten in dem DF liegt es nicht!
-
-            grains_df.sort_values(by=['GrainID'])
-            # debug_df = grains_df.copy()
+        rve, rve_status = state['rve'], state['rve_status']
+        grains_df, inclusions_df = state['grains_df'], state['inclusions_df']
+        if not rve_status:
+            return {'rve': rve, 'rve_status': rve_status, 'grains_df': grains_df, 'periodic_rve': None,
+                    'phases': None, 'tesselation_rve': state['tesselation_rve']}
+
+        # TODO: Hier gibt es einen relativ großen Mesh/Grid-Preprocessing Block --> Auslagern
+        # the voxel table of the meshers is generated from periodic_rve and phases in the export
+        periodic_rve = super().repair_periodicity_3D_new(rve)
+        RveInfo.LOGGER.debug('periodic rve: {}, {} points'.format(periodic_rve.shape, periodic_rve.size))
+        n_inclusions = 0 if inclusions_df is None else len(inclusions_df)
+        # room for the ids of the inclusions and the band (+3, see below)
+        phases = np.zeros(int(periodic_rve.max()) + n_inclusions + 4, dtype=np.int8)
+        # An den NaN-Werten in dem DF liegt es nicht!
+
+        grains_df.sort_values(by=['GrainID'])
+        # debug_df = grains_df.copy()
+        max_grain_id = int(periodic_rve.max())
+        for i in range(max_grain_id):
+            # Set grain-ID to number of the grain
+            # Denn Grain-ID ist entweder >0 oder -200 oder >-200
+            phases[i + 1] = grains_df.loc[i, 'phaseID']
+
+        if self.context.phase_ratio[self.context.PHASENUM['Inclusions']] > 0:
+            # Set the points where < -200 to phase 6 and to grain ID i + j + 3
+            for j in range(inclusions_df.__len__()):
+                replace(periodic_rve, -(200 + j + 1), max_grain_id + j + 1)
+                phases[max_grain_id + j + 1] = 6
             max_grain_id = int(periodic_rve.max())
-            for i in range(max_grain_id):
-                # Set grain-ID to number of the grain
-                # Denn Grain-ID ist entweder >0 oder -200 oder >-200
-                periodic_rve_df.loc[periodic_rve_df['GrainID'] == i+1, 'phaseID'] = grains_df.loc[i, 'phaseID']
-
-            if RveInfo.phase_ratio[RveInfo.PHASENUM['Inclusions']] > 0:
-                # Set the points where < -200 to phase 6 and to grain ID i + j + 3
-                for j in range(inclusions_df.__len__()):
-                    periodic_rve_df.loc[periodic_rve_df['GrainID'] == -(200 + j + 1), 'GrainID'] = max_grain_id + j + 1
-                    periodic_rve_df.loc[periodic_rve_df['GrainID'] == (max_grain_id + j + 1), 'phaseID'] = 6
-                    periodic_rve[np.where(periodic_rve == -(200 + j + 1))] = max_grain_id + j + 1
-                max_grain_id = periodic_rve.max()
-                grains_df = pd.concat([grains_df, inclusions_df])
-                grains_df.reset_index(inplace=True, drop=True)
-                grains_df.loc[grains_df['phaseID'] == 6, 'GrainID'] = grains_df.loc[grains_df['phaseID'] == 6].index + 1
-
-            if RveInfo.number_of_bands > 0 and RveInfo.phase_ratio[RveInfo.PHASENUM['Inclusions']] > 0:
-                # Set the points where == -200 to phase 2 and to grain ID i + j + 3
-                periodic_rve_df.loc[periodic_rve_df['GrainID'] == -200, 'GrainID'] = max_grain_id + 1
-                periodic_rve_df.loc[periodic_rve_df['GrainID'] == (max_grain_id + 3), 'phaseID'] = 2
-                periodic_rve[np.where(periodic_rve == -200)] = max_grain_id + 1
-            else:
-                # Set the points where == -200 to phase 2 and to grain ID i + 2
-                periodic_rve_df.loc[periodic_rve_df['GrainID'] == -200, 'GrainID'] = max_grain_id + 1
-                periodic_rve_df.loc[periodic_rve_df['GrainID'] == (i + 2), 'phaseID'] = 2
-                periodic_rve[np.where(periodic_rve == -200)] = max_grain_id + 1
-
-            # Start the Mesher
-            # grains_df.to_csv('grains_df.csv', index=False)
-            # periodic_rve_df.to_csv('periodic_rve_df.csv', index=False)
-            rve_shape = periodic_rve.shape
-            # Write out Volumes
-            grains_df = super().get_final_disc_vol_3D(grains_df, periodic_rve)
-            print('grain_df keys:')
-            grains_df.to_csv(RveInfo.store_path + '/Generation_Data/grain_data_output.csv', index=False)
-            print('########################')
-            print('Meshing starts')
-            if RveInfo.damask_flag:
-                # Startpoint: Rearrange the negative ID's
-                last_grain_id = periodic_rve.max()  # BEWARE: For the .vti file, the grid must start at ZERO
-                print('The last grain ID is:', last_grain_id)
-                print('The number of bands is:', RveInfo.number_of_bands)
-
-                if RveInfo.number_of_bands >= 1:
-                    print('Nur Bänder')
-                    phase_list = grains_df['phaseID'].tolist()
-                    #periodic_rve[np.where(periodic_rve == -200)] = last_grain_id + 1
-                    phase_list.append(2)
-
-                elif RveInfo.phase_ratio[RveInfo.PHASENUM['Inclusions']] > 0:
-                    print('Nur Inclusions')
-                    phase_list = grains_df['phaseID'].tolist()
-                    """for i in range(len(inclusions_df)):
-                        #periodic_rve[np.where(periodic_rve == -(200 + i + 1))] = last_grain_id + i + 1
-                        phase_list.append(5)"""
-                    print(phase_list.__len__())
-
-                else:
-                    print('Keine Bänder, nur grains')
-                    phase_list = grains_df['phaseID'].tolist()
-                print(grains_df['phi1'])
-                spectral.write_material(store_path=RveInfo.store_path, grains=phase_list, angles=grains_df[['phi1', 'PHI', 'phi2']])
-                spectral.write_load(RveInfo.store_path)
-                spectral.write_grid(store_path=RveInfo.store_path,
-                                    rve=rve,
-                                    spacing=RveInfo.box_size / 1000)
-
-            if RveInfo.moose_flag:
-                print('~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~')
-                print(np.unique(grains_df['phaseID'].values))
-                print(np.unique(periodic_rve_df['phaseID'].values))
-                print('~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~')
-
-                MooseMesher(rve_shape=rve_shape, rve=periodic_rve_df, grains_df=grains_df).run()
-                # store phases and texture in seperate txt files to make it work within moose
-                grains_df[['phi1', 'PHI', 'phi2']].to_csv(path_or_buf=RveInfo.store_path+'/EulerAngles.txt',
-                                                          header=False, index=False)
-                phases = periodic_rve_df.groupby(['GrainID']).mean()['phaseID']
-                phases.to_csv(path_or_buf=RveInfo.store_path+'/phases.txt',  header=False, index=False)
-
-            if RveInfo.abaqus_flag:
-                mesher_obj = None
-                if RveInfo.subs_flag:
-                    print("substructure generation is turned on...")
-                    # returns rve df containing substructures
-                    # print("phase id is ,", grains_df.iloc[0]["phaseID"])
-                    subs_rve = substrucRun().run(rve_df=periodic_rve_df, grains_df=grains_df)
-                    # try:
-                    #     subs_rve = substrucRun().run(rve_df=periodic_rve_df, grains_df=grains_df)
-                    # except Exception as e:
-                    #     print(e)
-                    mesher_obj = SubMesher(rve_shape=rve_shape, rve=subs_rve, subs_df=grains_df)
-
-                elif RveInfo.subs_flag == False:
-                    print('######subsflag false######')
-                    print("substructure generation is turned off...")
-                    print('###INclusion DF###')
-                    print(grains_df.loc[grains_df['GrainID']<-200])
-                    print('######')
-                    mesher_obj = AbaqusMesher(rve_shape=rve_shape, rve=periodic_rve_df, grains_df=grains_df)
-                if mesher_obj:
-                    mesher_obj.run()
+            grains_df = pd.concat([grains_df, inclusions_df])
+            grains_df.reset_index(inplace=True, drop=True)
+            grains_df.loc[grains_df['phaseID'] == 6, 'GrainID'] = grains_df.loc[grains_df['phaseID'] == 6].index + 1
+
+        if self.context.number_of_bands > 0 and self.context.phase_ratio[self.context.PHASENUM['Inclusions']] > 0:
+            # Set the points where == -200 to phase 2 and to grain ID i + j + 3
+            replace(periodic_rve, -200, max_grain_id + 1)
+            phases[max_grain_id + 3] = 2
         else:
-            print('Tessellation did not succeed')
+            # Set the points where == -200 to phase 2 and to grain ID i + 2
+            replace(periodic_rve, -200, max_grain_id + 1)
+            phases[i + 2] = 2
+
+        # Start the Mesher
+        # grains_df.to_csv('grains_df.csv', index=False)
+        # Write out Volumes
+        grains_df = super().get_final_disc_vol_3D(grains_df, periodic_rve)
+        return {'rve': rve, 'rve_status': rve_status, 'grains_df': grains_df, 'periodic_rve': periodic_rve,
+                'phases': phases, 'tesselation_rve': state['tesselation_rve']}
+
+    def export_stage(self, state: dict):
+        """
+        GENERATE INPUT DATA FOR SIMULATIONS HERE
+        """
+        import dragen.generation.spectral as spectral
+        from dragen.generation.mesh_subs import SubMesher
+        from dragen.generation.Mesher3D import AbaqusMesher
+        from dragen.generation.mooseMesher import MooseMesher
+
+        seed_stage('export')
+        if not state['rve_status']:
+            notify('Tessellation did not succeed')
+            return None
+        rve, grains_df = state['rve'], state['grains_df']
+        periodic_rve = state['periodic_rve']
+        rve_shape = periodic_rve.shape
+        grains_df.to_csv(self.context.store_path + '/Generation_Data/grain_data_output.csv', index=False)
+        notify('Meshing starts')
+        if self.context.damask_flag:
+            # Startpoint: Rearrange the negative ID's
+            last_grain_id = periodic_rve.max()  # BEWARE: For the .vti file, the grid must start at ZERO
+            RveInfo.LOGGER.debug('The last grain ID is: {}, the number of bands is: {}'.format(
+                last_grain_id, self.context.number_of_bands))
+
+            if self.context.number_of_bands >= 1:
+                phase_list = grains_df['phaseID'].tolist()
+                #periodic_rve[np.where(periodic_rve == -200)] = last_grain_id + 1
+                phase_list.append(2)
+
+            elif self.context.phase_ratio[self.context.PHASENUM['Inclusions']] > 0:
+                phase_list = grains_df['phaseID'].tolist()
+                """for i in range(len(inclusions_df)):
+                    #periodic_rve[np.where(periodic_rve == -(200 + i + 1))] = last_grain_id + i + 1
+                    phase_list.append(5)"""
+
+            else:
+                phase_list = grains_df['phaseID'].tolist()
+            spectral.write_material(store_path=self.context.store_path, grains=phase_list, angles=grains_df[['phi1', 'PHI', 'phi2']])
+            spectral.write_load(self.context.store_path)
+            spectral.write_grid(store_path=self.context.store_path,
+                                rve=rve,
+                                spacing=self.context.box_size / 1000)
+
+        if self.context.moose_flag or self.context.abaqus_flag:
+            # only the meshers need one row per voxel
+            periodic_rve_df = super().voxel_table(periodic_rve, state['phases'])
+
+        if self.context.moose_flag:
+            MooseMesher(rve_shape=rve_shape, rve=periodic_rve_df, grains_df=grains_df, context=self.context).run()
+            # store phases and texture in seperate txt files to make it work within moose
+            grains_df[['phi1', 'PHI', 'phi2']].to_csv(path_or_buf=self.context.store_path+'/EulerAngles.txt',
+                                                      header=False, index=False)
+            phases = periodic_rve_df.groupby(['GrainID']).mean()['phaseID']
+            phases.to_csv(path_or_buf=self.context.store_path+'/phases.txt',  header=False, index=False)
+
+        if self.context.abaqus_flag:
+            mesher_obj = None
+            if self.context.subs_flag:
+                notify("substructure generation is turned on...")
+                # returns rve df containing substructures
+                # print("phase id is ,", grains_df.iloc[0]["phaseID"])
+                subs_rve = substrucRun().run(rve_df=periodic_rve_df, grains_df=grains_df)
+                # try:
+                #     subs_rve = substrucRun().run(rve_df=periodic_rve_df, grains_df=grains_df)
+                # except Exception as e:
+                #     print(e)
+                mesher_obj = SubMesher(rve_shape=rve_shape, rve=subs_rve, subs_df=grains_df, context=self.context)
+
+            elif self.context.subs_flag == False:
+                mesher_obj = AbaqusMesher(rve_shape=rve_shape, rve=periodic_rve_df, grains_df=grains_df,
+                                          context=self.context)
+            if mesher_obj:
+                mesher_obj.run()
         return periodic_rve
 
+    @in_context
     def post_processing(self, rve, total_df, ex_df):
-        if RveInfo.gui_flag:
-            RveInfo.infobox_obj.emit('post processing started RVE is already fully meshed and can be found here:\n'
-                                     f'{RveInfo.store_path}')
-        else:
-            print('post processing started RVE is already fully meshed and can be found here:')
-            print(RveInfo.store_path)
+        import matplotlib.pyplot as plt
+        import seaborn as sns
+        from PIL import Image, ImageOps
+        from dragen.postprocessing.voldistribution import PostProcVol
+        from dragen.postprocessing.Shape_analysis import shape
+        from dragen.postprocessing.texture_analysis import Texture
+
+        seed_stage('postprocessing')
+        notify('post processing started RVE is already fully meshed and can be found here:\n'
+               f'{self.context.store_path}')
 
         phase_ratios = list()
         ref_r_in = dict()
         ref_r_out = dict()
         grain_shapes_in = shape().get_input_ellipses()
-        for phase in RveInfo.phases:
+        for phase in self.context.phases:
             
-            phase_id = RveInfo.PHASENUM[phase]
-            if RveInfo.phase_ratio[phase_id] == 0:
+            phase_id = self.context.PHASENUM[phase]
+            if self.context.phase_ratio[phase_id] == 0:
                 continue
             slice_ID = 0
             if phase_id < 6:
@@ -485,9 +558,8 @@ class DataTask3D(HelperFunctions):
                     factor_1 = int(1024 / img_size[1])
                     img = img.resize((img_size[0] * factor_0, img_size[1] * factor_1), resample=Image.BOX)
 
-                    path = str(f'{RveInfo.fig_path}/test_{time.time()}.jpg')
+                    path = str(f'{self.context.fig_path}/test_{time.time()}.jpg')
                     img.save(path)
-                    print('phase_id, i, slice_ID', phase_id, i, slice_ID)
                     grain_shapes_slice = shape().get_ellipses(rve, slice_ID, phase_id)
                     slice_ID += 4
                     if grain_shapes_slice is not None:
@@ -513,14 +585,14 @@ class DataTask3D(HelperFunctions):
 
                 plot_kws = {"s": 2}
 
-                sns.set_palette(sns.color_palette(RveInfo.rwth_colors))
+                sns.set_palette(sns.color_palette(self.context.rwth_colors))
                 sns.set_context(rc={"font.size": 16, "axes.labelsize":20})
                 g = sns.pairplot(data=grain_shapes, hue='inout', plot_kws=plot_kws)
-                grain_shapes.to_csv('{}/Postprocessing/shape_control_{}.csv'.format(RveInfo.store_path, phase))
+                grain_shapes.to_csv('{}/Postprocessing/shape_control_{}.csv'.format(self.context.store_path, phase))
                 g.fig.subplots_adjust(top=.9)
                 g.fig.suptitle(phase)
 
-                plt.savefig('{}/Postprocessing/shape_control_{}.png'.format(RveInfo.store_path, phase))
+                plt.savefig('{}/Postprocessing/shape_control_{}.png'.format(self.context.store_path, phase))
                 plt.close()
 
                 current_phase_ref_r_in, current_phase_ratio_out, current_phase_ref_r_out = \
@@ -532,50 +604,57 @@ class DataTask3D(HelperFunctions):
                 # Texture Analysis
                 total_df_this_phase = total_df.loc[total_df['phaseID'] == phase_id]
                 ex_df_this_phase = ex_df.loc[ex_df['phaseID'] == phase_id]
-                if RveInfo.texture_flag:
+                if self.context.texture_flag:
                     if not ex_df_this_phase['phi1'].isnull().values.any() and len(total_df_this_phase) > 0:
                         tex_dict = Texture().read_orientation(rve_np=rve, rve_df=total_df_this_phase, experimentalData=ex_df_this_phase)
                         for key in tex_dict.keys():
                             sym_tex = Texture().symmetry_operations(tex_df=tex_dict[key], family='cubic')
                             names = [f"{key}_texture_section_plot_{phase}.png"]
                             for name in names:
-                                Texture().calc_odf(sym_tex, phi2_list=[0, 45, 90], store_path=f'{RveInfo.store_path}/Postprocessing', figname=name)
+                                Texture().calc_odf(sym_tex, phi2_list=[0, 45, 90], store_path=f'{self.context.store_path}/Postprocessing', figname=name)
             if phase_id == 6 or phase_id == 7:
                 current_phase_ref_r_in, current_phase_ratio_out, current_phase_ref_r_out = \
                     PostProcVol().gen_in_out_lists(phaseID=phase_id)
                 phase_ratios.append(current_phase_ratio_out)
 
-        if len(RveInfo.phases) > 1:
+        if len(self.context.phases) > 1:
             input_ratio = list()
             labels = list()
-            for i, phase in enumerate(RveInfo.phases):
-                if RveInfo.phase_ratio[i+1] == 0:
+            for i, phase in enumerate(self.context.phases):
+                if self.context.phase_ratio[i+1] == 0:
                     continue
-                ratio = RveInfo.phase_ratio[RveInfo.PHASENUM[phase]]
+                ratio = self.context.phase_ratio[self.context.PHASENUM[phase]]
                 input_ratio.append(ratio)
-                label = RveInfo.phases[i]
+                label = self.context.phases[i]
                 labels.append(label)
             PostProcVol().gen_pie_chart_phases(input_ratio, labels, 'input')
             PostProcVol().gen_pie_chart_phases(phase_ratios, labels, 'output')
 
-        for phase in RveInfo.phases:
-            if RveInfo.PHASENUM[phase] > 5: # postprocessing for inclusions and bands not yet supported
+        for phase in self.context.phases:
+            if self.context.PHASENUM[phase] > 5: # postprocessing for inclusions and bands not yet supported
                 continue
-            file_idx = RveInfo.PHASENUM[phase]
-            if RveInfo.phase_ratio[file_idx] == 0:
+            file_idx = self.context.PHASENUM[phase]
+            if self.context.phase_ratio[file_idx] == 0:
                 continue
             PostProcVol().gen_plots(ref_r_in[phase], ref_r_out[phase], phase)
-            if RveInfo.gui_flag:
-                RveInfo.infobox_obj.emit('checkout the evaluation report of the rve stored at:\n'
-                                         '{}/Postprocessing'.format(RveInfo.store_path))
+            notify('checkout the evaluation report of the rve stored at:\n'
+                   '{}/Postprocessing'.format(self.context.store_path))
 
-        if RveInfo.subs_flag:
+        if self.context.subs_flag:
             substrucRun().post_processing(k=3)
         super().write_setup_file()
         RveInfo.LOGGER.info("RVE generation process has successfully completed...")
 
+    @in_context
     def calibration_rve(self):
-        RveInfo.smoothing_flag = False
+        import damask
+        import dragen.generation.spectral as spectral
+        from dragen.generation.Mesher3D import AbaqusMesher
+        from dragen.generation.mooseMesher import MooseMesher
+
+        seed_stage('calibration')
+        # the meshers read their parameters from the context
+        mesher_context = self.context.replace(smoothing_flag=False)
         n_elements = 1000
         grain_ids = set(np.linspace(0, n_elements-1, n_elements, dtype=int))
         grain_id_list = [id+1 for id in grain_ids]
@@ -584,61 +663,51 @@ class DataTask3D(HelperFunctions):
 
         #np.random.shuffle(grain_ids)
         #rve = np.asarray(grain_ids)
-        for id, ratio in RveInfo.phase_ratio.items():
+        for id, ratio in self.context.phase_ratio.items():
             n_grains_this_Phase = int(n_elements*ratio)
-            grains_this_phase = random.sample(grain_ids, n_grains_this_Phase)
+            grains_this_phase = random.sample(sorted(grain_ids), n_grains_this_Phase)
             phases[grains_this_phase] = id
             grain_ids = grain_ids - set(grains_this_phase)
 
         phase_list = phases.copy()
         phases = phases.reshape((10, 10, 10))
 
-        o = damask.Rotation.from_random(1000).as_Euler_angles(degrees=True)
-        print(o)
+        o = damask.Rotation.from_random(1000, rng_seed=random_seed()).as_Euler_angles(degrees=True)
         grains_df = pd.DataFrame(data=o, columns=['phi1', 'PHI', 'phi2'])
         grains_df['GrainID'] = grain_id_list
         grains_df['phaseID'] = phase_list
-        print(grains_df)
-        rve_x = np.linspace(0, RveInfo.box_size, grains.shape[0], endpoint=True)
-        rve_y = np.linspace(0, RveInfo.box_size, grains.shape[1], endpoint=True)
-        rve_z = np.linspace(0, RveInfo.box_size, grains.shape[2], endpoint=True)
+        rve_x = np.linspace(0, self.context.box_size, grains.shape[0], endpoint=True)
+        rve_y = np.linspace(0, self.context.box_size, grains.shape[1], endpoint=True)
+        rve_z = np.linspace(0, self.context.box_size, grains.shape[2], endpoint=True)
 
         xx, yy, zz = np.meshgrid(rve_x, rve_y, rve_z, indexing='ij')
         rve_dict = {'x': xx.flatten(), 'y': yy.flatten(), 'z': zz.flatten(), 'GrainID': grain_id_list, 'phaseID': phase_list }
         rve_df = pd.DataFrame(rve_dict)
-        rve_df['box_size'] = RveInfo.box_size
-        rve_df['n_pts'] = RveInfo.n_pts
-        if RveInfo.damask_flag:
+        rve_df['box_size'] = self.context.box_size
+        rve_df['n_pts'] = self.context.n_pts
+        if self.context.damask_flag:
             # Startpoint: Rearrange the negative ID's
             last_grain_id = max(grain_id_list)  # BEWARE: For the .vti file, the grid must start at ZERO
             phase_list = phases.flatten().tolist()
-            print(phase_list)
 
-            spectral.write_material(store_path=RveInfo.store_path, grains=phase_list,
+            spectral.write_material(store_path=self.context.store_path, grains=phase_list,
                                     angles=grains_df[['phi1', 'PHI', 'phi2']])
-            spectral.write_load(RveInfo.store_path)
-            spectral.write_grid(store_path=RveInfo.store_path,
+            spectral.write_load(self.context.store_path)
+            spectral.write_grid(store_path=self.context.store_path,
                                 rve=grains,
-                                spacing=RveInfo.box_size / 1000)
-
-        if RveInfo.moose_flag:
-            print('~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~')
-            print(np.unique(grains_df['phaseID'].values))
-            print(np.unique(rve_df['phaseID'].values))
-            print('~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~')
+                                spacing=self.context.box_size / 1000)
 
-            MooseMesher(rve_shape=grains.shape(), rve=rve_df, grains_df=grains_df).run()
+        if self.context.moose_flag:
+            MooseMesher(rve_shape=grains.shape(), rve=rve_df, grains_df=grains_df, context=mesher_context).run()
             # store phases and texture in seperate txt files to make it work within moose
-            grains_df[['phi1', 'PHI', 'phi2']].to_csv(path_or_buf=RveInfo.store_path + '/EulerAngles.txt',
+            grains_df[['phi1', 'PHI', 'phi2']].to_csv(path_or_buf=self.context.store_path + '/EulerAngles.txt',
                                                       header=False, index=False)
             phases = rve_df.groupby(['GrainID']).mean()['phaseID']
-            phases.to_csv(path_or_buf=RveInfo.store_path + '/phases.txt', header=False, index=False)
+            phases.to_csv(path_or_buf=self.context.store_path + '/phases.txt', header=False, index=False)
 
-        if RveInfo.abaqus_flag:
-            print(rve_df)
-            print(grains_df)
+        if self.context.abaqus_flag:
             rve_shape = phases.shape
-            mesher_obj = AbaqusMesher(rve_shape=rve_shape, rve=rve_df, grains_df=grains_df)
+            mesher_obj = AbaqusMesher(rve_shape=rve_shape, rve=rve_df, grains_df=grains_df, context=mesher_context)
             if mesher_obj:
                 mesher_obj.run()
 
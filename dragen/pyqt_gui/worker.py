@@ -1,5 +1,6 @@
 from PyQt5.QtCore import QObject, pyqtSignal
 from dragen.run import Run
+from dragen.utilities.progress import SignalListener
 
 
 class Worker(QObject):
@@ -88,6 +89,7 @@ class Worker(QObject):
                       p_sigma=self.p_sigma, t_mu=self.t_mu, b_sigma=self.b_sigma,
                       decreasing_factor=self.decreasing_facotr, lower=self.lower, upper=self.upper,
                       circularity=self.circularity, plt_name=self.plt_name, save=self.save, plot=self.plot,
-                      filename=self.filename, orientation_relationship=self.orientation_relationship)
+                      filename=self.filename, orientation_relationship=self.orientation_relationship,
+                      listeners=[SignalListener(progress=self.progress, info_box=self.info_box)])
         run_obj.run()
         self.finished.emit()
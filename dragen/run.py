@@ -1,19 +1,29 @@
 import datetime
 import os
 import sys
+import time
+import random
 import logging
 from logging.handlers import TimedRotatingFileHandler
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import math
-import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import matplotlib
 
 
 from dragen.main2D import DataTask2D
 from dragen.main3D import DataTask3D
 from dragen.substructure.run import Run as SubRun
 from dragen.utilities.Helpers import HelperFunctions
-from dragen.utilities.InputInfo import RveInfo
+from dragen.utilities.InputInfo import RveInfo, GenerationContext
+from dragen.utilities.seeding import rve_seeds
+from dragen.utilities.instrumentation import start_timings, write_timings
+from dragen.utilities.outofcore import release_arrays
+from dragen.utilities.progress import (Progress, ConsoleListener, LogListener, SignalListener, notify, subscribe,
+                                       unsubscribe, clear_listeners)
 
-plt.ioff()  # needs to be here for background plotting with gui
+matplotlib.interactive(False)  # needs to be here for background plotting with gui (plt.ioff without importing pyplot)
 
 
 class Run(HelperFunctions):
@@ -79,7 +89,25 @@ class Run(HelperFunctions):
             save: bool,
             plot: bool,
             filename: str,
-            orientation_relationship: str
+            orientation_relationship: str,
+
+            # parallelization (substructure generation and batches of rves)
+            num_cores: int = 1,
+
+            # seed of the whole generation, None for random results
+            seed: int = None,
+
+            # checkpoints of the stages of the 3D generation
+            checkpoint_flag: bool = False,
+            resume: bool = False,
+            from_stage: str = None,
+
+            # memory mapped rve arrays for very large rves (3D only)
+            memmap_flag: bool = False,
+
+            # callables receiving the progress events (dragen.utilities.progress), default: the GUI signals
+            # (info_box_obj, progress_obj) or the console
+            listeners: list = None
     ):
 
         super().__init__()
@@ -116,6 +144,12 @@ class Run(HelperFunctions):
         RveInfo.gui_flag = gui_flag
         RveInfo.infobox_obj = info_box_obj
         RveInfo.progress_obj = progress_obj
+        if listeners is None:
+            if info_box_obj is not None or progress_obj is not None:
+                listeners = [SignalListener(progress=progress_obj, info_box=info_box_obj)]
+            else:
+                listeners = [ConsoleListener()]
+        self.listeners = listeners
         RveInfo.equiv_d = equiv_d
         RveInfo.p_sigma = p_sigma
         RveInfo.t_mu = t_mu
@@ -129,6 +163,12 @@ class Run(HelperFunctions):
         RveInfo.plot = plot
         RveInfo.filename = filename
         RveInfo.orientation_relationship = orientation_relationship
+        RveInfo.num_cores = num_cores
+        RveInfo.seed = seed
+        RveInfo.checkpoint_flag = checkpoint_flag
+        RveInfo.resume = resume
+        RveInfo.from_stage = from_stage
+        RveInfo.memmap_flag = memmap_flag
         RveInfo.subs_flag = subs_flag
         RveInfo.subs_file_flag = subs_file_flag
         RveInfo.subs_file = subs_file
@@ -201,47 +241,37 @@ class Run(HelperFunctions):
         if not os.path.isdir(RveInfo.post_path):
             os.makedirs(RveInfo.post_path)
 
+        # the result log of the previous rve (same process, e.g. a batch worker) must not get the results of this one
+        for handler in list(RveInfo.RESULT_LOG.handlers):
+            if handler.get_name() == 'result-logs':
+                RveInfo.RESULT_LOG.removeHandler(handler)
+                handler.close()
         f_handler = logging.handlers.TimedRotatingFileHandler(
             filename=os.path.join(RveInfo.store_path, 'result-logs'), when='midnight')
+        f_handler.set_name('result-logs')
         formatter = logging.Formatter('[%(asctime)s] [%(levelname)s] %(message)s')
         f_handler.setFormatter(formatter)
         RveInfo.RESULT_LOG.addHandler(f_handler)
         RveInfo.RESULT_LOG.setLevel(level=logging.DEBUG)
 
     def run(self):
+        for listener in self.listeners:
+            subscribe(listener)
+        try:
+            return self.generate()
+        finally:
+            for listener in self.listeners:
+                unsubscribe(listener)
+
+    def generate(self):
         self.setup_logging()
-        if RveInfo.infobox_obj is not None:
-            RveInfo.infobox_obj.emit("the chosen resolution lead to {}^{} "
-                                     "points in the grid".format(str(RveInfo.n_pts), str(RveInfo.dimension)))
+        notify("the chosen resolution lead to {}^{} points in the grid".format(str(RveInfo.n_pts),
+                                                                             str(RveInfo.dimension)))
 
         if RveInfo.subs_flag:
             RveInfo.sub_run = SubRun()
 
-        if RveInfo.dimension == 2:
-
-            obj2D = DataTask2D()
-
-            for i in range(RveInfo.number_of_rves):
-                self.initializations(i)
-                total_df = obj2D.grain_sampling()
-                rve = obj2D.rve_generation(total_df)
-                obj2D.post_processing(rve)
-
-        elif RveInfo.dimension == 3:
-            # Kann Gan und nicht GAN
-            obj3D = DataTask3D()
-            for i in range(RveInfo.number_of_rves):
-                self.initializations(i)
-                if RveInfo.calibration_rve_flag:
-                    print('I will generate only a calibration RVE')
-                    rve = obj3D.calibration_rve()
-                else:
-                    total_df, ex_df = obj3D.grain_sampling()
-                    rve = obj3D.rve_generation(total_df)
-                    obj3D.post_processing(rve, total_df, ex_df)
-
-
-        else:
+        if RveInfo.dimension not in (2, 3):
             LOGS_DIR = 'Logs/'
             logger = logging.getLogger("RVE-Gen")
             if not os.path.isdir(LOGS_DIR):
@@ -255,5 +285,133 @@ class Run(HelperFunctions):
             logger.info('dimension must be 2 or 3')
             sys.exit()
 
-
-
+        if RveInfo.num_cores is not None and RveInfo.num_cores > 1 and RveInfo.number_of_rves > 1:
+            return self.run_batch()
+
+        seeds = [None] * RveInfo.number_of_rves
+        if RveInfo.seed is not None:
+            seeds = rve_seeds(RveInfo.seed, RveInfo.number_of_rves)
+        for i in range(RveInfo.number_of_rves):
+            self.initializations(i)
+            # every rve gets its own immutable snapshot of the parameters
+            generate_rve(GenerationContext.from_rveinfo(rve_seed=seeds[i]))
+
+    def run_batch(self) -> list:
+        """
+        generates the rves in a process pool of RveInfo.num_cores workers. Every rve has its own output directory
+        (see initializations) and its own seed (derived from RveInfo.seed or drawn from np.random), so the result of
+        one rve does not depend on the worker it ran in and is the same as in a serial run. Every worker writes its
+        own log file in root/Logs. A failing rve does not stop the batch, the status of all rves is logged and
+        written to root/OutputData/<date>_batch_report.csv
+        :return: list of dicts with rve, store_path, status, error and time of every rve
+        """
+        n_rves = RveInfo.number_of_rves
+        n_workers = min(RveInfo.num_cores, n_rves)
+        seeds = rve_seeds(RveInfo.seed, n_rves)
+        # the rves run in parallel, so the substructure of every rve is generated in its worker only
+        context = GenerationContext.from_rveinfo(gui_flag=False, num_cores=1)
+        log_dir = RveInfo.root + '/Logs/'
+
+        RveInfo.LOGGER.info('generating {} rves with {} processes'.format(n_rves, n_workers))
+        progress = Progress('batch', total=n_rves).start()
+        results = [None] * n_rves
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=init_batch_worker,
+                                 initargs=(context, log_dir)) as executor:
+            futures = {executor.submit(generate_batch_rve, i, seeds[i]): i for i in range(n_rves)}
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    results[i] = future.result()
+                except (Exception, SystemExit) as e:  # the worker itself died, e.g. BrokenProcessPool
+                    results[i] = {'rve': i, 'store_path': None, 'status': 'failed', 'error': repr(e), 'time': None}
+                RveInfo.LOGGER.info('rve {}: {}'.format(i, results[i]['status']))
+                done = [r for r in results if r is not None]
+                progress.update(len(done), failed=sum(r['status'] != 'success' for r in done))
+
+        failed = [result for result in results if result['status'] != 'success']
+        progress.finish(rves=n_rves, failed=len(failed))
+        RveInfo.LOGGER.info('{} of {} rves generated successfully'.format(n_rves - len(failed), n_rves))
+        for result in failed:
+            RveInfo.LOGGER.error('rve {} failed: {}'.format(result['rve'], result['error']))
+            notify('rve {} failed: {}'.format(result['rve'], result['error']))
+
+        report_dir = RveInfo.root + '/OutputData/'
+        if not os.path.isdir(report_dir):
+            os.makedirs(report_dir)
+        pd.DataFrame(results).to_csv(report_dir + str(datetime.datetime.now())[:10] + '_batch_report.csv',
+                                     index=False)
+        return results
+
+
+def generate_rve(context: GenerationContext):
+    """
+    sampling, rsa, tesselation, meshing and export of one rve. The timings of the stages are written to
+    store_path/timings.json, also if the generation fails, and the memmap files of the rve (RveInfo.memmap_flag) are
+    removed
+    :param context: parameters of the rve, including its store_path
+    """
+    start_timings()
+    try:
+        if context.dimension == 2:
+            obj2D = DataTask2D(context=context)
+            total_df = obj2D.grain_sampling()
+            rve = obj2D.rve_generation(total_df)
+            obj2D.post_processing(rve)
+
+        elif context.dimension == 3:
+            # Kann Gan und nicht GAN
+            obj3D = DataTask3D(context=context)
+            if context.calibration_rve_flag:
+                notify('I will generate only a calibration RVE')
+                rve = obj3D.calibration_rve()
+            else:
+                total_df, ex_df = obj3D.grain_sampling()
+                rve = obj3D.rve_generation(total_df)
+                obj3D.post_processing(rve, total_df, ex_df)
+    finally:
+        write_timings(context.store_path + '/timings.json')
+        release_arrays(context.store_path)
+
+
+def init_batch_worker(context: GenerationContext, log_dir: str):
+    """
+    sets up a worker process of Run.run_batch: RveInfo from the context of the batch and a log file of its own
+    """
+    context.apply()
+    RveInfo.infobox_obj = None
+    RveInfo.progress_obj = None
+    # the listeners of the parent (console, GUI) are not reachable from here, the events go to the worker log
+    clear_listeners()
+    subscribe(LogListener())
+    if RveInfo.subs_flag:
+        RveInfo.sub_run = SubRun()
+
+    # handlers inherited from the parent would write into the same file from several processes
+    for logger in (RveInfo.LOGGER, RveInfo.RESULT_LOG):
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+    if not os.path.isdir(log_dir):
+        os.makedirs(log_dir)
+    f_handler = logging.FileHandler(filename=os.path.join(log_dir, 'dragen-logs-worker-{}'.format(os.getpid())))
+    f_handler.setFormatter(logging.Formatter('[%(asctime)s] [%(levelname)s] %(message)s'))
+    RveInfo.LOGGER.addHandler(f_handler)
+    RveInfo.LOGGER.setLevel(level=logging.DEBUG)
+
+
+def generate_batch_rve(epoch: int, seed: int) -> dict:
+    """
+    generates rve number epoch in a worker process of Run.run_batch
+    :return: dict with rve, store_path, status, error and time
+    """
+    np.random.seed(seed)
+    random.seed(seed)
+    start = time.time()
+    status, error = 'success', None
+    try:
+        Run.initializations(epoch)
+        generate_rve(GenerationContext.from_rveinfo(rve_seed=seed))
+    except (Exception, SystemExit) as e:  # SystemExit: sys.exit() in the helpers, e.g. unknown element type
+        RveInfo.LOGGER.exception('rve {} failed'.format(epoch))
+        status, error = 'failed', repr(e)
+    return {'rve': epoch, 'store_path': RveInfo.store_path, 'status': status, 'error': error,
+            'time': time.time() - start}
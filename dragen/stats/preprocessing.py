@@ -6,14 +6,23 @@ Version:  V 0.1
 File:     sample
 Describe: Writing for DRAGen"""
 
-from sklearn.neighbors import KernelDensity
-from sklearn.model_selection import KFold, GridSearchCV
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-from scipy.stats import lognorm
 from dragen.utilities.InputInfo import RveInfo
 
+
+def _kde_grid():
+    """
+    grid search over the bandwidth of a gaussian KDE with 10-fold cross-validation, call fit(data) and take the
+    best_estimator_. sklearn is only imported here, it is only needed for InputDataSampler
+    """
+    from sklearn.neighbors import KernelDensity
+    from sklearn.model_selection import KFold, GridSearchCV
+    kFold = KFold(n_splits=10)  # k-folder cross-validation split data into 10 folds
+    bandwidths = 10 ** np.linspace(-1, 1, 100)
+    return GridSearchCV(estimator=KernelDensity(kernel="gaussian"), param_grid={"bandwidth": bandwidths}, cv=kFold)
+
+
 class Sampler:
     '''
     base Sampler class: markov_matrix may be introduced in the future to increase sampling efficiency,
@@ -24,19 +33,39 @@ class Sampler:
         self.markov_matrix = markov_matrix
 
     @classmethod
-    def rejection_sample(cls, intervals: list, pdf, c: float):
+    def rejection_sample(cls, intervals: list, pdf, c: float, size=None):
         """
-        use acceptance-rejection sampling to achieve complex sampling
+        use acceptance-rejection sampling to achieve complex sampling. The candidates are drawn and accepted in
+        batches, pdf has to accept an array of candidates
+        size: number of samples, None returns a single float
         """
         if RveInfo.debug:
             assert len(intervals) == 2  # start and end
             assert c > 0
-        while True:
-            x = np.random.uniform(intervals[0], intervals[1])
-            y = np.random.uniform(0, c)
-            # if accpet x?
-            if y <= pdf(np.array([x]).reshape((-1, 1))):
-                return x
+        n = 1 if size is None else int(size)
+        samples = np.empty(0)
+        while samples.size < n:
+            batch = max(2 * (n - samples.size), 16)
+            x = np.random.uniform(intervals[0], intervals[1], size=batch)
+            y = np.random.uniform(0, c, size=batch)
+            # accept x?
+            samples = np.concatenate((samples, x[y <= pdf(x)]))
+        if size is None:
+            return samples[0]
+        return samples[:n]
+
+    @staticmethod
+    def truncated_lognorm_sample(intervals: list, s: float, scale: float, size=None):
+        """
+        sampling of a lognorm distribution truncated to intervals
+        size: number of samples, None returns a single float
+        """
+        from scipy.stats import truncnorm
+        # log(x) is normally distributed: sample the truncated normal, which stays exact far in the tails
+        with np.errstate(divide='ignore'):
+            bounds = np.log(np.asarray(intervals, dtype=float) / scale) / s
+        x = scale * np.exp(s * truncnorm.rvs(bounds[0], bounds[1], size=size))
+        return np.clip(x, intervals[0], intervals[1])
 
 
 class InputDataSampler(Sampler):
@@ -50,18 +79,14 @@ class InputDataSampler(Sampler):
             assert len(data) > 0
         self.data = data
         self.kde = self._train()
-        self.intervals = [0, 0]  # avoid future warning
+        self.envelopes = dict()  # intervals -> envelope constant c of the rejection sampling
 
     def _train(self):
         """
         fit the real distribution in the data using KDE. Use GridSearch method to find the most optimal
         bandwidth for KDE
         """
-        kFold = KFold(n_splits=10)  # k-folder cross-validation split data into 10 folds
-        bandwidths = 10 ** np.linspace(-1, 1, 100)
-        grid = GridSearchCV(estimator=KernelDensity(kernel="gaussian"),
-                            param_grid={"bandwidth": bandwidths},
-                            cv=kFold)
+        grid = _kde_grid()
         grid.fit(self.data)
         kde = grid.best_estimator_
         return kde
@@ -70,25 +95,25 @@ class InputDataSampler(Sampler):
         """
         probability density function for fitted distribution, return the density of the input x
         """
+        x = np.asarray(x, dtype=float)
         if RveInfo.debug:
-            assert x > 0
-        return np.exp(self.kde.score_samples(np.array([x]).reshape(-1, 1)))
+            assert (x > 0).all()
+        return np.exp(self.kde.score_samples(x.reshape(-1, 1)))
 
-    def sample(self, intervals: list):
+    def sample(self, intervals: list, size=None):
         """
         intervals: sample data from this invertal in the fitted distribution
+        size: number of samples, None returns a single float
         """
-
-        if intervals[0] != self.intervals[0] or intervals[1] != self.intervals[1]:
+        key = (float(intervals[0]), float(intervals[1]))
+        if key not in self.envelopes:
             u = np.linspace(intervals[0], intervals[1], 1000)
-            self.intervals = u
-        else:
-            u = self.intervals
-        log_dens = self.kde.score_samples(u.reshape(-1, 1))
-        c = np.max(np.exp(log_dens)) * 1.1
+            log_dens = self.kde.score_samples(u.reshape(-1, 1))
+            self.envelopes[key] = np.max(np.exp(log_dens)) * 1.1
         x = super().rejection_sample(intervals=intervals,
                                      pdf=self.pdf,
-                                     c=c)
+                                     c=self.envelopes[key],
+                                     size=size)
         return x
 
 
@@ -103,31 +128,22 @@ class UserBlockThicknessSampler(Sampler):
         super(UserBlockThicknessSampler, self).__init__(None)
         self.average_bt = average_bt
         self.sigma = sigma
-        self.intervals = [0, 0]
 
     def pdf(self, x):
         """
         probability density function of produced lognorm distribution
         """
+        from scipy.stats import lognorm
         if RveInfo.debug:
-            assert x > 0
+            assert (np.asarray(x) > 0).all()
         return lognorm.pdf(x, s=self.sigma, scale=self.average_bt)
 
-    def sample(self, intervals: list):
+    def sample(self, intervals: list, size=None):
         """
         intervals: sample data from this invertal in the produced distribution
+        size: number of samples, None returns a single float
         """
-        if intervals[0] != self.intervals[0] or intervals[1] != self.intervals[1]:
-            u = np.linspace(intervals[0], intervals[1], 1000)
-            self.intervals = u
-        else:
-            u = self.intervals
-        dens = lognorm.pdf(u, s=self.sigma, scale=self.average_bt)
-        c = np.max(dens) * 1.1
-        x = super().rejection_sample(intervals=intervals,
-                                     pdf=self.pdf,
-                                     c=c)
-        return x
+        return super().truncated_lognorm_sample(intervals, s=self.sigma, scale=self.average_bt, size=size)
 
 
 class UserPakVolumeSampler(Sampler):
@@ -143,31 +159,22 @@ class UserPakVolumeSampler(Sampler):
         self.circularity = circularity
         self.sigma = sigma
         self.average_volume = 4 / 3 * np.pi * (equiv_d / 2) ** 3 * circularity ** (1.5)
-        self.intervals = [0, 0]
 
     def pdf(self, x):
         """
         probability density function of produced lognorm distribution
         """
+        from scipy.stats import lognorm
         if RveInfo.debug:
-            assert x > 0
+            assert (np.asarray(x) > 0).all()
         return lognorm.pdf(x, s=self.sigma, scale=self.average_volume)
 
-    def sample(self, intervals: list):
+    def sample(self, intervals: list, size=None):
         """
         intervals: sample data from this invertal in the produced distribution
+        size: number of samples, None returns a single float
         """
-        if intervals[0] != self.intervals[0] or intervals[1] != self.intervals[1]:
-            u = np.linspace(intervals[0], intervals[1], 1000)
-            self.intervals = u
-        else:
-            u = self.intervals
-        dens = lognorm.pdf(u, s=self.sigma, scale=self.average_volume)
-        c = np.max(dens) * 1.1
-        x = super().rejection_sample(intervals=intervals,
-                                     pdf=self.pdf,
-                                     c=c)
-        return x
+        return super().truncated_lognorm_sample(intervals, s=self.sigma, scale=self.average_volume, size=size)
 
 
 class SamplerFactory:
@@ -198,14 +205,11 @@ def test_inputsampler():
     """
     test function: test the InputDataSampler, the user usually needs to change the file path
     """
+    import matplotlib.pyplot as plt
     df = pd.read_csv("F:/pycharm/dragen/ExampleInput/example_pag_inp2.csv")
     data = df["volume"].to_numpy().reshape((-1, 1))
     data = np.sort(data, axis=0)
-    kFold = KFold(n_splits=10)  # k-folder cross-validation split data into 10 folds
-    bandwidths = 10 ** np.linspace(-1, 1, 100)
-    grid = GridSearchCV(estimator=KernelDensity(kernel="gaussian"),
-                        param_grid={"bandwidth": bandwidths},
-                        cv=kFold)
+    grid = _kde_grid()
     grid.fit(data)
     kde = grid.best_estimator_
     log_dens = kde.score_samples(data)
@@ -230,6 +234,7 @@ def test_usersampler():
     """
     test function: test the UserBlockThicknessSampler or UserPakVolumeSampler, the user usually needs to change the file path and the kind of sampler
     """
+    import matplotlib.pyplot as plt
     pak_sampler = UserPakVolumeSampler(2)
     data = []
     for i in range(100):
@@ -238,11 +243,7 @@ def test_usersampler():
 
     data = np.array(data).reshape((-1, 1))
     data = np.sort(data, axis=0)
-    kFold = KFold(n_splits=10)  # k-folder cross-validation split data into 10 folds
-    bandwidths = 10 ** np.linspace(-1, 1, 100)
-    grid = GridSearchCV(estimator=KernelDensity(kernel="gaussian"),
-                        param_grid={"bandwidth": bandwidths},
-                        cv=kFold)
+    grid = _kde_grid()
     grid.fit(data)
     kde = grid.best_estimator_
     log_dens = kde.score_samples(data)
@@ -260,12 +261,20 @@ def slice_to_distribution(num: [int, float],
     if RveInfo.debug:
         assert num > 0 and len(intervals) == 2
     samples = []
+    # about the number of samples that fit into num (plus the one that does not), doubled if it is not enough
+    batch = int(np.ceil(num / np.mean(intervals))) + 1
     while True:
-        sampled_num = distribution.sample(intervals=intervals)
-        if num < sampled_num or num <= intervals[0]:
+        # draw a batch and keep the samples up to the first one that does not fit into the rest anymore
+        sampled_nums = distribution.sample(intervals=intervals, size=batch)
+        rest = num - np.concatenate(([0], np.cumsum(sampled_nums)[:-1]))
+        stop = np.flatnonzero((rest < sampled_nums) | (rest <= intervals[0]))
+        if stop.size > 0:
+            samples.extend(sampled_nums[:stop[0]].tolist())
+            num = rest[stop[0]]
             break
-        samples.append(sampled_num)
-        num -= sampled_num
+        samples.extend(sampled_nums.tolist())
+        num = rest[-1] - sampled_nums[-1]
+        batch *= 2
     samples.append(num)
     return samples
 
@@ -286,11 +295,8 @@ if __name__ == "__main__":
     print(samples)
     data = np.array(samples).reshape((-1, 1))
     data = np.sort(data, axis=0)
-    kFold = KFold(n_splits=10)  # k-folder cross-validation split data into 10 folds
-    bandwidths = 10 ** np.linspace(-1, 1, 100)
-    grid = GridSearchCV(estimator=KernelDensity(kernel="gaussian"),
-                        param_grid={"bandwidth": bandwidths},
-                        cv=kFold)
+    import matplotlib.pyplot as plt
+    grid = _kde_grid()
     grid.fit(data)
     kde = grid.best_estimator_
     log_dens = kde.score_samples(data)
@@ -6,7 +6,44 @@ Version:  V 0.1
 File:     rve_substructure(updated).py
 Describe: Write during the internship at IEHK RWTH
 """
+import os
+from functools import lru_cache
 import pandas as pd
+
+
+class BlockInputIndex:
+    """
+    Index of a measured block file (subs_file): block orientations grouped by grain and packet and the block
+    thickness statistics. It is built once per file and process and reused for every grain and every rve
+    """
+
+    def __init__(self, block_df: pd.DataFrame):
+        self.mean_bt = block_df['block_thickness'].mean()
+        self.packet_orientations = dict()
+        for grain_id, grain_blocks in block_df.groupby('grain_id'):
+            self.packet_orientations[grain_id] = {n: packet_blocks[['phi1', 'PHI', 'phi2']] for n, (_, packet_blocks)
+                                                  in enumerate(grain_blocks.groupby('packet_id'))}
+
+    def get_orientations(self, old_gid) -> dict:
+        """
+        packet number -> orientations of the blocks in this packet, for the grain old_gid of the input data
+        """
+        return self.packet_orientations.get(old_gid + 1, dict())  # +1...
+
+
+@lru_cache(maxsize=4)
+def _load_block_index(filename, mtime):
+    return BlockInputIndex(pd.read_csv(filename))
+
+
+def load_block_index(filename) -> BlockInputIndex:
+    """
+    cached BlockInputIndex of the file, rebuilt only if the file changes
+    """
+    filename = os.path.abspath(filename)
+    return _load_block_index(filename, os.path.getmtime(filename))
+
+
 def save_data(data,store_path,filename='substruct_data_abq.csv'):
 
     filename = store_path + '/' + filename
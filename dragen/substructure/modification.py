@@ -9,7 +9,8 @@ Describe: Write during the internship at IEHK RWTH"""
 #find all adjacent blocks for each block
 from dragen.utilities.InputInfo import RveInfo
 import pandas as pd
-import warnings
+import heapq
+from collections import Counter
 import numpy as np
 
 class Node:
@@ -41,14 +42,6 @@ class Node:
                                  (sub_df['y'] == y_min) | (sub_df['y'] == y_max)|
                                  (sub_df['z'] == z_min) | (sub_df['z'] == z_max)]
 
-class NodeArr:
-    def __init__(self,nodes):
-        self._nodes = nodes
-
-    def __array__(self):
-        ids = [node.subID for node in self._nodes]
-        return np.array(ids)
-
 def build_IDtree(rve_df):
     gids = list(set(rve_df["GrainID"]))
     grain_nodes,packet_nodes,block_nodes = [],[],[]
@@ -93,12 +86,6 @@ def find_branchend(leave:Node):
     else:
         return find_branchend(leave.father)
 
-def istiny(node:Node,lower_bt:float):
-    if node.bt < lower_bt:
-        return True
-    else:
-        return False
-
 def isblock(node):
     if isinstance(node,np.ndarray):
         node = node.item(0)
@@ -181,116 +168,107 @@ def rebuild_tree(nodes):
                 node.father.children.extend(node.children)
                 reset_father(node.children, node.father)
 
-def clean_children(node:Node):
-    node.children = list(filter(lambda child: child.father == node, node.children))
-clean_children = np.vectorize(clean_children)
-
-istiny = np.vectorize(istiny)
 find_branchend = np.vectorize(find_branchend)
 isblock,ispacket,isgrain = np.vectorize(isblock),np.vectorize(ispacket),np.vectorize(isgrain)
-'''
-1.build substructure tree
-2.find all tiny blocks
-3.get branchends for tiny blocks
-4. find neighbors for all branchends
-5. relink branchends
-6. old_id->new_id old_bt->new_bt (if block ends)
-7. modify rve_df
-8. repeat 1-7 until no tiny blocks
-'''
-def merge_tiny_blocks(rve_df,lower_bt):
-# step 1
-    grain_nodes,packet_nodes,block_nodes = build_IDtree(rve_df)
-    while True:
 
-        if len(grain_nodes) == 1 and len(packet_nodes) == 1 and len(block_nodes) == 1:
-            print("the blocks in grain {} can't be merged anymore".format(grain_nodes[0].subID))
-            break
-        old_bid = [block.subID for block in block_nodes]
-        bid_to_new = dict(zip(old_bid,old_bid))
-        old_pid = [packet.subID for packet in packet_nodes]
-        pid_to_new = dict(zip(old_pid,old_pid))
-        old_gid = [grain.subID for grain in grain_nodes]
-        gid_to_new = dict(zip(old_gid,old_gid))
-        old_bt = [block.bt for block in block_nodes]
-        bt_to_new = dict(zip(old_bid,old_bt))
-
-        #step 2
-        barr = np.asarray(block_nodes)
-        tiny_blocks = list(barr[istiny(block_nodes,lower_bt)])
-        #print(len(tiny_blocks))
-        if len(tiny_blocks) == 0:
+
+def block_adjacency(rve_df: pd.DataFrame) -> np.ndarray:
+    """
+    Face neighbour pairs of different blocks on the voxel grid. The points are mapped to the integer indices of the
+    grid of the rve (origin 0, box size / number of points along every axis, RveInfo.bin_size in a cubic rve) and
+    the +x, +y and +z neighbour of every point is looked up with np.searchsorted on the sorted linear indices
+    :return: (n_pairs, 2) array of block ids (one row per touching voxel face)
+    """
+    sizes = np.array([RveInfo.box_size,
+                      RveInfo.box_size if RveInfo.box_size_y is None else RveInfo.box_size_y,
+                      RveInfo.box_size if RveInfo.box_size_z is None else RveInfo.box_size_z], dtype=float)
+    n_pts = np.array([RveInfo.n_pts,
+                      RveInfo.n_pts if RveInfo.n_pts_y is None else RveInfo.n_pts_y,
+                      RveInfo.n_pts if RveInfo.n_pts_z is None else RveInfo.n_pts_z], dtype=float)
+    xyz = rve_df[['x', 'y', 'z']].to_numpy(dtype=float)
+    ijk = np.rint(xyz / (sizes / n_pts)).astype(np.int64)
+
+    # one layer of padding so that the neighbour of the last point in a row can't be the first of the next row
+    shape = ijk.max(axis=0) + 2
+    keys = np.ravel_multi_index(ijk.T, shape)
+    order = np.argsort(keys)
+    keys = keys[order]
+    bids = rve_df['block_id'].to_numpy()[order]
+
+    pairs = []
+    for step in (shape[1] * shape[2], shape[2], 1):
+        pos = np.minimum(np.searchsorted(keys, keys + step), keys.size - 1)
+        hit = keys[pos] == keys + step
+        bid1, bid2 = bids[hit], bids[pos[hit]]
+        other = bid1 != bid2
+        pairs.append(np.stack([bid1[other], bid2[other]], axis=1))
+
+    return np.concatenate(pairs)
+
+
+def merge_tiny_blocks(rve_df, lower_bt):
+    """
+    Merges every block thinner than lower_bt into the neighbouring block it shares the most voxel faces with,
+    blocks of the same packet first. The merged block keeps the id and packet of the neighbour and gets the sum
+    of both thicknesses. Merging is repeated (thinnest block first) until no tiny block has a neighbour left.
+    The block adjacency is built once from the voxel grid, the merges are done in a union-find and all points are
+    relabeled in one vectorized lookup at the end
+    """
+    blocks = rve_df.groupby('block_id').first()
+    if len(blocks) == 1:
+        RveInfo.LOGGER.debug("the blocks in grain {} can't be merged anymore".format(blocks['GrainID'].iloc[0]))
+        return rve_df
+
+    block_ids = blocks.index.to_numpy()
+    bt = blocks['block_thickness'].to_numpy(dtype=float).copy()
+    packet = blocks['packet_id'].to_numpy()
+
+    # neighbours[i]: root block -> number of shared voxel faces
+    neighbours = [Counter() for _ in range(len(block_ids))]
+    pairs = np.sort(np.searchsorted(block_ids, block_adjacency(rve_df)), axis=1)
+    if len(pairs) > 0:
+        pairs, counts = np.unique(pairs, axis=0, return_counts=True)
+        for (i, j), count in zip(pairs.tolist(), counts.tolist()):
+            neighbours[i][j] += count
+            neighbours[j][i] += count
+
+    parent = np.arange(len(block_ids))
+    heap = [(bt[i], i) for i in range(len(block_ids)) if bt[i] < lower_bt]
+    heapq.heapify(heap)
+    while heap:
+        t, i = heapq.heappop(heap)
+        if parent[i] != i or t != bt[i] or len(neighbours[i]) == 0:
+            continue
+
+        candidates = {k: count for k, count in neighbours[i].items() if packet[k] == packet[i]}
+        if len(candidates) == 0:
+            candidates = neighbours[i]
+        j = max(candidates, key=lambda k: (candidates[k], -k))
+
+        # merge i into j
+        parent[i] = j
+        bt[j] += bt[i]
+        del neighbours[j][i]
+        for k, count in neighbours[i].items():
+            if k != j:
+                del neighbours[k][i]
+                neighbours[k][j] += count
+                neighbours[j][k] += count
+        neighbours[i] = Counter()
+        if bt[j] < lower_bt:
+            heapq.heappush(heap, (bt[j], j))
+
+    # resolve the chains to the roots
+    while True:
+        grand_parent = parent[parent]
+        if (grand_parent == parent).all():
             break
+        parent = grand_parent
 
-        #step 3
-        branchends = find_branchend(tiny_blocks)
-        block_ends = branchends[isblock(branchends)]
-        packet_ends = branchends[ispacket(branchends)]
-        grain_ends = branchends[isgrain(branchends)]
-
-        #step 4
-        block_neighbors, packet_neighbors, grain_neighbors = None, None, None
-        if len(block_ends)>0:
-            bneighbors = get_adjacent_node(block_ends)
-            try:
-                block_ends = [block.item(0) for block in block_ends]
-            except:
-                pass
-            block_neighbors = dict(zip(block_ends,bneighbors))
-        if len(packet_ends) > 0:
-            pneighbors = get_adjacent_node(packet_ends)
-            packet_ends = [packet.item(0) for packet in packet_ends]
-            packet_neighbors = dict(zip(packet_ends, pneighbors))
-
-        if len(grain_ends) > 0:
-            gneighbors = get_adjacent_node(grain_ends)
-            grain_ends = [grain.item(0) for grain in grain_ends]
-            grain_neighbors = dict(zip(grain_ends,gneighbors))
-
-        #step 5
-        if block_neighbors is not None:
-            relink(block_neighbors)
-        if packet_neighbors is not None:
-            relink(packet_neighbors)
-        if grain_neighbors is not None:
-            relink(grain_neighbors)
-
-        #step 6
-
-        for block in block_nodes:
-            root = get_root(block)
-            bid_to_new[block.subID] = root.subID
-            bt_to_new[block.subID] = root.bt
-            bt_to_new[root.subID] = root.bt
-
-        for packet in packet_nodes:
-            root = get_root(packet)
-            pid_to_new[packet.subID] = root.subID
-
-        for grain in grain_ends:
-            root = get_root(grain)
-            gid_to_new[grain.subID] = root.subID
-
-        #step7
-        new_bid = rve_df["block_id"].apply(lambda bid:bid_to_new[bid])
-        new_bt = rve_df["block_id"].apply(lambda bid:bt_to_new[bid])
-        new_pid = rve_df["packet_id"].apply(lambda pid:pid_to_new[pid])
-        new_gid = rve_df["GrainID"].apply(lambda gid:gid_to_new[gid])
-
-        rve_df["block_id"] = new_bid
-        rve_df["block_thickness"] = new_bt
-        rve_df["packet_id"] = new_pid
-        rve_df["GrainID"] = new_gid
-
-        #step 8
-        rebuild_tree(block_nodes)
-        rebuild_tree(packet_nodes)
-        rebuild_tree(grain_nodes)
-
-        block_nodes = list(filter(lambda node:node.level != node.father.level,block_nodes))
-        packet_nodes = list(filter(lambda node:node.level != node.father.level,packet_nodes))
-        clean_children(packet_nodes)
-        grain_nodes = list(filter(lambda node:node.level != node.father.level,grain_nodes))
+    idx = np.searchsorted(block_ids, rve_df['block_id'].to_numpy())
+    rve_df['block_id'] = block_ids[parent][idx]
+    rve_df['block_thickness'] = bt[parent][idx]
+    rve_df['packet_id'] = packet[parent][idx]
 
     return rve_df
 
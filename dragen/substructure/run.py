@@ -9,13 +9,14 @@ import multiprocessing
 import pandas as pd
 from dragen.substructure.substructure import plot_rve_subs
 import numpy as np
-from dragen.substructure.data import save_data
+from dragen.substructure.data import save_data, load_block_index
 from dragen.substructure.substructure import Grain
 from dragen.substructure.modification import mod_bt
-from dragen.utilities.InputInfo import RveInfo
-from scipy.stats import moment
-from scipy.stats import gaussian_kde
-import matplotlib.pyplot as plt
+from dragen.substructure.statistics import substructure_stats, block_thickness, write_report
+from dragen.utilities.InputInfo import RveInfo, GenerationContext
+from dragen.utilities.seeding import seed_stage
+from dragen.utilities.instrumentation import timed_stage
+from dragen.utilities.progress import notify
 from dragen.stats.preprocessing import *
 
 
@@ -24,116 +25,74 @@ class Run():
     def __init__(self):
         self.rve_data = None
 
-    @staticmethod
-    def get_orientations(block_df, grain_id):
-        blocks = block_df[block_df['grain_id'] == grain_id + 1]  # +1...
-        n_pack = len(list(set(blocks['packet_id'])))
-        groups = blocks.groupby('packet_id')
-
-        ori_dflist = []
-        for name, group in groups:
-            ori_df = group[['phi1', 'PHI', 'phi2']]
-            ori_dflist.append(ori_df)
-
-        n_pack = np.arange(n_pack)
-
-        n_pack_to_ori = dict(zip(n_pack, ori_dflist))
-
-        return n_pack_to_ori
-
-    @staticmethod
-    def get_bt_distribution(block_df):
-
-        average_bt = block_df['block_thickness'].mean()
-        RveInfo.t_mu = average_bt
-        return average_bt
-
     @staticmethod
     def del_zerobt(_df: pd.DataFrame):
+        """
+        Every block with zero thickness is merged into the nearest block with non-zero thickness, nearest in the
+        x, y, z order of the first point of each block (ties go to the following block). All zero blocks are
+        resolved at once and the voxels are relabeled in one gather
+        """
         sampled_df = _df.groupby('block_id', as_index=False).first()
         sampled_df.sort_values(by=['x', 'y', 'z'], inplace=True)
-        sampled_df.reset_index(inplace=True)
-        # get the id of block with zero thickness
-        zero_ids = sampled_df.loc[sampled_df['block_thickness'] == 0, 'block_id'].tolist()
-        if len(zero_ids) > 0:
-            print('modifying zero block thickness...')
-            for zid in zero_ids:
-                # iter over ids of block with zero thickness
-                idx = sampled_df[sampled_df['block_id'] == zid].index
-                n = 1
-                m = 1
-                while True:
-                    if idx + n < len(sampled_df):
-                        if sampled_df.loc[idx + n, 'block_thickness'].values != 0:
-                            nonzero_idx = idx + n
-                            break
-                        else:
-                            n += 1
-
-                    if idx - m > 0:
-                        if sampled_df.loc[idx - m, 'block_thickness'].values != 0:
-                            nonzero_idx = idx - m
-                            break
-                        else:
-                            m += 1
-
-                new_bid = sampled_df.loc[nonzero_idx, 'block_id'].values[0]
-                new_bt = sampled_df.loc[nonzero_idx, 'block_thickness'].values[0]
-                _df.loc[_df['block_id'] == zid, 'block_id'] = new_bid
-                _df.loc[_df['block_id'] == new_bid, 'block_thickness'] = new_bt  # block id is modified here...
-
+        bids = sampled_df['block_id'].to_numpy()
+        bts = sampled_df['block_thickness'].to_numpy()
+        zero_pos = np.flatnonzero(bts == 0)
+        nonzero_pos = np.flatnonzero(bts != 0)
+        if len(zero_pos) == 0 or len(nonzero_pos) == 0:
+            return
+
+        notify('modifying zero block thickness...')
+        # nearest non-zero block before and after each zero block
+        right = np.searchsorted(nonzero_pos, zero_pos)
+        left = nonzero_pos[np.maximum(right - 1, 0)]
+        right = nonzero_pos[np.minimum(right, len(nonzero_pos) - 1)]
+        left_dist = np.where(left < zero_pos, zero_pos - left, np.inf)
+        right_dist = np.where(right > zero_pos, right - zero_pos, np.inf)
+        nearest = np.where(right_dist <= left_dist, right, left)
+
+        order = np.argsort(bids[zero_pos])
+        zero_ids = bids[zero_pos][order]
+        new_bids, new_bts = bids[nearest][order], bts[nearest][order]
+
+        block_id = _df['block_id'].to_numpy()
+        idx = np.minimum(np.searchsorted(zero_ids, block_id), len(zero_ids) - 1)
+        is_zero = zero_ids[idx] == block_id
+        _df.loc[is_zero, 'block_thickness'] = new_bts[idx[is_zero]]
+        _df.loc[is_zero, 'block_id'] = new_bids[idx[is_zero]]
+
+    @timed_stage('substructure', counts=lambda result, self, rve_df, grains_df: {
+        'voxels': len(result), 'grains': len(grains_df), 'packets': int(result['packet_id'].max()),
+        'blocks': int(result['block_id'].max())})
     def run(self, rve_df, grains_df):
 
         RveInfo.LOGGER.info('------------------------------------------------------------------------------')
         RveInfo.LOGGER.info('substructure generation begins')
         RveInfo.LOGGER.info('------------------------------------------------------------------------------')
-        _rve_data = pd.DataFrame()
+        seed_stage('substructure')
         if RveInfo.subs_file_flag:
             assert RveInfo.subs_file is not None, 'no substructure file given'
-            block_df = pd.read_csv(RveInfo.subs_file)
-            self.get_bt_distribution(block_df)
-            RveInfo.t_mu *= RveInfo.decreasing_factor
-
+            block_index = load_block_index(RveInfo.subs_file)
+            RveInfo.t_mu = block_index.mean_bt * RveInfo.decreasing_factor
+        else:
+            assert RveInfo.equiv_d is not None, 'no valid definition for equiv_d'
+            assert RveInfo.p_sigma is not None, 'no valid definition for p_sigma'
+            assert RveInfo.t_mu is not None, 'no valid definition for t_mu'
+
+        # every grain only gets its own points and its own seed
+        grain_points = grain_points_dict(rve_df)
+        seeds = np.random.randint(np.iinfo(np.int32).max, size=len(grains_df))
+        tasks = list()
         for i in range(len(grains_df)):
 
             grain_data = grains_df.iloc[i]
-            phaseID = int(grain_data['phaseID'])
-            grain_id = grain_data['GrainID']
-            x = rve_df[rve_df['GrainID'] == grain_id]['x'].to_numpy().reshape((-1, 1))
-            y = rve_df[rve_df['GrainID'] == grain_id]['y'].to_numpy().reshape((-1, 1))
-            z = rve_df[rve_df['GrainID'] == grain_id]['z'].to_numpy().reshape((-1, 1))
-
-            points = np.concatenate((x, y, z), axis=1)
-
-            if phaseID == 2 or 4:
-                orientation = (grain_data['phi1'], grain_data['PHI'], grain_data['phi2'])
-                grain = Grain(v=grain_data['final_conti_volume'], points=points,
-                              phaseID=phaseID, grainID=grain_id, orientation=orientation)
-
-                if RveInfo.subs_file_flag:
-                    old_gid = grain_data['old_gid']
-                    blocks = block_df[block_df['grain_id'] == old_gid + 1]
-                    n_pack = len(list(set(blocks['packet_id'])))
-                    orientations = self.get_orientations(block_df, old_gid)
-                    grain.gen_subs(n_pack=n_pack, orientations=orientations)
-
-                else:
-                    assert RveInfo.equiv_d is not None, 'no valid definition for equiv_d'
-                    assert RveInfo.p_sigma is not None, 'no valid definition for p_sigma'
-                    assert RveInfo.t_mu is not None, 'no valid definition for t_mu'
-                    grain.gen_subs(RveInfo.equiv_d, sigma=RveInfo.p_sigma, block_thickness=RveInfo.t_mu,
-                                   b_sigma=RveInfo.b_sigma, lower_t=RveInfo.lower, upper_t=RveInfo.upper,
-                                   circularity=RveInfo.circularity)
-                _rve_data = pd.concat([_rve_data, grain.points_data])
+            points = grain_points[grain_data['GrainID']]
+            n_pack, orientations = None, None
+            if RveInfo.subs_file_flag:
+                orientations = block_index.get_orientations(grain_data['old_gid'])
+                n_pack = len(orientations)
+            tasks.append((grain_data.to_dict(), points, seeds[i], n_pack, orientations))
 
-            else:
-                grain_data = pd.DataFrame(points, columns=['x', 'y', 'z'])
-                grain_data['GrainID'] = grain_id
-                grain_data['phaseID'] = phaseID
-                grain_data['packet_id'] = grain_id
-                grain_data['block_id'] = grain_id
-                grain_data['block_orientation'] = np.NaN
-                _rve_data = pd.concat([_rve_data, grain_data])
+        _rve_data = pd.concat(run_tasks(generate_grain, tasks))
 
         RveInfo.rve_data_substructure = _rve_data
         self.rve_data = _rve_data
@@ -146,21 +105,12 @@ class Run():
         # else:
         #     mod_bt(martensite_df)
         # transfer id to number
-        _rve_data.loc[_rve_data['block_id'].isnull(), 'block_id'] = _rve_data[_rve_data['block_id'].isnull()][
-                                                                        'packet_id'] + '0'
-        packet_id = _rve_data['packet_id'].unique().tolist()
-        n_id = np.arange(1, len(packet_id) + 1)
-        pid_to_nid = dict(zip(packet_id, n_id))
-        # print(pid_to_nid)
-        pid_in_rve = _rve_data['packet_id'].map(lambda pid: pid_to_nid[pid])
-
-        block_id = _rve_data['block_id'].unique().tolist()
-        n2_id = np.arange(1, len(block_id) + 1)
-        bid_to_nid = dict(zip(block_id, n2_id))
-        bid_in_rve = _rve_data['block_id'].map(lambda bid: bid_to_nid[bid])
-
-        _rve_data['packet_id'] = pid_in_rve
-        _rve_data['block_id'] = bid_in_rve
+        # block 0 of a packet has the id of the packet itself
+        _rve_data.loc[_rve_data['block_id'].isnull(), 'block_id'] = _rve_data.loc[_rve_data['block_id'].isnull(),
+                                                                                  'packet_id']
+        # hierarchical ids -> consecutive numbers in order of appearance
+        _rve_data['packet_id'] = pd.factorize(_rve_data['packet_id'])[0] + 1
+        _rve_data['block_id'] = pd.factorize(_rve_data['block_id'])[0] + 1
         _rve_data.n_pts = RveInfo.n_pts
         _rve_data.box_size = RveInfo.box_size
         _rve_data.box_size_y = RveInfo.box_size_y
@@ -185,80 +135,50 @@ class Run():
         return _rve_data
 
     def post_processing(self, k, sigma=2):
+        from scipy.stats import gaussian_kde
+        import matplotlib.pyplot as plt
         rve_data = RveInfo.rve_data_substructure
-
-        def gaussian_kernel(x1, x2, sigma=2):
-            return np.exp(-np.power(x1 - x2, 2).sum() / (2 * sigma ** 2))
-
-        def k_moments(x, k):
-            m_list = []
-            for i in range(k):
-                if i == 0:
-                    m = np.mean(x)
-                else:
-                    m = moment(x, i + 1)
-                m_list.append(m)
-            return np.array(m_list)
+        if rve_data is None:
+            RveInfo.LOGGER.info('no substructure data, substructure postprocessing skipped')
+            return
 
         pag_path = RveInfo.store_path + '/Generation_Data/grain_data_output.csv'
         pag_df = pd.read_csv(pag_path)
-        discrete_vol = pag_df['final_discrete_volume']
-        n_pag = len(pag_df)
-        mean_pagvol = np.mean(discrete_vol)
-        std_pagvol = np.std(discrete_vol)
-
-        n_pak = int(rve_data['packet_id'].max())
-        mean_pakvol = RveInfo.box_size ** 3 / n_pak
-        variance_pakvol = 0
-        for i in range(1, n_pak + 1):
-            pakvol = len(rve_data[rve_data['packet_id'] == i]) / len(rve_data) * RveInfo.box_size ** 3
-            variance_pakvol += (pakvol - mean_pakvol) ** 2 / n_pak
-
-        std_pakvol = variance_pakvol ** 0.5
-
-        n_block = int(rve_data['block_id'].max())
-        bt_df = rve_data.groupby(['block_id']).first()
-        mean_bt = bt_df['block_thickness'].mean()
-        std_bt = bt_df['block_thickness'].std()
-
-        # compute MMD
-        measured_bt = pd.read_csv(RveInfo.subs_file)['block_thickness']
-        generated_bt = bt_df['block_thickness']
-
-        # compute k-moments
-        measured_bt_kmoments = k_moments(measured_bt, k)
-        gen_bt_kmoments = k_moments(generated_bt, k)
+        measured_bt = None
+        if RveInfo.subs_file is not None:
+            measured_bt = pd.read_csv(RveInfo.subs_file)['block_thickness'].to_numpy()
 
-        # get MMD
-        MMD = gaussian_kernel(gen_bt_kmoments, measured_bt_kmoments, sigma)
+        stats = substructure_stats(rve_data, RveInfo.box_size ** 3, pag_volumes=pag_df['final_discrete_volume'],
+                                   measured_bt=measured_bt, k=k, sigma=sigma)
+        write_report(stats, RveInfo.store_path + '/Postprocessing')
 
         result_path = RveInfo.store_path + '/Postprocessing/result.txt'
         with open(result_path, 'w') as f:
             f.write('Parent Austenitic Grains Statistical Info:\n')
-            f.write('total number: {}\n'.format(n_pag))
-            f.write('average(volume): {}\n'.format(mean_pagvol))
-            f.write('standard variance(volume): {}\n'.format(std_pagvol))
+            f.write('total number: {}\n'.format(stats['grains']['number']))
+            f.write('average(volume): {}\n'.format(stats['grains']['mean_volume']))
+            f.write('standard variance(volume): {}\n'.format(stats['grains']['std_volume']))
             f.write('\n')
             f.write('Packets Statistical Info:\n')
-            f.write('total number: {}\n'.format(n_pak))
-            f.write('average(volume): {}\n'.format(mean_pakvol))
-            f.write('standard variance(volume): {}\n'.format(std_pakvol))
+            f.write('total number: {}\n'.format(stats['packets']['number']))
+            f.write('average(volume): {}\n'.format(stats['packets']['mean_volume']))
+            f.write('standard variance(volume): {}\n'.format(stats['packets']['std_volume']))
             f.write('\n')
             f.write('Blocks Statistical Info:\n')
-            f.write('total number: {}\n'.format(n_block))
-            f.write('average(thickness): {}\n'.format(mean_bt))
-            f.write('standard variance(thickness): {}\n'.format(std_bt))
-            f.write('MMD: {}\n'.format(MMD))
-            f.write('\n')
-            if MMD <= 0.01:
-                f.write('##warning: the MMD is too small, please check statistical features!')
+            f.write('total number: {}\n'.format(stats['blocks']['number']))
+            f.write('average(thickness): {}\n'.format(stats['blocks']['mean_thickness']))
+            f.write('standard variance(thickness): {}\n'.format(stats['blocks']['std_thickness']))
+            if measured_bt is not None:
+                MMD = stats['blocks']['MMD']
+                f.write('MMD: {}\n'.format(MMD))
+                f.write('\n')
+                if MMD <= 0.01:
+                    f.write('##warning: the MMD is too small, please check statistical features!')
 
         if RveInfo.subs_file_flag:
-            bt_df = pd.read_csv(RveInfo.subs_file)
-            measured_bt = np.sort(bt_df['block_thickness'].to_numpy())
+            measured_bt = np.sort(measured_bt)
             kernel1 = gaussian_kde(measured_bt)
-            blocks = rve_data.groupby('block_id').first()
-            generated_bt = np.sort(blocks['block_thickness'].to_numpy())
+            generated_bt = np.sort(block_thickness(rve_data))
             kernel2 = gaussian_kde(generated_bt)
             plt.plot(measured_bt, kernel1(measured_bt), label='Real_Distribution')
             plt.plot(generated_bt, kernel2(generated_bt), label='DRAGen_Distribution')
@@ -300,42 +220,85 @@ def get_sampler() -> [InputDataSampler, UserPakVolumeSampler, UserPakVolumeSampl
     return pv_sampler, bt_sampler
 
 
-def generate_packet(rve_df: pd.DataFrame, grains_df: pd.DataFrame, row_num: int,
-                    pv_sampler: [UserPakVolumeSampler, InputDataSampler]):
-    if RveInfo.debug:
-        assert 0 <= row_num < len(grains_df)
-    grain_data = grains_df.iloc[row_num]
-    phaseID = int(grain_data['phaseID'])
-    grain_id = grain_data['GrainID']
-    x = rve_df[rve_df['GrainID'] == grain_id]['x'].to_numpy().reshape((-1, 1))
-    y = rve_df[rve_df['GrainID'] == grain_id]['y'].to_numpy().reshape((-1, 1))
-    z = rve_df[rve_df['GrainID'] == grain_id]['z'].to_numpy().reshape((-1, 1))
+def init_worker(context: GenerationContext):
+    """
+    sets RveInfo in a worker process to the generation context of the parent (RveInfo is not shared between processes)
+    """
+    context.apply()
+
+
+def grain_points_dict(rve_df: pd.DataFrame) -> dict:
+    """
+    GrainID -> (n, 3) array of the grain points, built with one groupby instead of filtering rve_df per grain
+    """
+    xyz = rve_df[['x', 'y', 'z']].to_numpy()
+    return {grain_id: xyz[idx] for grain_id, idx in rve_df.groupby('GrainID').indices.items()}
+
+
+def run_tasks(func, tasks: list) -> list:
+    """
+    runs func(*task) for every task. With RveInfo.num_cores > 1 the tasks are distributed over a process pool,
+    the biggest grains first. The results are returned in the order of the tasks, so the result does not depend
+    on the number of cores
+    """
+    if RveInfo.num_cores is None or RveInfo.num_cores <= 1 or len(tasks) <= 1:
+        return [func(*task) for task in tasks]
 
-    points = np.concatenate((x, y, z), axis=1)
-    if phaseID == 2:
-        orientation = (grain_data['phi1'], grain_data['PHI'], grain_data['phi2'])
-        grain = Grain(v=grain_data['final_conti_volume'], points=points,
-                      phaseID=phaseID, grainID=grain_id, orientation=orientation)
-        grain.gen_pak(pak_volume_sampler=pv_sampler)
+    order = np.argsort([-len(task[1]) for task in tasks], kind='stable')
+    context = GenerationContext.from_rveinfo()
+    notify("start {} processes to generate substructures".format(min(RveInfo.num_cores, len(tasks))))
+    with multiprocessing.Pool(min(RveInfo.num_cores, len(tasks)), initializer=init_worker,
+                              initargs=(context,)) as pool:
+        results = pool.starmap(func, [tasks[i] for i in order], chunksize=1)
 
-    print("Grain {} generates packets successfully".format(row_num))
+    ordered_results = [None] * len(tasks)
+    for i, result in zip(order, results):
+        ordered_results[i] = result
+    return ordered_results
 
 
-def better_run(rve_df: pd.DataFrame, grains_df: pd.DataFrame):
+def generate_grain(grain_data: dict, points: np.ndarray, seed: int, n_pack=None, orientations=None) -> pd.DataFrame:
     """
-    workflow of substructures generation
+    generates packets and blocks in one grain
+    :param grain_data: row of grains_df
+    :param points: (n, 3) coordinates of the grain points
+    :param seed: seed of the grain, makes the result independent of the process it runs in
+    :param n_pack: number of packets (subs_file) or None to sample them
+    :param orientations: packet number -> block orientations (subs_file) or None
+    :return: points_data of the grain
+    """
+    np.random.seed(seed)
+    orientation = (grain_data['phi1'], grain_data['PHI'], grain_data['phi2'])
+    grain = Grain(v=grain_data['final_conti_volume'], points=points,
+                  phaseID=int(grain_data['phaseID']), grainID=grain_data['GrainID'], orientation=orientation)
+    return grain.gen_subs(n_pack=n_pack, orientations=orientations)
+
+
+def generate_packet(grain_data: dict, points: np.ndarray, seed: int,
+                    pv_sampler: [UserPakVolumeSampler, InputDataSampler]) -> pd.DataFrame:
+    np.random.seed(seed)
+    orientation = (grain_data['phi1'], grain_data['PHI'], grain_data['phi2'])
+    grain = Grain(v=grain_data['final_conti_volume'], points=points,
+                  phaseID=int(grain_data['phaseID']), grainID=grain_data['GrainID'], orientation=orientation)
+    grain.gen_pak(pak_volume_sampler=pv_sampler)
+    return grain.points_data
+
+
+def better_run(rve_df: pd.DataFrame, grains_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    workflow of packet generation
     """
-    # start multiprocessing pool
-    pool = multiprocessing.Pool(RveInfo.num_cores)
     # get sampler
     pv_sampler, bt_sampler = get_sampler()
+    grain_points = grain_points_dict(rve_df)
+    grains_df = grains_df[grains_df['phaseID'] == 2]
+    seeds = np.random.randint(np.iinfo(np.int32).max, size=len(grains_df))
+    tasks = [(grains_df.iloc[i].to_dict(), grain_points[grains_df.iloc[i]['GrainID']], seeds[i], pv_sampler)
+             for i in range(len(grains_df))]
     # generate packets in all grains
-    for i in range(len(grains_df)):
-        pool.apply_async(generate_packet, args=(rve_df, grains_df, i, pv_sampler,))
-
-    print("start {} processes to generate packets".format(RveInfo.num_cores))
-    pool.close()
-    pool.join()
+    rve_df = pd.concat(run_tasks(generate_packet, tasks))
+    notify("Packets generated in {} grains".format(len(tasks)))
+    return rve_df
 
 
 if __name__ == '__main__':
@@ -357,4 +320,4 @@ if __name__ == '__main__':
     grains_df = pd.read_csv("F:/pycharm/2nd_mini_thesis/dragen-master/OutputData/2021-07-23_0/Generation_Data/grain_data_output_discrete.csv")
     rve_df = pd.read_csv(r"F:\pycharm\dragen\dragen\test\rve.csv")
     rve_df["phaseID"] = 2
-    better_run(rve_df=rve_df,grains_df=grains_df)
+    rve_df = better_run(rve_df=rve_df, grains_df=grains_df)
@@ -0,0 +1,97 @@
+# _*_ coding: utf-8 _*_
+"""
+Statistics of the generated substructure (packets and blocks). All per-packet and per-block quantities are computed
+in one pass over the rve data (bincount over the ids and one groupby for the block thickness)
+"""
+import json
+import numpy as np
+import pandas as pd
+
+
+def k_moments(x, k):
+    """
+    mean and the central moments 2...k of x
+    """
+    from scipy.stats import moment
+    x = np.asarray(x, dtype=float)
+    m_list = [np.mean(x)]
+    for i in range(1, k):
+        m_list.append(moment(x, i + 1))
+    return np.array(m_list)
+
+
+def gaussian_kernel(x1, x2, sigma=2):
+    return np.exp(-np.power(np.asarray(x1) - np.asarray(x2), 2).sum() / (2 * sigma ** 2))
+
+
+def mmd(generated, measured, k=3, sigma=2):
+    """
+    kernel between the first k moments of the generated and the measured distribution
+    """
+    return gaussian_kernel(k_moments(generated, k), k_moments(measured, k), sigma)
+
+
+def block_thickness(rve_data: pd.DataFrame) -> np.ndarray:
+    """
+    thickness of every block (one value per block_id)
+    """
+    return rve_data.groupby('block_id')['block_thickness'].first().to_numpy(dtype=float)
+
+
+def packet_volumes(rve_data: pd.DataFrame, rve_volume: float) -> np.ndarray:
+    """
+    volume of the packets 1...max(packet_id), from the share of the rve points in each packet
+    """
+    packet_id = rve_data['packet_id'].to_numpy(dtype=np.int64)
+    counts = np.bincount(packet_id, minlength=packet_id.max() + 1)[1:]
+    return counts / len(packet_id) * rve_volume
+
+
+def substructure_stats(rve_data: pd.DataFrame, rve_volume: float, pag_volumes=None, measured_bt=None,
+                       k=3, sigma=2) -> dict:
+    """
+    :param rve_data: rve with the consecutive packet_id and block_id of the substructure run
+    :param rve_volume: volume of the rve
+    :param pag_volumes: volumes of the parent austenite grains
+    :param measured_bt: measured block thickness to compare the generated ones with (MMD)
+    :return: nested dict with number, mean and standard deviation for grains, packets and blocks
+    """
+    stats = dict()
+    if pag_volumes is not None:
+        pag_volumes = np.asarray(pag_volumes, dtype=float)
+        stats['grains'] = {'number': int(pag_volumes.size),
+                           'mean_volume': float(np.mean(pag_volumes)),
+                           'std_volume': float(np.std(pag_volumes))}
+
+    pak_vol = packet_volumes(rve_data, rve_volume)
+    # all packets together fill the rve
+    mean_pakvol = rve_volume / pak_vol.size
+    stats['packets'] = {'number': int(pak_vol.size),
+                        'mean_volume': float(mean_pakvol),
+                        'std_volume': float(np.sqrt(np.mean((pak_vol - mean_pakvol) ** 2)))}
+
+    generated_bt = block_thickness(rve_data)
+    stats['blocks'] = {'number': int(rve_data['block_id'].max()),
+                       'mean_thickness': float(np.nanmean(generated_bt)),
+                       'std_thickness': float(np.nanstd(generated_bt, ddof=1)) if generated_bt.size > 1 else 0.0,
+                       'moments': k_moments(generated_bt, k).tolist()}
+    if measured_bt is not None:
+        stats['blocks']['measured_moments'] = k_moments(measured_bt, k).tolist()
+        stats['blocks']['MMD'] = float(mmd(generated_bt, measured_bt, k, sigma))
+
+    return stats
+
+
+def write_report(stats: dict, path: str, name='substructure_statistics'):
+    """
+    writes the statistics as json (complete) and csv (one row per substructure level)
+    """
+    with open('{}/{}.json'.format(path, name), 'w') as f:
+        json.dump(stats, f, indent=4)
+
+    rows = list()
+    for level, values in stats.items():
+        row = {'level': level}
+        row.update({key: value for key, value in values.items() if not isinstance(value, list)})
+        rows.append(row)
+    pd.DataFrame(rows).to_csv('{}/{}.csv'.format(path, name), index=False)
@@ -12,10 +12,7 @@ from dragen.substructure.modification import merge_tiny_blocks
 from dragen.utilities.InputInfo import RveInfo
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-from scipy.stats import lognorm
 import math
-import warnings
 from dragen.stats.preprocessing import *
 
 
@@ -55,32 +52,50 @@ class Grain(HelperFunctions):
 
     def lc_to_gc(self, habit_plane_list):
 
-        orientation = self.orientation
+        R = euler_to_rotation(self.orientation)[0]
+        R_I = np.linalg.inv(R)
 
-        R1 = np.array([[np.cos(np.deg2rad(orientation[0])), -np.sin(np.deg2rad(orientation[0])), 0],
-                       [np.sin(np.deg2rad(orientation[0])), np.cos(np.deg2rad(orientation[0])), 0],
-                       [0, 0, 1]], dtype=object)
-
-        R2 = np.array([[1, 0, 0],
-                       [0, np.cos(np.deg2rad(orientation[1])), -np.sin(np.deg2rad(orientation[1]))],
-                       [0, np.sin(np.deg2rad(orientation[1])), np.cos(np.deg2rad(orientation[1]))]], dtype=object)
+        habit_plane_list = np.array(habit_plane_list, dtype=float)
+        transferred_hp_list = (R_I.dot(habit_plane_list.T)).T
 
-        R3 = np.array([[np.cos(np.deg2rad(orientation[2])), -np.sin(np.deg2rad(orientation[2])), 0],
-                       [np.sin(np.deg2rad(orientation[2])), np.cos(np.deg2rad(orientation[2])), 0],
-                       [0, 0, 1]], dtype=object)
+        return transferred_hp_list
 
-        result = np.dot(R3, R2)
-        R = np.matrix(np.dot(result, R1))
-        R = R.astype(float)  # new error has to convert data type
-        R_I = R.I
+    def cut_packets(self, num_grid_ps):
+        """
+        Cuts the grain into packets along the habit planes. The distance of every point to all four habit planes is
+        projected only once, every packet takes the num points with the largest distance to the chosen habit plane
+        from the remaining points (np.argpartition instead of sorting the whole grain)
+        :param num_grid_ps: number of grid points per packet
+        :return: generator of (habit plane index, habit plane normal, positional index of the packet points)
+        """
+        points = self.points_data[['x', 'y', 'z']].to_numpy(dtype=float)
+        normals = np.asarray(self.hp_normal_list, dtype=float)
+        projections = points[:, 0:1] * normals[:, 0] + points[:, 1:2] * normals[:, 1] + \
+            points[:, 2:3] * normals[:, 2]
+        remaining = np.arange(points.shape[0])
+        index = None
+        for num in num_grid_ps:
+            if remaining.size == 0:
+                break
+            trial_index = [0, 1, 2, 3]
+            if index is not None:
+                trial_index.remove(index)
+                index = np.random.choice(trial_index, 1)[0]
 
-        habit_plane_list = np.array(habit_plane_list)
-        transferred_hp_list = (R_I.dot(habit_plane_list.T)).T
+            else:
+                index = np.random.randint(4)
 
-        return transferred_hp_list
+            chosen_norm = self.hp_normal_list[index]
+            projection = projections[remaining, index]
+            num = min(int(num), remaining.size)
+            chosen_d = -projection[np.argpartition(-projection, num - 1)[num - 1]]
+            in_packet = projection + chosen_d >= 0
+            yield index, chosen_norm, remaining[in_packet]
+            remaining = remaining[~in_packet]
 
     def gen_subs(self, n_pack=None, orientations=None):
 
+        from scipy.stats import lognorm
         if n_pack is None:
             r = RveInfo.equiv_d / 2
             average_pv = 4 / 3 * np.pi * r ** 3 * RveInfo.circularity ** (1.5)
@@ -129,37 +144,16 @@ class Grain(HelperFunctions):
                 num_grid_ps[i] += 1
 
         points_data = self.points_data.copy()
-        points_data['packet_id'] = '0'
-        self.points_data['packet_id'] = '0'
-        self.points_data['block_id'] = '0'
-        self.points_data['block_thickness'] = 0
-
-        i = 0
-        for num in num_grid_ps:
-
-            trial_index = [0, 1, 2, 3]
-            if i > 0:
-                trial_index.remove(self.packets_list[i - 1].chosen_nidx)
-                index = np.random.choice(trial_index, 1)[0]
-
-            else:
-                index = np.random.randint(4)
-
-            chosen_norm = self.hp_normal_list[index, ...]
-            d = -(points_data['x'] * chosen_norm[0, 0] + points_data['y'] * chosen_norm[0, 1] +
-                  points_data['z'] * chosen_norm[0, 2])
-            d.sort_values(inplace=True)
-            chosen_d = d.iloc[num - 1]
-
-            # self.points_data.loc[chosen_index,'packet_id'] = str(int(self.points_data.loc[chosen_index,'GrainID'].iloc[0])) + 'p' + str(i)
-            points_idx = points_data[points_data['x'] * chosen_norm[0, 0] +
-                                     points_data['y'] * chosen_norm[0, 1] +
-                                     points_data['z'] * chosen_norm[0, 2] + chosen_d >= 0].index
-            points_data.loc[points_idx, 'packet_id'] = str(
-                int(points_data.loc[points_idx, 'GrainID'].iloc[0])) + 'p' + str(i)
-
-            packet_df = points_data.loc[points_idx]
-            packet = Packet(packet_df)
+        points_data['packet_id'] = 0
+        packet_id = np.zeros(len(self.points_data), dtype=np.int64)
+        block_id = np.zeros(len(self.points_data), dtype=np.int64)
+        block_thickness = np.zeros(len(self.points_data))
+
+        for index, chosen_norm, points_idx in self.cut_packets(num_grid_ps):
+            packet_df = points_data.iloc[points_idx].copy()
+            pid = packet_to_id(self.grainID, len(self.packets_list))
+            packet_df['packet_id'] = pid
+            packet = Packet(packet_df, packet_id=pid)
             packet.chosen_nidx = index
             packet.boundary = chosen_norm
             packet.variants = self.trial_variants_select(packet)
@@ -168,39 +162,42 @@ class Grain(HelperFunctions):
             comp_df = packet.get_bt()
             # comp_df = packet.merge_tiny_blocks(merge_tiny_blocks)
 
-            self.points_data.loc[comp_df.index, 'packet_id'] = packet['id']
-            self.points_data.loc[comp_df.index, 'block_id'] = comp_df['block_id']
-            self.points_data.loc[comp_df.index, 'block_thickness'] = comp_df['block_thickness']
+            packet_id[points_idx] = packet['id']
+            block_id[points_idx] = comp_df['block_id'].to_numpy()
+            block_thickness[points_idx] = comp_df['block_thickness'].to_numpy()
 
             self.packets_list.append(packet)
             self.pid_to_packet[packet['id']] = packet
-            points_data.drop(packet_df.index, inplace=True)
-            i += 1
 
+        self.points_data['packet_id'] = packet_id
+        self.points_data['block_id'] = block_id
+        self.points_data['block_thickness'] = block_thickness
+
+        angles = np.zeros((len(self.points_data), 3))
         if orientations is None:
+            block_variant = np.full(len(self.points_data), None, dtype=object)
+            # the block orientation only depends on the variant: all 24 KS variants of the grain in one shot
+            variant_angles = ks_orientations(self.orientation, np.arange(len(T_list)))
             for packet in self.packets_list:
                 comp_df = packet.assign_bv()
-                blocks = packet.points_data.groupby('block_id').head(1)
-                bid = blocks.apply(lambda block: block['block_id'], axis=1)
-                angles = blocks.apply(lambda block: packet.comp_angle(self.orientation, block), axis=1)
-                bid_to_angles = dict(zip(bid, angles))
-                phi1 = packet.points_data['block_id'].map(lambda bid: bid_to_angles[bid][0])
-                PHI = packet.points_data['block_id'].map(lambda bid: bid_to_angles[bid][1])
-                phi2 = packet.points_data['block_id'].map(lambda bid: bid_to_angles[bid][2])
-                self.points_data.loc[comp_df.index, 'block_variant'] = comp_df['block_variant']
-                self.points_data.loc[comp_df.index, 'phi1'] = phi1
-                self.points_data.loc[comp_df.index, 'PHI'] = PHI
-                self.points_data.loc[comp_df.index, 'phi2'] = phi2
+                points_idx = self.points_data.index.get_indexer(comp_df.index)
+                variants = comp_df['block_variant'].to_numpy()
+                block_variant[points_idx] = variants
+                angles[points_idx] = variant_angles[variant_index(variants)]
+            self.points_data['block_variant'] = block_variant
 
         else:
             for i in range(len(self.packets_list)):
                 self.packets_list[i].orientations = orientations[i]
                 comp_df = self.packets_list[i].assign_block_ori()
-                self.points_data.loc[comp_df.index, 'phi1'] = comp_df['phi1']
-                self.points_data.loc[comp_df.index, 'PHI'] = comp_df['PHI']
-                self.points_data.loc[comp_df.index, 'phi2'] = comp_df['phi2']
+                points_idx = self.points_data.index.get_indexer(comp_df.index)
+                angles[points_idx] = comp_df[['phi1', 'PHI', 'phi2']].to_numpy(dtype=float)
+
+        self.points_data['phi1'] = angles[:, 0]
+        self.points_data['PHI'] = angles[:, 1]
+        self.points_data['phi2'] = angles[:, 2]
 
-        if len(list(set(self.points_data["block_id"]))) > 1:
+        if self.points_data["block_id"].nunique() > 1:
             if RveInfo.lower is None:
                 RveInfo.lower = RveInfo.t_mu / 3
             self.points_data = self.merge_tiny_blocks(merge_tiny_blocks)
@@ -236,45 +233,24 @@ class Grain(HelperFunctions):
         if RveInfo.debug:
             assert sum(num_grid_ps) == len(self.points_data) and ((np.array(num_grid_ps) != 0).all())
         points_data = self.points_data.copy()
-        points_data['packet_id'] = '0'
-        self.points_data['packet_id'] = '0'
-        self.points_data['block_id'] = '0'
+        packet_id = np.zeros(len(self.points_data), dtype=np.int64)
+        self.points_data['block_id'] = 0
         self.points_data['block_thickness'] = 0
-        orientations = None
-        i = 0
-        for num in num_grid_ps:
-
-            trial_index = [0, 1, 2, 3]
-            if i > 0:
-                trial_index.remove(self.packets_list[i - 1].chosen_nidx)
-                index = np.random.choice(trial_index, 1)[0]
 
-            else:
-                index = np.random.randint(4)
-
-            chosen_norm = self.hp_normal_list[index, ...]
-            d = -(points_data['x'] * chosen_norm[0, 0] + points_data['y'] * chosen_norm[0, 1] +
-                  points_data['z'] * chosen_norm[0, 2])
-            d.sort_values(inplace=True)
-            chosen_d = d.iloc[num - 1]
-
-            # self.points_data.loc[chosen_index,'packet_id'] = str(int(self.points_data.loc[chosen_index,'GrainID'].iloc[0])) + 'p' + str(i)
-            points_idx = points_data[points_data['x'] * chosen_norm[0, 0] +
-                                     points_data['y'] * chosen_norm[0, 1] +
-                                     points_data['z'] * chosen_norm[0, 2] + chosen_d >= 0].index
-            points_data.loc[points_idx, 'packet_id'] = str(
-                int(points_data.loc[points_idx, 'GrainID'].iloc[0])) + 'p' + str(i)
-            packet_df = points_data.loc[points_idx]
-            packet = Packet(packet_df)
+        for index, chosen_norm, points_idx in self.cut_packets(num_grid_ps):
+            packet_df = points_data.iloc[points_idx].copy()
+            pid = packet_to_id(self.grainID, len(self.packets_list))
+            packet_df['packet_id'] = pid
+            packet = Packet(packet_df, packet_id=pid)
             packet.chosen_nidx = index
             packet.boundary = chosen_norm
             packet.variants = self.trial_variants_select(packet)
             packet.pag_ori = self.orientation
-            self.points_data.loc[points_idx, 'packet_id'] = packet['id']
-            print(self.points_data.loc[points_idx, 'packet_id'])
+            packet_id[points_idx] = packet['id']
             self.packets_list.append(packet)
             rve_packets_list.append(packet)
-            i += 1
+
+        self.points_data['packet_id'] = packet_id
 
         return rve_packets_list
 
@@ -282,11 +258,7 @@ class Grain(HelperFunctions):
 
         normal = packet.boundary
         variants = self.variants
-        h_list = self.hp_normal_list
-        hp_list = []
-        for h in h_list:
-            hp_list.append(list(np.array(h).squeeze()))
-        hp_list = np.array(hp_list)
+        hp_list = self.hp_normal_list
 
         possible_v = variants[np.where((hp_list == normal).all(axis=1))[0], :]
 
@@ -295,7 +267,7 @@ class Grain(HelperFunctions):
     def merge_tiny_blocks(self, func):
 
         self.points_data = func(self.points_data, RveInfo.lower)
-        print('all tiny blocks in grain {} are merged'.format(self.grainID))
+        RveInfo.LOGGER.debug('all tiny blocks in grain {} are merged'.format(self.grainID))
         return self.points_data
 
 
@@ -326,7 +298,21 @@ class Plane:
             return self.normal[item]
 
 
+ID_BASE = 2 ** 16
+
+
+def packet_to_id(grain_id, packet):
+    """
+    Hierarchical integer id of a packet: grain, packet and block are packed into one int64 so that ids stay unique
+    over the whole rve. The block ids of a packet are packet_id + block (block < ID_BASE)
+    :param grain_id: GrainID of the parent grain
+    :param packet: number of the packet within the grain
+    """
+    return (np.int64(grain_id) * ID_BASE + packet) * ID_BASE
+
+
 def plot_rve_subs(rve_data, subs_name, store_path=None):
+    import matplotlib.pyplot as plt
     if subs_name == 'Grain' or 'phase':
         ID = '%sID' % subs_name
 
@@ -445,13 +431,91 @@ T_list[23] = np.array([[-0.742, 0.667, -0.075],
                        [0.167, 0.075, -0.983]])
 
 
+T_array = np.array(T_list, dtype=float)
+
+
+def variant_index(block_variant):
+    """
+    'V1'...'V24' -> index in T_list
+    """
+    if isinstance(block_variant, str):
+        return int(block_variant.lstrip('V')) - 1
+    return np.array([int(str(v).lstrip('V')) for v in block_variant]) - 1
+
+
+def euler_to_rotation(euler):
+    """
+    Stacked rotation matrices R = R3(phi2) * R2(PHI) * R1(phi1)
+    :param euler: (3,) or (N, 3) euler angles (phi1, PHI, phi2) in degree
+    :return: (N, 3, 3) float64 array
+    """
+    euler = np.deg2rad(np.asarray(euler, dtype=float).reshape(-1, 3))
+    c, s = np.cos(euler), np.sin(euler)
+    R1 = np.zeros((euler.shape[0], 3, 3))
+    R1[:, 0, 0], R1[:, 0, 1], R1[:, 1, 0], R1[:, 1, 1], R1[:, 2, 2] = c[:, 0], -s[:, 0], s[:, 0], c[:, 0], 1
+    R2 = np.zeros((euler.shape[0], 3, 3))
+    R2[:, 0, 0], R2[:, 1, 1], R2[:, 1, 2], R2[:, 2, 1], R2[:, 2, 2] = 1, c[:, 1], -s[:, 1], s[:, 1], c[:, 1]
+    R3 = np.zeros((euler.shape[0], 3, 3))
+    R3[:, 0, 0], R3[:, 0, 1], R3[:, 1, 0], R3[:, 1, 1], R3[:, 2, 2] = c[:, 2], -s[:, 2], s[:, 2], c[:, 2], 1
+
+    return np.matmul(np.matmul(R3, R2), R1)
+
+
+def rotation_to_euler(R):
+    """
+    Euler angles of stacked (transformed) rotation matrices. The KS matrices in T_list are rounded, so the entries
+    are scaled back into [-1, 1] before arccos/arcsin
+    :param R: (N, 3, 3) array
+    :return: (N, 3) euler angles (phi1, PHI, phi2) in degree
+    """
+    R = np.array(R, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        N = np.ones(R.shape[0])
+        N = np.where(R[:, 2, 2] > 1, 1 / R[:, 2, 2], N)
+        N = np.where(R[:, 2, 2] < -1, -1 / R[:, 2, 2], N)
+        R[:, 2, 2] = N * R[:, 2, 2]
+        sin_PHI = np.sin(np.deg2rad(np.degrees(np.arccos(R[:, 2, 2]))))
+        n1 = np.where(np.abs(R[:, 2, 0] / sin_PHI) > 1, sin_PHI / R[:, 2, 0], 1)
+        n2 = np.where(np.abs(R[:, 0, 2] / sin_PHI) > 1, sin_PHI / R[:, 0, 2], 1)
+        n = np.where(np.abs(n1) > np.abs(n2), n2, n1)
+
+        # recalculate after scaling
+        R = (N * n)[:, None, None] * R
+        PHI = np.degrees(np.arccos(R[:, 2, 2]))
+        PHI = np.where(PHI < 0, PHI + 360, PHI)
+        sin_PHI = np.sin(np.deg2rad(PHI))
+        phi1 = np.degrees(np.arcsin(R[:, 2, 0] / sin_PHI))
+        phi1 = np.where(phi1 < 0, phi1 + 360, phi1)
+        phi2 = np.degrees(np.arcsin(R[:, 0, 2] / sin_PHI))
+        phi2 = np.where(phi2 < 0, phi2 + 360, phi2)
+
+    return np.stack([phi1, PHI, phi2], axis=1)
+
+
+def ks_orientations(pag_ori, variant_idx, parent_idx=None):
+    """
+    Block orientations of KS variants for a batch of blocks
+    :param pag_ori: (3,) or (N, 3) euler angles of the parent austenite grain in degree
+    :param variant_idx: (N,) indices of the block variants in T_list
+    :param parent_idx: (N,) indices in T_list of the variant the parent orientation refers to (None: parent
+    orientation is the austenite orientation itself)
+    :return: (N, 3) euler angles of the blocks in degree
+    """
+    R = euler_to_rotation(pag_ori)
+    if parent_idx is not None:
+        R = np.matmul(np.linalg.inv(T_array[np.asarray(parent_idx)]), R)
+
+    return rotation_to_euler(np.matmul(T_array[np.asarray(variant_idx)], R))
+
+
 # global variables
 
 class Packet():
 
-    def __init__(self, points_data):
+    def __init__(self, points_data, packet_id=None):
 
         self.points_data = points_data
+        self.packet_id = packet_id
         self.boundary = None
         self.chosen_nidx = 0
         self.variants = None
@@ -467,33 +531,27 @@ class Packet():
     def __getitem__(self, item):
 
         if item == 'id':
-            return list(set(self.points_data['packet_id']))[0]
-
-    def dis_to_id(self, dis, t_list):
-
-        idx = np.where(t_list > dis)
-        if len(idx[0]) == 0:
-            return str(len(t_list))
-        else:
-            return str(int(idx[0][0] - 1))
+            if self.packet_id is None:
+                self.packet_id = int(self.points_data['packet_id'].iloc[0])
+            return self.packet_id
 
     def gen_blocks(self):
 
+        from scipy.stats import lognorm
         points_data = self.points_data.copy()
 
         block_plane = np.random.random((1, 3))
         # boundary plane of block within packet
 
-        pd = -(points_data['x'] * block_plane[..., 0] + points_data['y'] * block_plane[..., 1] + points_data['z'] *
-               block_plane[..., 2])
+        points = points_data[['x', 'y', 'z']].to_numpy(dtype=float)
+        pd = -(points[:, 0] * block_plane[0, 0] + points[:, 1] * block_plane[0, 1] + points[:, 2] * block_plane[0, 2])
         # compute d of block boundary
 
-        points_data.insert(6, 'pd', value=pd)
-        sq = np.sqrt(block_plane[..., 0] ** 2 + block_plane[..., 1] ** 2 + block_plane[..., 2] ** 2)
-        p_dis = (points_data['pd'].max() - points_data['pd']) / sq
-        points_data.insert(7, 'p_dis', value=p_dis)
+        sq = np.sqrt(block_plane[0, 0] ** 2 + block_plane[0, 1] ** 2 + block_plane[0, 2] ** 2)
+        p_dis = (pd.max() - pd) / sq
+        points_data.insert(6, 'p_dis', value=p_dis)
 
-        n = points_data['p_dis'].max() / RveInfo.t_mu
+        n = p_dis.max() / RveInfo.t_mu
         n = math.ceil(n)
 
         if RveInfo.lower == None:
@@ -526,36 +584,30 @@ class Packet():
         else:
             bt_list = [RveInfo.t_mu]
 
-        dis_list = [0 for i in range(len(bt_list) + 1)]
-        for i in range(len(bt_list)):
-            dis_list[i + 1] = np.sum(bt_list[:i + 1])
-
-        dis_list = np.array(dis_list)
-        block_id = points_data['p_dis'].map(lambda dis: self.dis_to_id(dis, dis_list))
-        points_data['block_id'] = points_data['packet_id'] + block_id
-        points_data = points_data.drop('pd', axis=1)
+        # block i lies between the cumulative thicknesses dis_list[i] and dis_list[i+1]
+        dis_list = np.concatenate(([0], np.cumsum(bt_list)))
+        block_id = np.searchsorted(dis_list, p_dis, side='right')
+        block_id = np.where(block_id == len(dis_list), block_id, block_id - 1)
+        points_data['block_id'] = points_data['packet_id'].to_numpy(dtype=np.int64) + block_id
 
         self.points_data = points_data
 
     def strip_pid(self, bid):
 
-        return (int(bid[len(self['id']):]))
+        return bid - self['id']
 
     def get_bt(self):
 
-        self.points_data['block_thickness'] = np.nan
-        bg = self.points_data.groupby('block_id')
-        bid_to_bt = bg['p_dis'].apply(max) - bg['p_dis'].apply(min)
-        self.points_data['block_thickness'] = self.points_data.apply(lambda p: bid_to_bt[p['block_id']], axis=1)
+        bg = self.points_data.groupby('block_id')['p_dis']
+        self.points_data['block_thickness'] = bg.transform('max') - bg.transform('min')
         return self.points_data
 
     def assign_bv(self):
 
         points_data = self.points_data.copy()
         points_data.sort_values(by='p_dis', inplace=True)
-        bid = points_data['block_id'].map(lambda bid: self.strip_pid(bid))
-        points_data['strip_bid'] = bid
-        bid = list(set(bid))
+        points_data['strip_bid'] = self.strip_pid(points_data['block_id'])
+        bid, codes = np.unique(points_data['strip_bid'].to_numpy(), return_inverse=True)
 
         vidx = [1 for i in range(len(bid))]
 
@@ -565,19 +617,14 @@ class Packet():
                 pv.remove(vidx[i - 1])
             vidx[i] = np.random.choice(pv, 1)[0]
 
-        variant_trial_list = self.variants
-        bid_to_vidx = dict(zip(bid, vidx))
-
-        points_data['block_variant'] = points_data.apply(
-            lambda p: variant_trial_list[..., bid_to_vidx[p['strip_bid']]][0], axis=1)
+        points_data['block_variant'] = self.variants[0, np.asarray(vidx)][codes]
         self.points_data = points_data
         return self.points_data
 
     def assign_block_ori(self):
 
         points_data = self.points_data.copy()
-        points_data[['phi1', 'PHI', 'phi2']] = None
-        block_ids = list(set(points_data['block_id']))
+        block_ids, codes = np.unique(points_data['block_id'].to_numpy(), return_inverse=True)
 
         chosen_ori = [i for i in range(len(block_ids))]
 
@@ -592,170 +639,47 @@ class Packet():
 
                 chosen_ori[i] = bori.sample(1, axis=0)
 
-            bid_to_ori = dict(zip(block_ids, chosen_ori))
-            points_data['phi1'] = points_data['block_id'].map(lambda bid: bid_to_ori[bid]['phi1'].values[0])
-            points_data['PHI'] = points_data['block_id'].map(lambda bid: bid_to_ori[bid]['PHI'].values[0])
-            points_data['phi2'] = points_data['block_id'].map(lambda bid: bid_to_ori[bid]['phi2'].values[0])
+            assigned_ori = np.concatenate([ori[['phi1', 'PHI', 'phi2']].to_numpy(dtype=float) for ori in chosen_ori])
 
         else:
             chosen_idx = np.random.randint(6)
             assigned_idx_list = []
-            assigned_ori = []
             for i in range(len(block_ids)):
                 trial_idx = [0, 1, 2, 3, 4, 5]
                 if i >= 1:
                     trial_idx.remove(assigned_idx_list[i - 1])
                 assigned_idx = np.random.choice(trial_idx, 1)[0]
                 assigned_idx_list.append(assigned_idx)
-                phi1, PHI, phi2 = self.comp_ori(chosen_idx, assigned_idx)
-                ori = [phi1, PHI, phi2]
-                assigned_ori.append(ori)
 
-            bid_to_ori = dict(zip(block_ids, assigned_ori))
-            points_data['phi1'] = points_data['block_id'].map(lambda bid: bid_to_ori[bid][0])
-            points_data['PHI'] = points_data['block_id'].map(lambda bid: bid_to_ori[bid][1])
-            points_data['phi2'] = points_data['block_id'].map(lambda bid: bid_to_ori[bid][2])
+            assigned_ori = self.comp_ori(chosen_idx, np.array(assigned_idx_list))
 
+        # one orientation per block, gathered to the points by the block codes
+        points_data['phi1'] = assigned_ori[codes, 0]
+        points_data['PHI'] = assigned_ori[codes, 1]
+        points_data['phi2'] = assigned_ori[codes, 2]
         self.points_data = points_data
         return self.points_data
 
     def comp_ori(self, chosen_idx, assigned_idx):
-        warnings.filterwarnings('ignore')
-        phi1 = self.pag_ori[0]
-        PHI = self.pag_ori[1]
-        phi2 = self.pag_ori[2]
-
-        R1 = np.array([[np.cos(np.deg2rad(phi1)), -np.sin(np.deg2rad(phi1)), 0],
-                       [np.sin(np.deg2rad(phi1)), np.cos(np.deg2rad(phi1)), 0],
-                       [0, 0, 1]])
-
-        R2 = np.array([[1, 0, 0],
-                       [0, np.cos(np.deg2rad(PHI)), -np.sin(np.deg2rad(PHI))],
-                       [0, np.sin(np.deg2rad(PHI)), np.cos(np.deg2rad(PHI))]])
-
-        R3 = np.array([[np.cos(np.deg2rad(phi2)), -np.sin(np.deg2rad(phi2)), 0],
-                       [np.sin(np.deg2rad(phi2)), np.cos(np.deg2rad(phi2)), 0],
-                       [0, 0, 1]])
-
-        result = np.dot(R3, R2)
-        R = np.matrix(np.dot(result, R1))
+        """
+        Orientation of the assigned variant(s) relative to the chosen variant of the packet
+        :param chosen_idx: index of the reference variant in self.variants
+        :param assigned_idx: index or array of indices of the assigned variants in self.variants
+        :return: (phi1, PHI, phi2) for a single index, (N, 3) array otherwise
+        """
         trial_variants = self.variants
-
+        # only the last digit of the variant name is used as index in T_list
         t1_idx = int(trial_variants[0, chosen_idx][-1])
-        T1 = np.matrix(T_list[t1_idx])
-        g = T1.I * R
-
-        assigned_v = trial_variants[0, assigned_idx]
-
-        t_idx = int(assigned_v[-1])
-        T = T_list[t_idx]
-        R = T * g
-
-        N, n, n1, n2 = 1, 1, 1, 1
-
-        if R[2, 2] > 1:
-            N = 1 / R[2, 2]
-
-        if R[2, 2] < -1:
-            N = -1 / R[2, 2]
-
-        R[2, 2] = N * R[2, 2]
-        PHIB = np.degrees(np.arccos(R[2, 2]))
-        sin_PHIB = np.sin(np.deg2rad(PHIB))
-
-        if R[2, 0] / sin_PHIB > 1 or R[2, 0] / sin_PHIB < -1:
-            n1 = sin_PHIB / R[2, 0]
-
-        if R[0, 2] / sin_PHIB > 1 or R[0, 2] / sin_PHIB < -1:
-            n2 = sin_PHIB / R[0, 2]
-
-        if abs(n1) > abs(n2):
-
-            n = n2
-
-        else:
-
-            n = n1
-
-        # recalculate after scaling
-        RB = N * n * R
-        PHIB = np.degrees(np.arccos(RB[2, 2]))
-        if PHIB < 0:
-            PHIB = PHIB + 360
-        sin_PHIB = np.sin(np.deg2rad(PHIB))
-        phi1B = np.degrees(np.arcsin(RB[2, 0] / sin_PHIB))
-        if phi1B < 0:
-            phi1B = phi1B + 360
-        phi2B = np.degrees(np.arcsin(RB[0, 2] / sin_PHIB))
-        if phi2B < 0:
-            phi2B = phi2B + 360
-
-        return phi1B, PHIB, phi2B
+        t_idx = np.array([int(v[-1]) for v in np.atleast_1d(trial_variants[0, assigned_idx])])
+        angles = ks_orientations(self.pag_ori, t_idx, parent_idx=np.full(t_idx.shape, t1_idx))
+        if np.ndim(assigned_idx) == 0:
+            return tuple(angles[0])
+        return angles
 
     def comp_angle(self, pag_ori, point_data):
 
-        i = int(str(point_data['block_variant']).lstrip('V')) - 1
-        T = T_list[i]
-        phi1 = pag_ori[0]
-        PHI = pag_ori[1]
-        phi2 = pag_ori[2]
-
-        R1 = np.array([[np.cos(np.deg2rad(phi1)), -np.sin(np.deg2rad(phi1)), 0],
-                       [np.sin(np.deg2rad(phi1)), np.cos(np.deg2rad(phi1)), 0],
-                       [0, 0, 1]])
-
-        R2 = np.array([[1, 0, 0],
-                       [0, np.cos(np.deg2rad(PHI)), -np.sin(np.deg2rad(PHI))],
-                       [0, np.sin(np.deg2rad(PHI)), np.cos(np.deg2rad(PHI))]])
-
-        R3 = np.array([[np.cos(np.deg2rad(phi2)), -np.sin(np.deg2rad(phi2)), 0],
-                       [np.sin(np.deg2rad(phi2)), np.cos(np.deg2rad(phi2)), 0],
-                       [0, 0, 1]])
-
-        result = np.dot(R3, R2)
-        R = np.matrix(np.dot(result, R1))
-
-        RB = T * R
-        N, n, n1, n2 = 1, 1, 1, 1
-
-        if RB[2, 2] > 1:
-            N = 1 / RB[2, 2]
-
-        if RB[2, 2] < -1:
-            N = -1 / RB[2, 2]
-
-        RB[2, 2] = N * RB[2, 2]
-        PHIB = np.degrees(np.arccos(RB[2, 2]))
-        sin_PHIB = np.sin(np.deg2rad(PHIB))
-
-        if RB[2, 0] / sin_PHIB > 1 or RB[2, 0] / sin_PHIB < -1:
-            n1 = sin_PHIB / RB[2, 0]
-
-        if RB[0, 2] / sin_PHIB > 1 or RB[0, 2] / sin_PHIB < -1:
-            n2 = sin_PHIB / RB[0, 2]
-
-        if abs(n1) > abs(n2):
-
-            n = n2
-
-        else:
-
-            n = n1
-
-        # recalculate after scaling
-        RB = N * n * RB
-        PHIB = np.degrees(np.arccos(RB[2, 2]))
-        if PHIB < 0:
-            PHIB = PHIB + 360
-        sin_PHIB = np.sin(np.deg2rad(PHIB))
-        phi1B = np.degrees(np.arcsin(RB[2, 0] / sin_PHIB))
-        if phi1B < 0:
-            phi1B = phi1B + 360
-        phi2B = np.degrees(np.arcsin(RB[0, 2] / sin_PHIB))
-        if phi2B < 0:
-            phi2B = phi2B + 360
-
-        return phi1B, PHIB, phi2B
+        i = variant_index(point_data['block_variant'])
+        return tuple(ks_orientations(pag_ori, [i])[0])
 
 
 if __name__ == '__main__':
@@ -1,37 +1,55 @@
 import sys
 
-import damask
 import pandas as pd
 import numpy as np
 import datetime
 from scipy.ndimage import shift
-from tkinter import messagebox
-from dragen.utilities.InputInfo import RveInfo
-from InputGenerator.C_WGAN_GP import WGANCGP
+from dragen.utilities.InputInfo import RveInfo, GenerationContext
+from dragen.utilities.seeding import random_seed
+from dragen.utilities.instrumentation import timed_stage
+from dragen.utilities.outofcore import voxel_array, copy_array, slabs, replace, label_counts
+# damask, tkinter and the WGAN (torch) are imported where they are used, so importing dragen (e.g. in every worker
+# process) does not load them for runs which don't need them
 
 
 class HelperFunctions:
     """Common Representative Volume Element (RVE) operations."""
 
-    def __init__(self, x_grid=None, y_grid=None, z_grid=None) -> None:
+    def __init__(self, x_grid=None, y_grid=None, z_grid=None, context=None) -> None:
 
         # The following variables are not available in InputInfo due to possible changes
         self.x_grid = x_grid
         self.y_grid = y_grid
         self.z_grid = z_grid
+        # parameters of the generation (a snapshot of RveInfo if none is given), activated by the methods decorated
+        # with in_context
+        self.context = context if context is not None else GenerationContext.from_rveinfo()
+
+    @staticmethod
+    def label_dtype(n_labels: int = 0) -> str:
+        """
+        integer type of the rve arrays for n_labels grains: int16 as long as the grain ids and the markers of the band
+        grains (down to -(1000 + n_labels)) fit, int32 otherwise
+        """
+        return 'int16' if n_labels + 1000 < np.iinfo(np.int16).max else 'int32'
 
     @staticmethod
     # TODO: implement array with real shape and change code to roll method rather than having 27 arrays sourrounding
-    def gen_array_new() -> np.zeros:
+    def gen_array_new(n_labels: int = 0) -> np.zeros:
+        """
+        :param n_labels: number of grains the array has to hold (see label_dtype)
+        """
+        # a memmap file in the out-of-core mode (RveInfo.memmap_flag)
+        dtype = HelperFunctions.label_dtype(n_labels)
         npts_x = RveInfo.n_pts
         if RveInfo.box_size_y is None and RveInfo.box_size_z is None:
-            array = np.zeros((npts_x, npts_x, npts_x), order='C', dtype='int16')
+            array = voxel_array((npts_x, npts_x, npts_x), dtype=dtype)
         elif RveInfo.box_size_y is not None and RveInfo.box_size_z is None:
-            array = np.zeros((npts_x, RveInfo.n_pts_y, npts_x), order='C', dtype='int16')
+            array = voxel_array((npts_x, RveInfo.n_pts_y, npts_x), dtype=dtype)
         elif RveInfo.box_size_y is None and RveInfo.box_size_z is not None:
-            array = np.zeros((npts_x, npts_x, RveInfo.n_pts_z), order='C', dtype='int16')
+            array = voxel_array((npts_x, npts_x, RveInfo.n_pts_z), dtype=dtype)
         else:
-            array = np.zeros((2 * npts_x, 2 * RveInfo.n_pts_y, 2 * RveInfo.n_pts_z), order='C', dtype='int16')
+            array = voxel_array((2 * npts_x, 2 * RveInfo.n_pts_y, 2 * RveInfo.n_pts_z), dtype=dtype)
         return array
 
     """@staticmethod
@@ -55,7 +73,10 @@ class HelperFunctions:
         return array
 
     @staticmethod
-    def gen_grid_new():
+    def gen_axes_new():
+        """
+        coordinates of the voxels along x, y and z (the axes of the grids of gen_grid_new)
+        """
         npts_x = RveInfo.n_pts
         n_x = RveInfo.n_pts
         n_y = RveInfo.n_pts
@@ -67,22 +88,31 @@ class HelperFunctions:
         shape = (n_x, n_y, n_z)
         if RveInfo.box_size_y is None and RveInfo.box_size_z is None:
             xyz = np.linspace(0, RveInfo.box_size, shape[0], endpoint=True, dtype=np.float32)
-            x_grid, y_grid, z_grid = np.meshgrid(xyz, xyz, xyz, indexing='ij')
+            axes = (xyz, xyz, xyz)
         elif RveInfo.box_size_y is not None and RveInfo.box_size_z is None:
             xz = np.linspace(0, RveInfo.box_size, shape[0], endpoint=True, dtype=np.float32)
             y = np.linspace(0, RveInfo.box_size_y, shape[1], endpoint=True, dtype=np.float32)
-            x_grid, y_grid, z_grid = np.meshgrid(xz, y, xz, indexing='ij')
+            axes = (xz, y, xz)
 
         elif RveInfo.box_size_y is None and RveInfo.box_size_z is not None:
             xy = np.linspace(0, RveInfo.box_size, shape[0], endpoint=True, dtype=np.float32)
             z = np.linspace(0, RveInfo.box_size_z, shape[2], endpoint=True, dtype=np.float32)
-            x_grid, y_grid, z_grid = np.meshgrid(xy, xy, z, indexing='ij')
+            axes = (xy, xy, z)
         else:
             x = np.linspace(0, RveInfo.box_size, shape[0], endpoint=True, dtype=np.float32)
             y = np.linspace(0, RveInfo.box_size_y, shape[1], endpoint=True, dtype=np.float32)
             z = np.linspace(0, RveInfo.box_size_z, shape[2], endpoint=True, dtype=np.float32)
-            x_grid, y_grid, z_grid = np.meshgrid(x, y, z, indexing='ij')
-        return x_grid, y_grid, z_grid
+            axes = (x, y, z)
+        return axes
+
+    @staticmethod
+    def gen_grid_new():
+        """
+        x_grid, y_grid and z_grid as read-only views of the float32 axes of gen_axes_new, the coordinates of a voxel
+        are only computed where they are used
+        """
+        axes = HelperFunctions.gen_axes_new()
+        return tuple(np.broadcast_arrays(*np.meshgrid(*axes, indexing='ij', sparse=True)))
 
     '''@staticmethod
     def gen_grid():
@@ -127,6 +157,7 @@ class HelperFunctions:
             if not RveInfo.gui_flag:
                 print('No "a" in given .csv-Inputfile! RVE-Generation was canceled!')
             else:
+                from tkinter import messagebox
                 messagebox.showinfo(message='No "a" in given .csv-Inputfile! RVE-Generation was canceled!',
                                     title='ERROR')
             RveInfo.LOGGER.info('ERROR: No "a" in given .csv-Inputfile! RVE-Generation was canceled!')
@@ -164,9 +195,10 @@ class HelperFunctions:
         else:
             RveInfo.LOGGER.info(
                 'No texture parameters (phi1, PHI, phi2) in given .csv-Inputfile! Assumption: random texture')
+            import damask
             i = 0
             while i < len(radius_a):
-                o = damask.Rotation.from_random(1).as_Euler_angles(degrees=True)  # Rotation based on Damask
+                o = damask.Rotation.from_random(1, rng_seed=random_seed()).as_Euler_angles(degrees=True)  # Rotation based on Damask
                 tex_phi1.append(float(o[:, 0]))
                 tex_PHI.append(float(o[:, 1]))
                 tex_phi2.append(float(o[:, 2]))
@@ -193,44 +225,32 @@ class HelperFunctions:
         ATTENTION: Assumes data like Area, Aspect Ratio, Slope (Angles)
             --> Not suitable if Gan is directly trained on axis sizes
         """
+        from InputGenerator.C_WGAN_GP import WGANCGP
         GAN = WGANCGP(df_list=[], storepath=RveInfo.store_path, num_features=3,
                       gen_iters=500000)
         # Load Data here
         GAN.load_trained_states(single=False, file_list=[file_name])
 
-        df = GAN.sample_batch(label=0, size=size)  # Man braucht hier auf jeden Fall Pandas > 1.15
+        sample = GAN.sample_batch(label=0, size=size, as_array=True)
+        sample = sample[~np.isnan(sample).any(axis=1)]
         # 1.) Switch the axis
         # locations: [Area, Aspect Ratio, Slope] - Sind so fixed
-        df2 = df.copy().dropna(axis=0)
-        columns = df2.columns
-        df2['Axes1'] = np.nan
-        df2['Axes2'] = np.nan
-        df2['Axes1'] = (df2[columns[0]] * df2[columns[1]] / np.pi) ** 0.5  # Major
-        df2['Axes2'] = df2[columns[0]] / (np.pi * df2['Axes1'])
+        area, aspect_ratio, slope = sample[:, 0], sample[:, 1], sample[:, 2]
+        axes1 = (area * aspect_ratio / np.pi) ** 0.5  # Major
+        axes2 = area / (np.pi * axes1)
         # Switch axis in 45 - 135
-        for j, row in df2.iterrows():
-            if 45 < row[2] <= 135:
-                temp1 = df2['Axes2'].iloc[j]
-                temp2 = df2['Axes1'].iloc[j]
-                df2['Axes1'].iloc[j] = temp1
-                df2['Axes2'].iloc[j] = temp2
-            else:
-                pass
+        switch = (slope > 45) & (slope <= 135)
+        axes1, axes2 = np.where(switch, axes2, axes1), np.where(switch, axes1, axes2)
         # Set c = a due to coming rotation - TODO: Setzt das voraus, muss bei den Trainingsdaten passen
-        df2['Axes3'] = df2['Axes1']
-        data = df2.copy()
-
-        if df.columns.__len__() <= 3:
-            o = damask.Rotation.from_random(data.__len__()).as_Euler_angles(degrees=True)
-            data['phi1'] = o[:, 0]
-            data['PHI'] = o[:, 1]
-            data['phi2'] = o[:, 2]
-            data = data[[data.columns[2], data.columns[3], data.columns[4], data.columns[5],
-                         data.columns[6], data.columns[7], data.columns[8]]]
+        axes3 = axes1
+
+        if sample.shape[1] <= 3:
+            import damask
+            o = damask.Rotation.from_random(sample.shape[0], rng_seed=random_seed()).as_Euler_angles(degrees=True)
         else:
-            data = data[[data.columns[2], data.columns[6], data.columns[7], data.columns[8],
-                        data.columns[3], data.columns[4], data.columns[5]]]
-        data.columns = ['alpha', 'a', 'b', 'c', 'phi1', 'PHI', 'phi2']
+            o = sample[:, 3:6]
+        data = pd.DataFrame({'alpha': slope, 'a': axes1, 'b': axes2, 'c': axes3,
+                             'phi1': o[:, 0], 'PHI': o[:, 1], 'phi2': o[:, 2]})
 
         if dimension == 3:
             return data
@@ -338,14 +358,12 @@ class HelperFunctions:
         radius_b : Integer, radius along z-axis
         """
         #vol = 4/3*np.pi*radius_b*radius_b*radius_c
-        array = self.gen_array_new()
-        ellipsoid = self.ellipsoid(radius_a, radius_b, radius_c)
-        inside = ellipsoid <= 1
-        array[inside] = 1
+        # the voxels of the ellipsoid are counted in its bounding box
+        n_voxels = sum(np.count_nonzero(inside) for *_, inside in self.ellipsoid_blocks(radius_a, radius_b, radius_c))
         if RveInfo.low_rsa_resolution:
-            d_vol = np.count_nonzero(array)*(2*RveInfo.bin_size)**3
+            d_vol = n_voxels*(2*RveInfo.bin_size)**3
         else:
-            d_vol = np.count_nonzero(array) * (RveInfo.bin_size) ** 3
+            d_vol = n_voxels * (RveInfo.bin_size) ** 3
         return d_vol
 
     def convert_volume_2D(self, radius_a, radius_b):
@@ -594,8 +612,18 @@ class HelperFunctions:
     # TODO: wird in neuer Version glaub ich nicht notwendig sein
     def gen_boundaries_3D(self, points_array) -> np.ndarray:
         t_0 = datetime.datetime.now()
-        box_size = RveInfo.box_size
         x_grid, y_grid, z_grid = self.gen_grid_new()
+        # slab by slab in the out-of-core mode, the whole array at once otherwise
+        for slab in slabs(points_array.shape):
+            self.label_boundaries_3D(points_array[slab], x_grid[slab], y_grid[slab], z_grid[slab])
+
+        time_elapse = datetime.datetime.now() - t_0
+        if RveInfo.debug:
+            RveInfo.LOGGER.info('time spent on gen_boundaries: {}'.format(time_elapse.total_seconds()))
+        return points_array
+
+    def label_boundaries_3D(self, points_array, x_grid, y_grid, z_grid):
+        box_size = RveInfo.box_size
 
         """
         Each region around the RVE needs to be labled on order to move grainparts
@@ -817,11 +845,6 @@ class HelperFunctions:
             points_array[(x_grid > 0) & (y_grid > box_size_y) & (z_grid > box_size_z)] = -25
             points_array[(x_grid > box_size) & (y_grid > box_size_y) & (z_grid > box_size_z)] = -26
 
-        time_elapse = datetime.datetime.now() - t_0
-        if RveInfo.debug:
-            RveInfo.LOGGER.info('time spent on gen_boundaries: {}'.format(time_elapse.total_seconds()))
-        return points_array
-
     def repair_periodicity_2D(self, rve_array: np.ndarray) -> pd.DataFrame:
 
         start1 = int(rve_array.shape[0] / 4)
@@ -863,53 +886,67 @@ class HelperFunctions:
 
         return rve
 
-    def repair_periodicity_3D_new(self, rve_array: np.ndarray):
+    @timed_stage('repair_periodicity_3D_new', counts=lambda result, self, rve_array: {'voxels': result.size})
+    def repair_periodicity_3D_new(self, rve_array: np.ndarray) -> np.ndarray:
         """this function is used to mirror the three masterfaces on the three slave faces of the rve
-        in order to achieve exact periodicity"""
-        # load some variables
-        box_size = RveInfo.box_size
-
+        in order to achieve exact periodicity
+        The periodic rve has the integer type of rve_array (a memmap file in the out-of-core mode, see
+        RveInfo.memmap_flag), the voxel table of the meshers is generated from it with voxel_table"""
         if RveInfo.box_size_y is None and RveInfo.box_size_z is None:
-            rve = np.zeros((rve_array.shape[0] + 1, rve_array.shape[1] + 1, rve_array.shape[2] + 1))
+            rve = voxel_array((rve_array.shape[0] + 1, rve_array.shape[1] + 1, rve_array.shape[2] + 1),
+                              dtype=rve_array.dtype, name='periodic_rve')
             rve[0:-1, 0:-1, 0:-1] = rve_array
             rve[-1, :, :] = rve[0, :, :]
             rve[:, -1, :] = rve[:, 0, :]
             rve[:, :, -1] = rve[:, :, 0]
-            rve_x = np.linspace(0, RveInfo.box_size, rve_array.shape[0] + 1, endpoint=True)
-            rve_y = np.linspace(0, RveInfo.box_size, rve_array.shape[1] + 1, endpoint=True)
-            rve_z = np.linspace(0, RveInfo.box_size, rve_array.shape[2] + 1, endpoint=True)
 
         elif RveInfo.box_size_y is not None and RveInfo.box_size_z is None:
-            rve = np.zeros((rve_array.shape[0] + 1, rve_array.shape[1], rve_array.shape[2] + 1))
+            rve = voxel_array((rve_array.shape[0] + 1, rve_array.shape[1], rve_array.shape[2] + 1),
+                              dtype=rve_array.dtype, name='periodic_rve')
             rve[0:-1, :, 0:-1] = rve_array
             rve[-1, :, :] = rve[0, :, :]
             rve[:, :, -1] = rve[:, :, 0]
-            rve_x = np.linspace(0, RveInfo.box_size, rve_array.shape[0] + 1, endpoint=True)
-            rve_y = np.linspace(0, RveInfo.box_size_y, rve_array.shape[1], endpoint=True)
-            rve_z = np.linspace(0, RveInfo.box_size, rve_array.shape[2] + 1, endpoint=True)
 
         elif RveInfo.box_size_y is None and RveInfo.box_size_z is not None:
-            rve = np.zeros((rve_array.shape[0] + 1, rve_array.shape[2] + 1, rve_array.shape[2]))
+            rve = voxel_array((rve_array.shape[0] + 1, rve_array.shape[2] + 1, rve_array.shape[2]),
+                              dtype=rve_array.dtype, name='periodic_rve')
             rve[0:-1, 0:-1, :] = rve_array
             rve[-1, :, :] = rve[0, :, :]
             rve[:, -1, :] = rve[:, 0, :]
-            rve_x = np.linspace(0, RveInfo.box_size, rve_array.shape[0] + 1, endpoint=True)
-            rve_y = np.linspace(0, RveInfo.box_size, rve_array.shape[1] + 1, endpoint=True)
-            rve_z = np.linspace(0, RveInfo.box_size_z, rve_array.shape[2] , endpoint=True)
 
         else:
             rve = rve_array
-            rve_x = np.linspace(0, RveInfo.box_size, rve_array.shape[0], endpoint=True)
-            rve_y = np.linspace(0, RveInfo.box_size_y, rve_array.shape[1] , endpoint=True)
-            rve_z = np.linspace(0, RveInfo.box_size_z, rve_array.shape[2] , endpoint=True)
 
-        xx, yy, zz = np.meshgrid(rve_x, rve_y, rve_z, indexing='ij')
-        rve_dict = {'x': xx.flatten(), 'y': yy.flatten(), 'z': zz.flatten(), 'GrainID': rve.flatten()}
-        rve_df = pd.DataFrame(rve_dict)
-        rve_df['box_size'] = box_size
-        rve_df['n_pts'] = RveInfo.n_pts
+        return rve
+
+    @staticmethod
+    def voxel_table(periodic_rve: np.ndarray, phases: np.ndarray) -> pd.DataFrame:
+        """
+        one row per voxel of the periodic rve (x, y, z, GrainID, box_size, n_pts, phaseID) for the abaqus and moose
+        meshers and the substructure generation. The coordinates are float32 (float64 for the substructure, it
+        measures distances with them), GrainID has the type of periodic_rve and phaseID is int8
+        :param phases: phaseID of every grain id (index = GrainID, phases[0] = 0), other grain ids get phase 0
+        """
+        sizes = (RveInfo.box_size,
+                 RveInfo.box_size if RveInfo.box_size_y is None else RveInfo.box_size_y,
+                 RveInfo.box_size if RveInfo.box_size_z is None else RveInfo.box_size_z)
+        coordinate_dtype = np.float64 if RveInfo.subs_flag else np.float32
+        axes = [np.linspace(0, size, n, endpoint=True).astype(coordinate_dtype)
+                for size, n in zip(sizes, periodic_rve.shape)]
+        # the voxels in c order, x changes slowest
+        shape = periodic_rve.shape
+        labels = np.asarray(periodic_rve).reshape(-1)
+        rve_df = pd.DataFrame({'x': np.repeat(axes[0], shape[1] * shape[2]),
+                               'y': np.tile(np.repeat(axes[1], shape[2]), shape[0]),
+                               'z': np.tile(axes[2], shape[0] * shape[1]),
+                               'GrainID': labels})
+        rve_df['box_size'] = RveInfo.box_size
+        rve_df['n_pts'] = np.int32(RveInfo.n_pts)
+        # negative ids are clipped to phases[0], too large ids to the appended 0
+        phases = np.append(np.asarray(phases, dtype=np.int8), np.int8(0))
+        rve_df['phaseID'] = np.take(phases, labels, mode='clip')
+        return rve_df
 
-        return rve_df, rve
     def repair_periodicity_3D(self, rve_array: np.ndarray):
         """this function is used to mirror the three masterfaces on the three slave faces of the rve
         in order to achieve exact periodicity"""
@@ -1006,10 +1043,8 @@ class HelperFunctions:
 
         return ellipse
 
-    def ellipsoid(self, a, b, c, alpha=0):
-        
-        x_grid, y_grid, z_grid = self.gen_grid_new()
-
+    @staticmethod
+    def ellipsoid_center():
         x_0 = int(float(RveInfo.box_size) /2)
         y_0 = int(float(RveInfo.box_size) / 2)
         z_0 = int(float(RveInfo.box_size) / 2)
@@ -1018,6 +1053,16 @@ class HelperFunctions:
             y_0 = int(float(RveInfo.box_size_y) / 2)
         if RveInfo.box_size_z is not None:
             z_0 = int(float(RveInfo.box_size_z) / 2)
+        return x_0, y_0, z_0
+
+    def ellipsoid(self, a, b, c, alpha=0, grids=None):
+        """
+        :param grids: x_grid, y_grid and z_grid the ellipsoid is evaluated on, default the grids of gen_grid_new.
+        Broadcastable grids (e.g. of a part of the axes) give the same values as the corresponding part of the full grid
+        """
+        x_grid, y_grid, z_grid = self.gen_grid_new() if grids is None else grids
+
+        x_0, y_0, z_0 = self.ellipsoid_center()
 
         # rotation around z-axis
         ellipsoid = 1 / a ** 2 * ((x_grid - x_0) * np.cos(np.deg2rad(alpha+RveInfo.slope_offset)) +
@@ -1027,6 +1072,58 @@ class HelperFunctions:
                     1 / c ** 2 * (z_grid - z_0) ** 2
         return ellipsoid
 
+    def ellipsoid_blocks(self, a, b, c, alpha=0):
+        """
+        evaluates the ellipsoid only in its bounding box, in blocks of at most RveInfo.memmap_chunk voxels
+        yields (rows, cols, layers, inside): the indices of the block along x, y and z in the grid of gen_grid_new and
+        ellipsoid <= 1 in the block. All voxels outside of the blocks are outside of the ellipsoid
+        """
+        x, y, z = self.gen_axes_new()
+        x_0, y_0, z_0 = self.ellipsoid_center()
+        # the rotation is around z, two voxels margin against rounding
+        r_xy = max(a, b) + 2 * RveInfo.bin_size
+        r_z = c + 2 * RveInfo.bin_size
+        rows = np.flatnonzero(np.abs(x - x_0) <= r_xy)
+        cols = np.flatnonzero(np.abs(y - y_0) <= r_xy)
+        layers = np.flatnonzero(np.abs(z - z_0) <= r_z)
+        if len(rows) == 0 or len(cols) == 0 or len(layers) == 0:
+            return
+        step = max(1, RveInfo.memmap_chunk // (len(cols) * len(layers)))
+        for start in range(0, len(rows), step):
+            block_rows = rows[start:start + step]
+            grids = (x[block_rows][:, None, None], y[cols][None, :, None], z[layers][None, None, :])
+            yield block_rows, cols, layers, self.ellipsoid(a, b, c, alpha=alpha, grids=grids) <= 1
+
+    def periodic_grain_blocks(self, a, b, c, x_0, y_0, z_0, shape, alpha=0, grain_id=1, single_voxel=False):
+        """
+        ellipsoid and make_periodic_3D_new without full size temporaries: yields (index, inside) for the blocks of the
+        periodic grain at the voxel (x_0, y_0, z_0) of an rve with shape, rve[index] is the block and inside the voxels
+        of the grain in it. In a cubic box the grain is only evaluated in its bounding box (ellipsoid_blocks) and the
+        blocks are moved like np.roll moves the whole grain, other box shapes are shifted on the whole grid as before
+        :param grain_id: value of the grain for make_periodic_3D_new (it interpolates the shifted grain)
+        :param single_voxel: grains without any voxel get the voxel at (x_0, y_0, z_0) of the unshifted grain (as in
+        DiscreteRsa3D.run_rsa)
+        """
+        if RveInfo.box_size_y is not None or RveInfo.box_size_z is not None:
+            ellipsoid = self.ellipsoid(a, b, c, alpha=alpha)
+            grain = np.zeros_like(ellipsoid, dtype=self.label_dtype(grain_id))
+            grain[ellipsoid <= 1] = grain_id
+            del ellipsoid
+            if single_voxel and np.count_nonzero(grain) == 0:
+                grain[x_0, y_0, z_0] = grain_id
+            periodic_grain = self.make_periodic_3D_new(grain, x_0, y_0, z_0)
+            for slab in slabs(periodic_grain.shape):
+                yield slab, periodic_grain[slab] == grain_id
+            return
+
+        empty = True
+        for rows, cols, layers, inside in self.ellipsoid_blocks(a, b, c, alpha=alpha):
+            empty = empty and not inside.any()
+            yield np.ix_((rows + x_0) % shape[0], (cols + y_0) % shape[1], (layers + z_0) % shape[2]), inside
+        if single_voxel and empty:
+            yield np.ix_([(2 * x_0) % shape[0]], [(2 * y_0) % shape[1]], [(2 * z_0) % shape[2]]), \
+                np.ones((1, 1, 1), dtype=bool)
+
     def process_df(self, df, shrink_factor: float) -> pd.DataFrame:
         discrete_vol = list()
         df.reset_index(inplace=True, drop=True)
@@ -1087,18 +1184,18 @@ class HelperFunctions:
         """
         start = grains_df['GrainID'].max() + 1  # First occupied value
 
-        rsa = rsa.copy()
+        rsa = copy_array(rsa, name='rsa')
 
         for i in bands_df['GrainID']:
             j = i + 1
-            rsa[np.where(rsa == -(1000 + j))] = start + j
+            replace(rsa, -(1000 + j), start + j)
         return rsa
 
     def get_final_disc_vol_3D(self, grains_df: pd.DataFrame, rve: np.ndarray) -> pd.DataFrame:
         grains_df.sort_values(by=['GrainID'], inplace=True)
-        disc_vols = np.zeros((1, grains_df.shape[0])).flatten().tolist()
-        for i in range(len(grains_df)):
-            disc_vols[i] = np.count_nonzero(rve == i+1) * RveInfo.bin_size**3
+        # one pass over the rve instead of one per grain
+        counts = label_counts(rve, len(grains_df))
+        disc_vols = [int(counts[i + 1]) * RveInfo.bin_size**3 for i in range(len(grains_df))]
 
         grains_df['final_discrete_volume'] = disc_vols
         grains_df.sort_values(by='final_conti_volume', inplace=True, ascending=False)
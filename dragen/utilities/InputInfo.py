@@ -1,12 +1,17 @@
 import math
+import copy
 import logging
 import typing
+import functools
+import types
 import numpy as np
 
 
 class RveInfo:
     """
     This class stores all the constant values which are needed for the current RVE-Generation.
+    The values of one generation are snapshotted into an immutable GenerationContext (see below), which writes them
+    back into RveInfo when the generation runs.
     If one of theses Parameters is needed in any of the following classes/modules/functions for generating the RVE
     it can be called by importing this class as follows:
     from InputInfo import RveInfo
@@ -174,6 +179,32 @@ class RveInfo:
     root: str = './'
     """root path"""
 
+    seed: int = None
+    """seed of the whole generation, None for random results (see dragen.utilities.seeding)"""
+
+    rve_seed: int = None
+    """seed of the current rve, derived from seed. Every stage of the generation is seeded from it"""
+
+    checkpoint_flag: bool = False
+    """If set to True a checkpoint is written after rsa, tesselation, inclusions and periodicity (3D only)"""
+
+    checkpoint_path: str = None
+    """directory of the checkpoints, root/Checkpoints if None"""
+
+    resume: bool = False
+    """If set to True the latest checkpoint of the same inputs is loaded and only the following stages run"""
+
+    from_stage: str = None
+    """stage to rerun from ('rsa', 'tesselation', 'inclusions', 'periodicity', 'export'), the stages before it are
+    loaded from their checkpoints"""
+
+    memmap_flag: bool = False
+    """If set to True the rve arrays of the 3D generation are memory mapped files in store_path/Memmap and the stages
+    work on chunks of them, for rves which don't fit in memory (see dragen.utilities.outofcore)"""
+
+    memmap_chunk: int = 2 ** 24
+    """maximal number of voxels the stages process at once if memmap_flag is set"""
+
     PHASENUM = {'Ferrite': 1, 'Martensite': 2, 'Pearlite': 3, 'Bainite': 4, 'Austenite': 5, 'Inclusions': 6, 'Bands': 7}
     """Numbers linked to currently defined phases"""
 
@@ -210,3 +241,129 @@ class RveInfo:
 
     SHRINK_FACTOR: float = np.cbrt(0.3)
     """factor by which all ellipsoids are shrinked before beeing placed in the volume"""
+
+
+RUNTIME_ATTRIBUTES = ('LOGGER', 'RESULT_LOG', 'infobox_obj', 'progress_obj', 'sub_run', 'rve_data_substructure')
+"""RveInfo attributes that are runtime objects (loggers, GUI handles, results) and not part of a GenerationContext"""
+
+_APPLIED_CONTEXT = None
+"""the GenerationContext whose values RveInfo holds at the moment, see GenerationContext.activate"""
+
+
+def frozen(value):
+    """
+    read-only version of a context value: dicts become mappingproxies, lists tuples, sets frozensets and arrays
+    read-only copies (recursively), everything else is returned unchanged
+    """
+    if isinstance(value, dict):
+        return types.MappingProxyType({key: frozen(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(frozen(item) for item in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(value)
+    if isinstance(value, np.ndarray):
+        value = value.copy()
+        value.flags.writeable = False
+    return value
+
+
+class GenerationContext:
+    """
+    Immutable and picklable snapshot of all parameters of one RVE generation. It is passed explicitly to DataTask3D,
+    DataTask2D, the rsa, the tesselation, the meshers and the exporters, which read their parameters from
+    self.context, and worker processes only need the pickled context instead of the whole setup of dragen.run.Run.
+    The values are plain attributes (as fast to read as RveInfo), mutable values are stored read-only (see frozen).
+    The context does not make a generation independent of the process: the helper functions, the substructure, the
+    checkpoints and the postprocessing still read RveInfo, which activate() fills with the values of the context, and
+    seed_stage reseeds the global random generators. One process runs one generation at a time, generations in
+    parallel need their own process (see Run.run_batch).
+    usage:
+    context = GenerationContext.from_rveinfo()
+    box_size = context.box_size
+    """
+    __slots__ = ('_source', '__dict__')
+
+    def __init__(self, values: dict):
+        source = copy.deepcopy(dict(values))
+        object.__setattr__(self, '_source', source)
+        for name, value in source.items():
+            object.__setattr__(self, name, frozen(value))
+
+    @classmethod
+    def from_rveinfo(cls, **changes):
+        """
+        snapshot of the current values of RveInfo
+        :param changes: values to replace in the snapshot
+        """
+        values = {name: value for name, value in vars(RveInfo).items()
+                  if not name.startswith('_') and name not in RUNTIME_ATTRIBUTES}
+        values.update(changes)
+        return cls(values)
+
+    @property
+    def values(self) -> types.MappingProxyType:
+        return types.MappingProxyType(self.__dict__)
+
+    def __getattr__(self, name):
+        raise AttributeError("GenerationContext has no value '{}'".format(name))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('GenerationContext is immutable, use replace() to get a changed copy')
+
+    def __delattr__(self, name):
+        raise AttributeError('GenerationContext is immutable')
+
+    def __reduce__(self):
+        return self.__class__, (self._source,)
+
+    def __repr__(self):
+        return 'GenerationContext(dimension={}, box_size={}, resolution={}, store_path={})'.format(
+            self._source.get('dimension'), self._source.get('box_size'), self._source.get('resolution'),
+            self._source.get('store_path'))
+
+    def replace(self, **changes):
+        """
+        copy of the context with the given values changed
+        """
+        values = dict(self._source)
+        values.update(changes)
+        return self.__class__(values)
+
+    def as_dict(self) -> dict:
+        """
+        mutable copy of the values
+        """
+        return copy.deepcopy(self._source)
+
+    def apply(self):
+        """
+        writes (copies of) the values into the class attributes of RveInfo, e.g. at the start of a worker process
+        """
+        global _APPLIED_CONTEXT
+        for name, value in self.as_dict().items():
+            setattr(RveInfo, name, value)
+        _APPLIED_CONTEXT = self
+
+    def activate(self):
+        """
+        applies the context to RveInfo unless it is the last applied one, so values written to RveInfo in between
+        are kept until another context is activated
+        """
+        if _APPLIED_CONTEXT is not self:
+            self.apply()
+
+
+def in_context(method):
+    """
+    decorator for methods of the pipeline classes: activates self.context (the context keyword for __init__) before
+    the method runs
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        context = getattr(self, 'context', None)
+        if context is None:
+            context = kwargs.get('context')
+        if context is not None:
+            context.activate()
+        return method(self, *args, **kwargs)
+    return wrapper
@@ -4,13 +4,19 @@ import pyvista as pv
 import sys
 import logging
 import tetgen
-from dragen.utilities.InputInfo import RveInfo
+from dragen.utilities.InputInfo import RveInfo, GenerationContext, in_context
+from dragen.utilities.instrumentation import timed_stage
+from dragen.utilities.progress import Progress
 from perlin_noise import PerlinNoise
 
 
 class MeshingHelper:
-    def __init__(self, rve_shape: tuple = None, rve: pd.DataFrame = None, grains_df: pd.DataFrame = None):
+    @in_context
+    def __init__(self, rve_shape: tuple = None, rve: pd.DataFrame = None, grains_df: pd.DataFrame = None,
+                 context=None):
 
+        # parameters of the generation (a snapshot of RveInfo if none is given)
+        self.context = context if context is not None else GenerationContext.from_rveinfo()
         self.rve = rve
         self.grains_df = grains_df
 
@@ -28,18 +34,18 @@ class MeshingHelper:
         else:
             self.bin_size = rve.box_size / self.n_pts_x  # test
 
-        if RveInfo.box_size_y is not None:
-            self.box_size_y = RveInfo.box_size_y
+        if self.context.box_size_y is not None:
+            self.box_size_y = self.context.box_size_y
             self.n_pts_y = rve_shape[1]
         else:
-            self.box_size_y = RveInfo.box_size
+            self.box_size_y = self.context.box_size
             self.n_pts_y = self.n_pts_x
 
-        if RveInfo.box_size_z is not None:
-            self.box_size_z = RveInfo.box_size_z
+        if self.context.box_size_z is not None:
+            self.box_size_z = self.context.box_size_z
             self.n_pts_z = rve_shape[2]
         else:
-            self.box_size_z = RveInfo.box_size
+            self.box_size_z = self.context.box_size
             self.n_pts_z = self.n_pts_x
 
 
@@ -47,7 +53,7 @@ class MeshingHelper:
 
         """this function generates a structured grid
         in py-vista according to the rve"""
-        xrng = np.linspace(0, RveInfo.box_size/1000, self.n_pts_x+1, endpoint=True)
+        xrng = np.linspace(0, self.context.box_size/1000, self.n_pts_x+1, endpoint=True)
         yrng = np.linspace(0, self.box_size_y/1000, self.n_pts_y+1, endpoint=True)
         zrng = np.linspace(0, self.box_size_z/1000, self.n_pts_z+1, endpoint=True)
         grid = pv.RectilinearGrid(xrng, yrng, zrng)
@@ -61,15 +67,14 @@ class MeshingHelper:
         # Add the data values to the cell data
         grid.cell_data["GrainID"] = self.rve['GrainID'].to_numpy()
         grid.cell_data["phaseID"] = self.rve['phaseID'].to_numpy()
-        print(self.rve['phaseID'])
         # Now plot the grid!
-        if RveInfo.anim_flag:
+        if self.context.anim_flag:
             plotter = pv.Plotter(off_screen=True)
             plotter.add_mesh(grid, scalars='phaseID',
                              show_edges=True, interpolate_before_map=True)
             plotter.add_axes()
             plotter.show(interactive=True, auto_close=True, window_size=[800, 600],
-                         screenshot=RveInfo.store_path + '/Figs/pyvista_Hex_Mesh_phases.png')
+                         screenshot=self.context.store_path + '/Figs/pyvista_Hex_Mesh_phases.png')
             plotter.close()
 
             plotter = pv.Plotter(off_screen=True)
@@ -77,7 +82,7 @@ class MeshingHelper:
                              show_edges=True, interpolate_before_map=True)
             plotter.add_axes()
             plotter.show(interactive=True, auto_close=True, window_size=[800, 600],
-                         screenshot=RveInfo.store_path + '/Figs/pyvista_Hex_Mesh_grains.png')
+                         screenshot=self.context.store_path + '/Figs/pyvista_Hex_Mesh_grains.png')
             plotter.close()
 
         return grid
@@ -107,8 +112,10 @@ class MeshingHelper:
         return grid
         #grid.plot(show_grid=True, show_edges=True)
 
+    @timed_stage('smoothen_mesh', counts=lambda result, *args, **kwargs: {'elements': result.n_cells,
+                                                                          'nodes': result.n_points})
     def smoothen_mesh(self, grid: pv.UnstructuredGrid, n_iter: int) -> pv.UnstructuredGrid:
-        if not RveInfo.smoothing_flag:
+        if not self.context.smoothing_flag:
             n_iter = 0
         """information about grainboundary elements of hex-mesh
         is extracted here and stored in pv.Polydata and
@@ -127,10 +134,11 @@ class MeshingHelper:
         pid_list = list()
 
         ######################################
-        assert RveInfo.element_type in ['C3D8', 'HEX8', 'C3D10', 'C3D4']
-        if RveInfo.element_type != 'C3D8' and RveInfo.element_type != 'HEX8':
+        assert self.context.element_type in ['C3D8', 'HEX8', 'C3D10', 'C3D4']
+        if self.context.element_type != 'C3D8' and self.context.element_type != 'HEX8':
             old_grid = grid.copy()
             grid_tet = pv.UnstructuredGrid()
+            progress = Progress('tetrahedral_mesh', total=numberOfGrains).start()
             for i in range(1, numberOfGrains + 1):
                 phase = self.rve.loc[self.rve['GrainID'] == i].phaseID.values[0]
                 grain_grid_tet = old_grid.extract_cells(np.where(np.asarray(old_grid.cell_data.values())[0] == i))
@@ -138,17 +146,16 @@ class MeshingHelper:
                 grain_surf_tet.triangulate(inplace=True)
 
                 tet = tetgen.TetGen(grain_surf_tet)
-                if RveInfo.element_type == 'C3D4':
+                if self.context.element_type == 'C3D4':
                     tet.tetrahedralize(order=1, mindihedral=10, minratio=1.5, supsteiner_level=0, steinerleft=0)
-                elif RveInfo.element_type == 'C3D10':
+                elif self.context.element_type == 'C3D10':
                     sys.exit('Element type Error! C3D10 currently not supported! Chose C3D4')
                     node, elem = tet.tetrahedralize(order=2, mindihedral=10, minratio=1.5, supsteiner_level=0, steinerleft=0)
 
                 tet_grain_grid = tet.grid
                 ncells = tet_grain_grid.n_cells
 
-                if RveInfo.gui_flag:
-                    RveInfo.progress_obj.emit(75+(100*(i+1)/self.n_grains/4))
+                progress.update(i)
                 grainIDList = [i]
                 grainID_array = grainIDList * ncells
                 gid_list.extend(grainID_array)
@@ -160,6 +167,7 @@ class MeshingHelper:
                     grid_tet = tet_grain_grid
                 else:
                     grid_tet = tet_grain_grid.merge(grid_tet, merge_points=True)
+            progress.finish(elements=grid_tet.n_cells)
 
             grid_tet.cell_data['GrainID'] = np.asarray(gid_list)
             grid_tet.cell_data['phaseID'] = np.asarray(pid_list)
@@ -196,7 +204,7 @@ class MeshingHelper:
             self.grains_df.loc[self.grains_df['GrainID'] == i, 'meshed_conti_volume'] = grain_vol * 10 ** 9
 
         self.grains_df[['GrainID', 'meshed_conti_volume', 'phaseID']].\
-            to_csv(RveInfo.store_path + '/Generation_Data/grain_data_output_conti.csv', index=False)
+            to_csv(self.context.store_path + '/Generation_Data/grain_data_output_conti.csv', index=False)
 
         all_points_df.loc[all_points_df_old['x_min'], 'x'] = x_min
         all_points_df.loc[all_points_df_old['y_min'], 'y'] = y_min
@@ -0,0 +1,166 @@
+"""
+Content addressed checkpoints of the stages of DataTask3D.rve_generation. The key of a checkpoint is a hash of the
+sampled grains, the seed of the rve and the RveInfo fields the stages depend on, so a checkpoint is only loaded for
+exactly the same inputs. Options which only change the meshing or the export are not part of the key, so a changed
+mesher setting or a crash in the mesher can be resumed from the last checkpoint without redoing rsa and tesselation.
+Every checkpoint is one compressed .npz file with the rve array and the grain tables of the stage.
+"""
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+from dragen.utilities.InputInfo import RveInfo
+from dragen.utilities.progress import notify
+
+CHECKPOINT_STAGES = ('rsa', 'tesselation', 'inclusions', 'periodicity')
+"""stages of DataTask3D.rve_generation after which a checkpoint is written, in the order they run"""
+
+KEY_ATTRIBUTES = ('dimension', 'box_size', 'box_size_y', 'box_size_z', 'box_volume', 'resolution', 'low_rsa_resolution',
+                  'n_pts', 'n_pts_y', 'n_pts_z', 'bin_size', 'slope_offset', 'allowed_intersection_ratio',
+                  'number_of_bands', 'bandwidths', 'lower_band_bound', 'upper_band_bound', 'band_orientation',
+                  'band_filling', 'band_ratio_final', 'phase_ratio', 'PHASENUM', 'SHRINK_FACTOR', 'rve_seed')
+"""RveInfo fields the checkpointed stages (and the helpers they call) depend on"""
+
+
+class StageCheckpoints:
+    """
+    usage in rve_generation:
+    checkpoints = StageCheckpoints(total_df)
+    stage, state = checkpoints.resume()  # latest valid checkpoint or (None, None)
+    ...
+    checkpoints.save('rsa', state)
+    """
+
+    def __init__(self, total_df: pd.DataFrame, path: str = None):
+        """
+        :param total_df: sampled grains, the input of the first stage
+        :param path: directory of the checkpoints, default RveInfo.checkpoint_path or root/Checkpoints
+        """
+        if path is None:
+            path = RveInfo.checkpoint_path if RveInfo.checkpoint_path is not None else RveInfo.root + '/Checkpoints'
+        self.path = path
+        self.base_key = self.input_key(total_df)
+
+    @staticmethod
+    def input_key(total_df: pd.DataFrame) -> str:
+        """
+        sha256 of the grain table and the KEY_ATTRIBUTES of RveInfo
+        """
+        sha = hashlib.sha256()
+        sha.update(json.dumps([str(column) for column in total_df.columns]).encode())
+        sha.update(pd.util.hash_pandas_object(total_df, index=True).to_numpy().tobytes())
+        for name in KEY_ATTRIBUTES:
+            value = getattr(RveInfo, name)
+            sha.update(name.encode())
+            if isinstance(value, np.ndarray):
+                sha.update(str(value.dtype).encode())
+                sha.update(np.ascontiguousarray(value).tobytes())
+            else:
+                sha.update(repr(value).encode())
+        return sha.hexdigest()
+
+    def key(self, stage: str) -> str:
+        return hashlib.sha256('{}:{}'.format(self.base_key, stage).encode()).hexdigest()[:32]
+
+    def file(self, stage: str) -> str:
+        return os.path.join(self.path, '{}_{}.npz'.format(stage, self.key(stage)))
+
+    def save(self, stage: str, state: dict):
+        """
+        writes the state after stage. Arrays and lists are stored as arrays, DataFrames column by column, scalars
+        as 0-d arrays. The file is written under a temporary name and renamed, so a crash never leaves a broken
+        checkpoint behind
+        """
+        if not RveInfo.checkpoint_flag:
+            return
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+
+        arrays = dict()
+        meta = {'stage': stage, 'key': self.key(stage), 'entries': dict(), 'columns': dict()}
+        for name, value in state.items():
+            if value is None:
+                meta['entries'][name] = 'none'
+            elif isinstance(value, pd.DataFrame):
+                meta['entries'][name] = 'frame'
+                meta['columns'][name] = [str(column) for column in value.columns]
+                arrays[name + '/__index__'] = value.index.to_numpy()
+                for i, column in enumerate(value.columns):
+                    arrays['{}/{}'.format(name, i)] = value[column].to_numpy()
+            elif isinstance(value, list):
+                meta['entries'][name] = 'list'
+                arrays[name] = np.asarray(value)
+            elif isinstance(value, np.ndarray):
+                meta['entries'][name] = 'array'
+                arrays[name] = value
+            else:
+                meta['entries'][name] = 'scalar'
+                arrays[name] = np.asarray(value)
+        arrays['__meta__'] = np.asarray(json.dumps(meta))
+
+        file = self.file(stage)
+        tmp_file = file[:-len('.npz')] + '.tmp-{}.npz'.format(os.getpid())
+        np.savez_compressed(tmp_file, **arrays)
+        os.replace(tmp_file, file)
+        RveInfo.LOGGER.info('checkpoint of stage {} written to {}'.format(stage, file))
+
+    def load(self, stage: str):
+        """
+        :return: state of stage or None if there is no valid checkpoint for the current inputs
+        """
+        file = self.file(stage)
+        if not os.path.isfile(file):
+            return None
+        try:
+            with np.load(file, allow_pickle=True) as data:
+                meta = json.loads(str(data['__meta__']))
+                if meta['stage'] != stage or meta['key'] != self.key(stage):
+                    return None
+                state = dict()
+                for name, kind in meta['entries'].items():
+                    if kind == 'none':
+                        state[name] = None
+                    elif kind == 'frame':
+                        columns = meta['columns'][name]
+                        state[name] = pd.DataFrame({column: data['{}/{}'.format(name, i)]
+                                                    for i, column in enumerate(columns)},
+                                                   index=data[name + '/__index__'])
+                    elif kind == 'list':
+                        state[name] = data[name].tolist()
+                    elif kind == 'array':
+                        state[name] = data[name]
+                    else:
+                        state[name] = data[name].item()
+        except (OSError, ValueError, KeyError) as e:
+            RveInfo.LOGGER.warning('checkpoint {} is not readable and is ignored: {}'.format(file, e))
+            return None
+        return state
+
+    def resume(self):
+        """
+        latest valid checkpoint before RveInfo.from_stage (or of all stages if it is None). Nothing is loaded unless
+        RveInfo.resume or RveInfo.from_stage is set
+        :return: (stage, state) or (None, None)
+        """
+        if not RveInfo.resume and RveInfo.from_stage is None:
+            return None, None
+        if RveInfo.rve_seed is None:
+            RveInfo.LOGGER.warning('resuming without a seed: the sampled grains differ in every run, so only '
+                                   'checkpoints of the same sampling can be found')
+
+        stages = CHECKPOINT_STAGES
+        if RveInfo.from_stage is not None:
+            assert RveInfo.from_stage in CHECKPOINT_STAGES + ('export',), \
+                'from_stage must be one of {}'.format(CHECKPOINT_STAGES + ('export',))
+            stages = (CHECKPOINT_STAGES + ('export',))[:(CHECKPOINT_STAGES + ('export',)).index(RveInfo.from_stage)]
+
+        for stage in reversed(stages):
+            state = self.load(stage)
+            if state is not None:
+                RveInfo.LOGGER.info('resuming after stage {} from {}'.format(stage, self.file(stage)))
+                notify('resuming after stage {} from checkpoint'.format(stage))
+                return stage, state
+        if RveInfo.from_stage is not None and len(stages) > 0:
+            RveInfo.LOGGER.warning('no checkpoint before stage {} found, running all stages'.format(RveInfo.from_stage))
+        return None, None
@@ -1,12 +1,15 @@
 from netCDF4 import Dataset
 import pyvista as pv
 import numpy as np
-from dragen.utilities.InputInfo import RveInfo
+from dragen.utilities.InputInfo import RveInfo, GenerationContext, in_context
 
 class NetCDFWrapper:
-    def __init__(self, file_base, num_nodes, num_elems, num_blocks, num_node_sets=None):
+    @in_context
+    def __init__(self, file_base, num_nodes, num_elems, num_blocks, num_node_sets=None, context=None):
+        # parameters of the generation (a snapshot of RveInfo if none is given)
+        self.context = context if context is not None else GenerationContext.from_rveinfo()
         Version = 2.0
-        file_path = RveInfo.store_path+'/'+file_base+'.e'
+        file_path = self.context.store_path+'/'+file_base+'.e'
         self._data = Dataset(file_path, mode='w', format='NETCDF3_64BIT', clobber=True)
 
         self._data.title = 'DRAGenRVE'
@@ -21,7 +24,7 @@ class NetCDFWrapper:
         self._data.createDimension('len_string', 32)
         self._data.createDimension('len_name', 256)
 
-        self._data.createDimension('num_dim', RveInfo.dimension)
+        self._data.createDimension('num_dim', self.context.dimension)
         self._data.createDimension('num_nodes', num_nodes)
         self._data.createDimension('num_elem', num_elems)
         self._data.createDimension('num_el_blk', num_blocks)
@@ -48,12 +51,13 @@ class NetCDFWrapper:
             self._data.variables['ns_prop1'].setncattr('name', 'ID')
             self._data.createVariable('ns_names', 'S1', ('num_node_sets', 'len_name'))
 
+    @in_context
     def set_coord_names(self, names: list):
         """
         :param names: list of coord names
         :type: list
         """
-        ndim = RveInfo.dimension
+        ndim = self.context.dimension
         assert len(names) == ndim, 'The length of the names array must equal the number of dimensions'
         for i in range(ndim):
             self._data.variables['coor_names'][i, 0:len(names[i])] = [c for c in names[i]]
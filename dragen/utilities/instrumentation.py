@@ -0,0 +1,108 @@
+"""
+Lightweight timing of the stages of the generation. A stage is measured with the decorator timed_stage or the context
+manager timed. Every measurement records the wall time, the cpu time of the process, the peak resident memory of the
+process and the counts (voxels, grains, elements, epochs, ...) of the stage. The records of one rve are collected
+between start_timings and write_timings, which writes them to <store_path>/timings.json.
+Outside of start_timings nothing is recorded, so the decorated functions can still be used on their own.
+"""
+import sys
+import json
+import time
+import functools
+import contextlib
+import contextvars
+
+try:
+    import resource
+except ImportError:  # not available on windows
+    resource = None
+
+_TIMINGS = contextvars.ContextVar('dragen_timings', default=None)
+"""(records, stack of the running records) of the rve generated in the current thread/task"""
+
+
+def peak_rss_mb():
+    """
+    peak resident memory of the process so far in MB, None if it can't be determined
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes on linux
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+def start_timings():
+    """
+    starts collecting the stage records of a new rve in the current thread
+    """
+    _TIMINGS.set((list(), list()))
+
+
+def get_timings() -> list:
+    timings = _TIMINGS.get()
+    return [] if timings is None else timings[0]
+
+
+def add_counts(**counts):
+    """
+    adds counts (e.g. epochs=12) to the innermost running stage
+    """
+    timings = _TIMINGS.get()
+    if timings is not None and len(timings[1]) > 0:
+        timings[1][-1]['counts'].update(counts)
+
+
+@contextlib.contextmanager
+def timed(stage: str, **counts):
+    """
+    measures the code in the with block as stage
+    :param counts: counts known before the stage runs, more can be added with add_counts
+    """
+    timings = _TIMINGS.get()
+    if timings is None:
+        yield
+        return
+    records, stack = timings
+    record = {'stage': stage, 'parent': stack[-1]['stage'] if len(stack) > 0 else None, 'counts': dict(counts)}
+    records.append(record)
+    stack.append(record)
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    try:
+        yield record
+    finally:
+        record['wall_time'] = time.perf_counter() - wall_start
+        record['cpu_time'] = time.process_time() - cpu_start
+        record['peak_rss_mb'] = peak_rss_mb()
+        stack.pop()
+
+
+def timed_stage(stage: str, counts=None):
+    """
+    decorator version of timed
+    :param counts: function (result, *args, **kwargs) -> dict of counts, called with the result and the arguments of
+    the decorated function (self included)
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(stage) as record:
+                result = func(*args, **kwargs)
+                if record is not None and counts is not None:
+                    record['counts'].update(counts(result, *args, **kwargs))
+            return result
+        return wrapper
+    return decorator
+
+
+def write_timings(path: str):
+    """
+    writes the records of the current rve as json
+    """
+    records = get_timings()
+    summary = {'total_wall_time': sum(record.get('wall_time', 0) for record in records
+                                      if record['parent'] is None),
+               'peak_rss_mb': peak_rss_mb(),
+               'stages': records}
+    with open(path, 'w') as f:
+        json.dump(summary, f, indent=4, default=lambda value: value.item() if hasattr(value, 'item') else str(value))
@@ -0,0 +1,127 @@
+"""
+Out-of-core mode for very large rves (RveInfo.memmap_flag). The rve arrays of the 3D stages are np.memmap files in
+<store_path>/Memmap instead of arrays in memory, the coordinate grids of gen_grid_new are read-only broadcast views of
+the three axes and the stages work on slabs of at most RveInfo.memmap_chunk voxels along the first axis, so besides the
+page cache of the files only the temporaries of one slab are in memory.
+Without the flag the functions work on normal arrays and on the whole array at once, so the stages use the same calls
+in both modes. The files of an rve are removed by release_arrays when the rve is finished.
+"""
+import os
+import shutil
+import tempfile
+import numpy as np
+from dragen.utilities.InputInfo import RveInfo
+
+MEMMAP_DIR = 'Memmap'
+
+
+def memmap_path(store_path: str = None) -> str:
+    """
+    directory of the memmap files of the rve in store_path (default RveInfo.store_path)
+    """
+    return os.path.join(RveInfo.store_path if store_path is None else store_path, MEMMAP_DIR)
+
+
+def voxel_array(shape, dtype='int16', name='rve') -> np.ndarray:
+    """
+    zero filled array, a np.memmap file in memmap_path() if RveInfo.memmap_flag is set
+    :param name: prefix of the file name
+    """
+    if not RveInfo.memmap_flag:
+        return np.zeros(shape, order='C', dtype=dtype)
+    path = memmap_path()
+    if not os.path.isdir(path):
+        os.makedirs(path, exist_ok=True)
+    handle, file = tempfile.mkstemp(suffix='.dat', prefix=name + '_', dir=path)
+    os.close(handle)
+    # a new file is zero filled (and sparse on most file systems)
+    return np.memmap(file, dtype=dtype, mode='w+', shape=tuple(shape), order='C')
+
+
+def copy_array(array: np.ndarray, name='rve') -> np.ndarray:
+    """
+    copy of array, in a new memmap file if RveInfo.memmap_flag is set
+    """
+    if not RveInfo.memmap_flag:
+        return array.copy()
+    copy = voxel_array(array.shape, array.dtype, name)
+    for slab in slabs(array.shape):
+        copy[slab] = array[slab]
+    return copy
+
+
+def slabs(shape):
+    """
+    yields slices along the first axis with at most RveInfo.memmap_chunk voxels each, one slice of the whole array if
+    RveInfo.memmap_flag is not set
+    """
+    if not RveInfo.memmap_flag:
+        yield slice(0, shape[0])
+        return
+    plane = int(np.prod(shape[1:]))
+    step = max(1, RveInfo.memmap_chunk // max(plane, 1))
+    for start in range(0, shape[0], step):
+        yield slice(start, min(start + step, shape[0]))
+
+
+def count_equal(array: np.ndarray, value) -> int:
+    """
+    np.count_nonzero(array == value) slab by slab
+    """
+    return sum(int(np.count_nonzero(array[slab] == value)) for slab in slabs(array.shape))
+
+
+def replace(array: np.ndarray, old, new):
+    """
+    array[array == old] = new slab by slab
+    """
+    for slab in slabs(array.shape):
+        chunk = array[slab]
+        chunk[chunk == old] = new
+
+
+def label_counts(array: np.ndarray, n_labels: int) -> np.ndarray:
+    """
+    number of voxels with the values 0...n_labels (index = value), other values are ignored
+    """
+    counts = np.zeros(n_labels + 1, dtype=np.int64)
+    for slab in slabs(array.shape):
+        chunk = array[slab]
+        values = chunk[(chunk >= 0) & (chunk <= n_labels)].astype(np.int64)
+        counts += np.bincount(values.ravel(), minlength=n_labels + 1)
+    return counts
+
+
+def nth_indices(array: np.ndarray, value, positions) -> list:
+    """
+    indices of the voxels with value at the given positions of the list np.where(array == value) (c order) in one
+    pass, without listing all of them
+    """
+    order = np.argsort(positions, kind='stable')
+    indices = [None] * len(positions)
+    found = 0
+    k = 0
+    for slab in slabs(array.shape):
+        where = np.nonzero(array[slab] == value)
+        n = len(where[0])
+        while k < len(order) and positions[order[k]] < found + n:
+            j = positions[order[k]] - found
+            indices[order[k]] = (where[0][j] + slab.start,) + tuple(axis[j] for axis in where[1:])
+            k += 1
+        found += n
+        if k == len(order):
+            break
+    return indices
+
+
+def release_arrays(store_path: str):
+    """
+    removes the memmap files of the rve in store_path. The arrays must not be used afterwards
+    """
+    path = memmap_path(store_path)
+    if not os.path.isdir(path):
+        return
+    shutil.rmtree(path, ignore_errors=True)
+    if os.path.isdir(path):
+        # on windows a file can't be removed while it is still mapped
+        RveInfo.LOGGER.warning('memmap files in {} could not be removed'.format(path))
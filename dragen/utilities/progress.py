@@ -0,0 +1,216 @@
+"""
+Progress of the generation as events. A stage reports its progress with a Progress object (start, update, finish),
+messages for the user are sent with notify. Every event goes to the subscribed listeners: the console
+(ConsoleListener), the GUI (SignalListener with the pyqt signals of the Worker), the log (LogListener) or any other
+callable taking a ProgressEvent. Without listeners an event costs almost nothing and update only sends an event when
+the percent changed by at least one step, so the loops of the stages can update for every grain or epoch.
+"""
+import sys
+import time
+import threading
+from dragen.utilities.InputInfo import RveInfo
+
+_LISTENERS = list()
+_LOCK = threading.Lock()
+
+
+class ProgressEvent:
+    """
+    kind: 'start', 'progress' and 'end' of a stage or 'message'
+    stage: name of the stage (None for messages outside of a stage)
+    percent: 0...100, None if the total of the stage is unknown
+    eta: estimated remaining time of the stage in s (None if unknown)
+    elapsed: time since the start of the stage in s
+    counts: counters of the stage (e.g. grains=120, epochs=14)
+    message: text for the user
+    rve: store_path of the rve the event belongs to
+    """
+    __slots__ = ('kind', 'stage', 'percent', 'eta', 'elapsed', 'counts', 'message', 'rve')
+
+    def __init__(self, kind, stage=None, percent=None, eta=None, elapsed=None, counts=None, message=None):
+        self.kind = kind
+        self.stage = stage
+        self.percent = percent
+        self.eta = eta
+        self.elapsed = elapsed
+        self.counts = dict() if counts is None else counts
+        self.message = message
+        self.rve = RveInfo.store_path
+
+    def __repr__(self):
+        return 'ProgressEvent({})'.format(', '.join('{}={!r}'.format(name, getattr(self, name))
+                                                    for name in self.__slots__ if getattr(self, name) is not None))
+
+
+def subscribe(listener):
+    """
+    :param listener: callable(event: ProgressEvent), called in the thread which sends the event
+    :return: listener, to unsubscribe it later
+    """
+    with _LOCK:
+        _LISTENERS.append(listener)
+    return listener
+
+
+def unsubscribe(listener):
+    with _LOCK:
+        if listener in _LISTENERS:
+            _LISTENERS.remove(listener)
+
+
+def clear_listeners():
+    """
+    removes all listeners, e.g. the copies of the listeners of the parent in a forked worker process
+    """
+    with _LOCK:
+        _LISTENERS.clear()
+
+
+def emit(event: ProgressEvent):
+    """
+    sends event to all listeners. A failing listener is logged and does not stop the generation
+    """
+    for listener in list(_LISTENERS):
+        try:
+            listener(event)
+        except Exception as e:
+            RveInfo.LOGGER.warning('progress listener {} failed: {}'.format(listener, e))
+
+
+def notify(message: str, stage: str = None):
+    """
+    message for the user (info box of the GUI, console of the CLI)
+    """
+    emit(ProgressEvent('message', stage, message=message))
+
+
+class Progress:
+    """
+    usage in a stage:
+    progress = Progress('rsa', total=n_grains).start()
+    for i in ...:
+        progress.update(i + 1, attempts=attempt)
+    progress.finish()
+    or as context manager: with Progress('rsa', total=n_grains) as progress: ...
+    """
+
+    def __init__(self, stage: str, total=100, step=1.0):
+        """
+        :param total: number of items of the stage, None if unknown (only counts are sent)
+        :param step: minimal change of the percent for a new progress event
+        """
+        self.stage = stage
+        self.total = total
+        self.step = step
+        self.start_time = None
+        self.last_percent = None
+        self.counts = dict()
+
+    def elapsed(self):
+        return time.perf_counter() - self.start_time if self.start_time is not None else 0.0
+
+    def start(self):
+        self.start_time = time.perf_counter()
+        self.last_percent = None
+        emit(ProgressEvent('start', self.stage, percent=0 if self.total else None, elapsed=0.0,
+                           counts=dict(total=self.total)))
+        return self
+
+    def update(self, done, **counts):
+        """
+        :param done: number of finished items (out of total)
+        :param counts: counters of the stage, sent with the next event
+        """
+        self.counts.update(counts)
+        if not self.total or len(_LISTENERS) == 0:
+            return
+        percent = min(max(100.0 * done / self.total, 0.0), 100.0)
+        if self.last_percent is not None and percent - self.last_percent < self.step and percent < 100:
+            return
+        if self.last_percent is not None and percent == self.last_percent:
+            return
+        self.last_percent = percent
+        elapsed = self.elapsed()
+        eta = elapsed * (100 - percent) / percent if percent > 0 else None
+        emit(ProgressEvent('progress', self.stage, percent=percent, eta=eta, elapsed=elapsed,
+                           counts=dict(self.counts, done=done)))
+
+    def finish(self, **counts):
+        self.counts.update(counts)
+        emit(ProgressEvent('end', self.stage, percent=100 if self.total else None, eta=0.0, elapsed=self.elapsed(),
+                           counts=dict(self.counts)))
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.counts['failed'] = True
+        self.finish()
+        return False
+
+
+class ConsoleListener:
+    """
+    prints the start and end of every stage, the progress in steps of step percent and the messages
+    """
+
+    def __init__(self, step=10, stream=None):
+        self.step = step
+        self.stream = stream
+        self.last = dict()
+
+    def __call__(self, event: ProgressEvent):
+        stream = sys.stdout if self.stream is None else self.stream
+        if event.kind == 'start':
+            self.last[event.stage] = 0
+            print('{}: started'.format(event.stage), file=stream)
+        elif event.kind == 'progress':
+            if event.percent - self.last.get(event.stage, 0) < self.step and event.percent < 100:
+                return
+            self.last[event.stage] = event.percent
+            eta = ', {:.0f} s left'.format(event.eta) if event.eta is not None else ''
+            print('{}: {:.0f}%{}'.format(event.stage, event.percent, eta), file=stream)
+        elif event.kind == 'end':
+            counts = ', '.join('{}={}'.format(key, value) for key, value in event.counts.items())
+            print('{}: finished after {:.1f} s{}'.format(event.stage, event.elapsed,
+                                                        ' ({})'.format(counts) if counts else ''), file=stream)
+        else:
+            print(event.message, file=stream)
+        stream.flush()
+
+
+class LogListener:
+    """
+    writes start, end and messages to RveInfo.LOGGER (info) and the progress events to debug
+    """
+
+    def __call__(self, event: ProgressEvent):
+        if event.kind == 'progress':
+            RveInfo.LOGGER.debug('{}: {:.0f}% (counts: {})'.format(event.stage, event.percent, event.counts))
+        elif event.kind == 'message':
+            RveInfo.LOGGER.info(event.message)
+        else:
+            RveInfo.LOGGER.info('{} {} after {:.2f} s (counts: {})'.format(event.stage, event.kind, event.elapsed,
+                                                                           event.counts))
+
+
+class SignalListener:
+    """
+    forwards the events to the pyqt signals of the GUI: the percent to progress (int) and the start of the stages and
+    the messages to info_box (str)
+    """
+
+    def __init__(self, progress=None, info_box=None):
+        self.progress = progress
+        self.info_box = info_box
+
+    def __call__(self, event: ProgressEvent):
+        if event.kind in ('start', 'progress', 'end') and event.percent is not None and self.progress is not None:
+            self.progress.emit(int(event.percent))
+        if self.info_box is None:
+            return
+        if event.kind == 'start':
+            self.info_box.emit('starting {}'.format(event.stage))
+        elif event.kind == 'message':
+            self.info_box.emit(event.message)
@@ -0,0 +1,54 @@
+"""
+Seeding of the random numbers of the generation. Run(seed=...) sets RveInfo.seed, every rve gets its own seed derived
+from it (rve_seeds) and every stage of an rve its own child stream of that seed (seed_stage). The stages are
+independent of each other: changing or skipping one stage does not shift the random numbers of the following ones.
+Without a seed nothing is seeded and the generation is random as before.
+"""
+import sys
+import random
+import numpy as np
+from dragen.utilities.InputInfo import RveInfo
+
+STAGES = ('sampling', 'rsa', 'tesselation', 'substructure', 'export', 'postprocessing', 'calibration', 'inclusions')
+"""stages of the generation of one rve which draw random numbers, the index is the spawn key of the child stream
+(new stages are appended, so the streams of the others stay the same)"""
+
+SEED_MAX = np.iinfo(np.int32).max
+
+
+def rve_seeds(seed, n_rves: int) -> list:
+    """
+    seeds of the rves 0...n_rves-1 derived from seed. Without a seed they are drawn from np.random
+    """
+    if seed is None:
+        return [int(s) for s in np.random.randint(SEED_MAX, size=n_rves)]
+    return [int(np.random.SeedSequence(seed, spawn_key=(i,)).generate_state(1)[0]) for i in range(n_rves)]
+
+
+def stage_sequence(rve_seed: int, stage: str) -> np.random.SeedSequence:
+    return np.random.SeedSequence(rve_seed, spawn_key=(STAGES.index(stage),))
+
+
+def seed_stage(stage: str):
+    """
+    seeds np.random, random and (if it is loaded) torch with the child stream of stage of the current rve
+    (RveInfo.rve_seed). Reseeding these global generators is deliberate: the legacy code, pandas' sample and the GAN
+    draw from them, so every following random number of the stage is reproducible without passing a generator
+    through all of it. For the same reason two generations must not run at the same time in one process
+    :param stage: one of STAGES
+    """
+    if RveInfo.rve_seed is None:
+        return
+    np_seed, py_seed = stage_sequence(RveInfo.rve_seed, stage).generate_state(2)
+    np.random.seed(np_seed)
+    random.seed(int(py_seed))
+    if 'torch' in sys.modules:
+        sys.modules['torch'].manual_seed(int(np_seed))
+
+
+def random_seed() -> int:
+    """
+    seed for libraries with their own generator (e.g. damask.Rotation.from_random), drawn from np.random so it
+    follows the seeding of the current stage
+    """
+    return int(np.random.randint(SEED_MAX))